@@ -1,16 +1,29 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query, Depends
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 import os
 from pathlib import Path
 import shutil
-from ingest import ingest_all
-from retriever import get_context_scoped
-from mcq_generator import generate_mcqs
-from flashcard_generator import generate_flashcards
-from syllabus_extractor import extract_structured_syllabus
+import json
+import time
+import asyncio
+import llm_client
+import warmup
+from typing import List, Optional
+from config import CHROMA_DIR
+import metrics
+from jobs import start_ingest_job, get_job, cancel_job, list_jobs, absorb_worker_metrics, run_when_idle
+from manifest import load_manifest
+from utils.hash_utils import file_sha256
+from mcq_generator import generate_mcqs, stream_mcqs, PROMPT_VERSION as MCQ_PROMPT_VERSION
+from flashcard_generator import generate_flashcards, stream_flashcards, PROMPT_VERSION as FLASHCARD_PROMPT_VERSION
+from generation_cache import cache_key, get_cached, put_cached, generation_cache_stats
+# retriever, ingest, syllabus_extractor and question_bank pull in langchain, Chroma,
+# sentence-transformers, pypdf and the OCR stack; routes import them on first use
+# so the server answers /health immediately (warmup.py loads the model meanwhile).
 
 # ====== Config ======
 DATA_DIR = Path("data")
@@ -18,7 +31,36 @@ DATA_DIR = Path("data")
 # Ensure base data dir exists
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-app = FastAPI(title="Adaptive Learning Demo API")
+def _route_path(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+async def bind_metric_labels(request: Request):
+    """Label stage metrics recorded while serving this request with its subject and route."""
+    metrics.set_labels(subject=request.path_params.get("subject_code", ""), endpoint=_route_path(request))
+
+app = FastAPI(title="Adaptive Learning Demo API", dependencies=[Depends(bind_metric_labels)])
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=_route_path(request),
+                                     method=request.method, status=status)
+
+@app.on_event("startup")
+async def start_warmup():
+    warmup.start()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await warmup.stop()
+    await llm_client.aclose()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # For demo, allow all. For prod, restrict to your frontend domain.
@@ -56,43 +98,292 @@ async def upload_pdf(subject_code: str,
     return {"status": "saved", "subject_code": subject_code, "category": category,
             "path": str(save_path)}
 
-@app.post("/ingest/{subject_code}")
-def ingest_subject(subject_code: str):
+@app.post("/ingest/{subject_code}", status_code=202)
+def ingest_subject(subject_code: str, force: bool = False):
     
-    """Run ingestion for this subject (syllabus+notes+past_papers)."""
-    ingest_all(subject_code)
+    """Start ingestion for this subject (syllabus+notes+past_papers) as a background job.
+    Only new, changed or removed files are processed unless force=true.
+    Poll GET /jobs/{job_id} for progress; an ingest already running for the subject is reused."""
+    job, created = start_ingest_job(subject_code, force=force)
+
+    return {"status": job["status"], "subject_code": subject_code, "job_id": job["id"],
+            "deduplicated": not created}
 
-    return {"status": "ingested", "subject_code": subject_code}
+@app.get("/jobs")
+def list_ingest_jobs(subject_code: Optional[str] = None, kind: Optional[str] = None):
+    """List jobs (kind "ingest" or "question_bank"), newest first, optionally for one subject."""
+    return {"jobs": list_jobs(subject_code, kind)}
+
+@app.get("/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    """Status, current stage and per-stage counts of an ingest job."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_ingest_job(job_id: str):
+    """Request cancellation; the worker stops at its next progress checkpoint."""
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def with_debug(response: dict, llm_calls: Optional[list]) -> dict:
+    """Attach per-call LLM token/timing accounting when the request asked for debug output."""
+    if llm_calls is not None:
+        response["debug"] = {"llm_calls": llm_calls}
+    return response
 
 @app.get("/extract-syllabus/{subject_code}")
-def get_structured_syllabus(subject_code: str):
+def get_structured_syllabus(subject_code: str, debug: bool = False):
     """Parses existing syllabus PDF into JSON structure."""
+    from syllabus_extractor import extract_structured_syllabus
+    llm_calls = llm_client.capture_usage() if debug else None
     syllabus_dir = DATA_DIR / subject_code / "syllabus"
     if not syllabus_dir.exists():
         raise HTTPException(status_code=404, detail="Syllabus directory not found")
     
-    files = list(syllabus_dir.glob("*.pdf"))
+    files = sorted(syllabus_dir.glob("*.pdf"))
     if not files:
         raise HTTPException(status_code=404, detail="No syllabus PDF found")
     
+    # Reuse the structure extracted during ingest if the PDF is unchanged
+    cached = load_manifest(subject_code).get("syllabus")
+    if cached and cached.get("hash") == file_sha256(files[0]):
+        return with_debug({"subject_code": subject_code, "units": cached["units"]}, llm_calls)
+
     # Process the most recent syllabus (usually only one)
     structured = extract_structured_syllabus(files[0])
-    return {"subject_code": subject_code, "units": structured}
+    return with_debug({"subject_code": subject_code, "units": structured}, llm_calls)
+
+DEFAULT_SOURCES = ["notes", "syllabus"]
+
+def retrieval_filters(sources: Optional[List[str]], unit: Optional[str],
+                      topic: Optional[str], source_file: Optional[str]) -> dict:
+    """Keyword filters for get_context_scoped from the common query parameters."""
+    return {"sources": sources or DEFAULT_SOURCES, "units": unit, "topics": topic, "files": source_file}
+
+def scoped_context(query: str, subject_code: str, k: int, filters: dict) -> str:
+    """get_context_scoped for async routes (run in the threadpool, so the first import doesn't block the loop)."""
+    from retriever import get_context_scoped
+    return get_context_scoped(query, subject_code, k=k, **filters)
 
 @app.post("/generate/mcqs/{subject_code}")
-def generate_mcqs_api(subject_code: str, query: str):
-    """Generate MCQs for a given subject/query from notes+syllabus."""
-    context = get_context_scoped(query, subject_code, k=8, sources=["notes", "syllabus"])
-    mcqs = generate_mcqs({"subject_code": subject_code}, context) or []
-    print(mcqs)
-    return {"subject_code": subject_code, "mcqs": mcqs}
+async def generate_mcqs_api(subject_code: str, query: str, num_mcqs: int = 5,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None, fresh: bool = False, debug: bool = False
+):
+    """Generate MCQs for a given subject/query from notes+syllabus (or the given sources/unit/topic/file).
+    Identical requests are served from the generation cache unless fresh=true.
+    With debug=true the response includes Ollama's token/timing accounting for each LLM call."""
+    llm_calls = llm_client.capture_usage() if debug else None
+    filters = retrieval_filters(sources, unit, topic, source_file)
+    key = await run_in_threadpool(cache_key, "mcqs", subject_code, query, num_mcqs,
+                                  MCQ_PROMPT_VERSION, filters)
+    if not fresh:
+        cached = await run_in_threadpool(get_cached, key)
+        if cached is not None:
+            return with_debug({"subject_code": subject_code, "mcqs": cached, "cached": True}, llm_calls)
+
+    context = await run_in_threadpool(scoped_context, query, subject_code, 8, filters)
+    mcqs = await generate_mcqs({"subject_code": subject_code}, context, num_mcqs) or []
+    await run_in_threadpool(put_cached, key, mcqs, "mcqs", subject_code)
+    return with_debug({"subject_code": subject_code, "mcqs": mcqs, "cached": False}, llm_calls)
 
 @app.post("/generate/flashcards/{subject_code}")
-def generate_flashcards_api(subject_code: str, query: str, num_cards: int = 8):
-    """Generate flashcards for a given subject/query from notes+syllabus."""
-    context = get_context_scoped(query, subject_code, k=8, sources=["notes", "syllabus"])
-    cards = generate_flashcards({"subject_code": subject_code}, context, num_cards) or []
-    return {"subject_code": subject_code, "flashcards": cards}
+async def generate_flashcards_api(subject_code: str, query: str, num_cards: int = 8,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None, fresh: bool = False, debug: bool = False
+):
+    """Generate flashcards for a given subject/query from notes+syllabus (or the given sources/unit/topic/file).
+    Identical requests are served from the generation cache unless fresh=true.
+    With debug=true the response includes Ollama's token/timing accounting for each LLM call."""
+    llm_calls = llm_client.capture_usage() if debug else None
+    filters = retrieval_filters(sources, unit, topic, source_file)
+    key = await run_in_threadpool(cache_key, "flashcards", subject_code, query, num_cards,
+                                  FLASHCARD_PROMPT_VERSION, filters)
+    if not fresh:
+        cached = await run_in_threadpool(get_cached, key)
+        if cached is not None:
+            return with_debug({"subject_code": subject_code, "flashcards": cached, "cached": True}, llm_calls)
+
+    context = await run_in_threadpool(scoped_context, query, subject_code, 8, filters)
+    cards = await generate_flashcards({"subject_code": subject_code}, context, num_cards) or []
+    await run_in_threadpool(put_cached, key, cards, "flashcards", subject_code)
+    return with_debug({"subject_code": subject_code, "flashcards": cards, "cached": False}, llm_calls)
+
+@app.post("/retrieve/{subject_code}/batch")
+def retrieve_batch_api(subject_code: str, queries: List[str] = Query(...), k: int = 8, dedupe: bool = False,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None
+):
+    """Context for several queries (repeat `queries`) from one embedding batch and one vector search.
+    With dedupe=true a chunk is returned only for the query it matches best."""
+    from retriever import get_contexts_batch
+    filters = retrieval_filters(sources, unit, topic, source_file)
+    contexts = get_contexts_batch(subject_code, queries, k=k, filters=filters, dedupe=dedupe)
+    return {"subject_code": subject_code,
+            "results": [{"query": q, "context": c} for q, c in zip(queries, contexts)]}
+
+@app.post("/generate/study-set/{subject_code}")
+async def generate_study_set_api(subject_code: str, query: str, num_mcqs: int = 5, num_cards: int = 8,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None, fresh: bool = False, debug: bool = False
+):
+    """MCQs and flashcards for one query from a single retrieval, generated concurrently.
+    Each part reports its own status and timing; one part failing does not fail the other."""
+    started = time.perf_counter()
+    llm_calls = llm_client.capture_usage() if debug else None
+    filters = retrieval_filters(sources, unit, topic, source_file)
+    parts = {
+        "mcqs": (generate_mcqs, num_mcqs, MCQ_PROMPT_VERSION),
+        "flashcards": (generate_flashcards, num_cards, FLASHCARD_PROMPT_VERSION)
+    }
+    keys = {kind: await run_in_threadpool(cache_key, kind, subject_code, query, count, version, filters)
+            for kind, (_, count, version) in parts.items()}
+    cached = {}
+    if not fresh:
+        for kind, key in keys.items():
+            value = await run_in_threadpool(get_cached, key)
+            if value is not None:
+                cached[kind] = value
+
+    context, retrieval_ms = None, 0.0
+    if len(cached) < len(parts):
+        t0 = time.perf_counter()
+        context = await run_in_threadpool(scoped_context, query, subject_code, 8, filters)
+        retrieval_ms = (time.perf_counter() - t0) * 1000
+
+    async def run_part(kind: str):
+        if kind in cached:
+            return {"status": "ok", "items": cached[kind], "cached": True, "ms": 0.0}
+        generate, count, _ = parts[kind]
+        t0 = time.perf_counter()
+        try:
+            items = await generate({"subject_code": subject_code}, context, count) or []
+        except Exception as e:
+            return {"status": "failed", "items": [], "error": str(e),
+                    "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        if not items:
+            return {"status": "failed", "items": [], "error": "No valid items generated", "ms": ms}
+        await run_in_threadpool(put_cached, keys[kind], items, kind, subject_code)
+        return {"status": "ok", "items": items, "cached": False, "ms": ms}
+
+    results = dict(zip(parts, await asyncio.gather(*(run_part(kind) for kind in parts))))
+    ok = [kind for kind, r in results.items() if r["status"] == "ok"]
+    return with_debug({
+        "subject_code": subject_code,
+        "status": "ok" if len(ok) == len(parts) else "partial" if ok else "failed",
+        "mcqs": results["mcqs"].pop("items"),
+        "flashcards": results["flashcards"].pop("items"),
+        "parts": results,
+        "timings_ms": {"retrieval": round(retrieval_ms, 1),
+                       **{kind: r["ms"] for kind, r in results.items()},
+                       "total": round((time.perf_counter() - started) * 1000, 1)}
+    }, llm_calls)
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def sse_stream(items, event: str, on_complete=None):
+    """
+    Wrap an async generator of validated items as a Server-Sent Events stream.
+    `on_complete(items)` receives everything sent only if the generator ran to
+    the end; a failed or truncated LLM stream raises instead, so partial
+    results are never cached as the full answer.
+    """
+    sent = []
+    try:
+        async for item in items:
+            sent.append(item)
+            yield sse_event(event, item)
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+    else:
+        if on_complete:
+            await run_in_threadpool(on_complete, sent)
+    yield sse_event("done", {"count": len(sent)})
+
+async def _replay(items):
+    for item in items:
+        yield item
+
+async def _stream_generation(kind: str, event: str, stream_fn, prompt_version: int,
+                             subject_code: str, query: str, count: int, filters: dict, fresh: bool):
+    key = await run_in_threadpool(cache_key, kind, subject_code, query, count, prompt_version, filters)
+    cached = None if fresh else await run_in_threadpool(get_cached, key)
+    if cached is not None:
+        items, on_complete = _replay(cached), None
+    else:
+        context = await run_in_threadpool(scoped_context, query, subject_code, 8, filters)
+        items = stream_fn({"subject_code": subject_code}, context, count)
+        on_complete = lambda sent: put_cached(key, sent, kind, subject_code)
+    return StreamingResponse(sse_stream(items, event, on_complete), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.api_route("/generate/mcqs/{subject_code}/stream", methods=["GET", "POST"])
+async def stream_mcqs_api(subject_code: str, query: str, num_mcqs: int = 5,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None, fresh: bool = False
+):
+    """Stream MCQs as Server-Sent Events ("mcq" per question, then "done")."""
+    filters = retrieval_filters(sources, unit, topic, source_file)
+    return await _stream_generation("mcqs", "mcq", stream_mcqs, MCQ_PROMPT_VERSION,
+                                    subject_code, query, num_mcqs, filters, fresh)
+
+@app.api_route("/generate/flashcards/{subject_code}/stream", methods=["GET", "POST"])
+async def stream_flashcards_api(subject_code: str, query: str, num_cards: int = 8,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None, fresh: bool = False
+):
+    """Stream flashcards as Server-Sent Events ("flashcard" per card, then "done")."""
+    filters = retrieval_filters(sources, unit, topic, source_file)
+    return await _stream_generation("flashcards", "flashcard", stream_flashcards, FLASHCARD_PROMPT_VERSION,
+                                    subject_code, query, num_cards, filters, fresh)
+
+@app.get("/bank/{subject_code}")
+def get_question_bank(subject_code: str):
+    """Pre-generated MCQ/flashcard pool sizes per syllabus topic."""
+    import question_bank
+    return question_bank.bank_status(subject_code)
+
+async def serve_from_bank(subject_code: str, kind: str, student_id: str, count: int,
+                          unit: Optional[str], topic: Optional[str]):
+    import question_bank
+    entry = None
+    if topic:
+        entry = await run_in_threadpool(question_bank.find_topic, subject_code, topic, unit)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Topic '{topic}' not in the syllabus of {subject_code}")
+        unit = entry["unit"]
+
+    items, unseen = await run_in_threadpool(question_bank.draw, subject_code, kind, student_id, count, unit, topic)
+    if entry and len(items) < count:
+        # Pool not built yet (or exhausted for this student): generate the shortfall now
+        target = await run_in_threadpool(question_bank.topic_count, subject_code, kind, entry["unit"], entry["topic"])
+        await question_bank.fill_topic(subject_code, kind, entry, target + count - len(items))
+        more, unseen = await run_in_threadpool(question_bank.draw, subject_code, kind, student_id,
+                                               count - len(items), unit, topic)
+        items += more
+    if entry and question_bank.needs_refill(unseen):
+        question_bank.schedule_refill(subject_code, kind, entry)
+    return {"subject_code": subject_code, "student_id": student_id, kind: items, "remaining": unseen}
+
+@app.post("/bank/{subject_code}/mcqs")
+async def bank_mcqs_api(subject_code: str, student_id: str, count: int = 5,
+                        unit: Optional[str] = None, topic: Optional[str] = None):
+    """Serve MCQs from the pre-generated bank, never repeating one for the same student.
+    Scope with topic (and unit) or unit alone; topics running low are refilled in the background."""
+    return await serve_from_bank(subject_code, "mcqs", student_id, count, unit, topic)
+
+@app.post("/bank/{subject_code}/flashcards")
+async def bank_flashcards_api(subject_code: str, student_id: str, count: int = 8,
+                              unit: Optional[str] = None, topic: Optional[str] = None):
+    """Serve flashcards from the pre-generated bank, never repeating one for the same student."""
+    return await serve_from_bank(subject_code, "flashcards", student_id, count, unit, topic)
 
 # Add these routes to your app.py
 
@@ -124,27 +415,65 @@ def get_subject_status(subject_code: str):
 @app.delete("/files/{subject_code}/{category}/{filename}")
 def delete_file(subject_code: str, category: str, filename: str):
     """Delete a specific uploaded file."""
+    from ingest import remove_file_vectors
     file_path = DATA_DIR / subject_code / category / filename
     
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
-    
-    try:
+
+    def remove():
         os.remove(file_path)
-        return {"status": "deleted", "file": filename}
+        return remove_file_vectors(subject_code, category, filename)
+
+    try:
+        # A running ingest would save its own manifest over this edit
+        running, removed_chunks = run_when_idle(subject_code, remove)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
+    if running:
+        raise HTTPException(status_code=409,
+                            detail=f"Ingest job {running['id']} is running for {subject_code}; retry when it finishes")
+    return {"status": "deleted", "file": filename, "removed_chunks": removed_chunks}
 
 @app.get("/health")
 def health_check():
     """Basic health check endpoint."""
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/ready")
+def readiness_check():
+    """200 once the embedding model and the Ollama model are loaded (no cold start on the next request), else 503."""
+    state = warmup.readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics: per-stage latency histograms and counters by subject and endpoint."""
+    absorb_worker_metrics()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm/usage")
+def llm_usage():
+    """LLM calls, prompt/generated tokens and Ollama load/eval time aggregated per endpoint and caller."""
+    absorb_worker_metrics()
+    return {"endpoints": llm_client.usage_summary()}
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the in-process retrieval caches."""
+    from retriever import get_embeddings, store_cache_stats, query_cache_stats
+    return {"vector_stores": store_cache_stats(), "embeddings": get_embeddings().cache_stats(),
+            "semantic_queries": query_cache_stats(), "generation": generation_cache_stats()}
+
 @app.post("/validate/query/{subject_code}")
-def validate_query(subject_code: str, query: str):
+def validate_query(subject_code: str, query: str,
+    sources: Optional[List[str]] = Query(None), unit: Optional[str] = None,
+    topic: Optional[str] = None, source_file: Optional[str] = None
+):
     """Validate if a query can generate meaningful results."""
+    from retriever import get_context_scoped
     # Check if subject is ingested
-    chroma_path = Path(f"chroma_dbs/{subject_code}")
+    chroma_path = CHROMA_DIR / subject_code
     if not (chroma_path.exists() and any(chroma_path.iterdir())):
         return {
             "valid": False,
@@ -154,7 +483,8 @@ def validate_query(subject_code: str, query: str):
     
     # Try to get some context
     try:
-        context = get_context_scoped(query, subject_code, k=3, sources=["notes", "syllabus"])
+        filters = retrieval_filters(sources, unit, topic, source_file)
+        context = get_context_scoped(query, subject_code, k=3, **filters)
         if not context or len(context.strip()) < 50:
             return {
                 "valid": False,
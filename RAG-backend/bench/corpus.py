@@ -0,0 +1,140 @@
+# bench/corpus.py
+import random
+from pathlib import Path
+
+# Synthetic syllabus shared by the corpus and the fake Ollama server, so
+# tagging and topic-scoped retrieval have something real to match against.
+SYLLABUS = [
+    {"unitName": "Unit I: Search", "topics": [
+        {"topicName": "Uninformed Search", "subtopics": ["Breadth First Search", "Depth First Search"]},
+        {"topicName": "Heuristic Search", "subtopics": ["A* Search", "AO* Search"]}]},
+    {"unitName": "Unit II: Constraint Satisfaction", "topics": [
+        {"topicName": "CSP Formulation", "subtopics": ["Variables and Domains"]},
+        {"topicName": "Backtracking", "subtopics": ["Forward Checking", "Arc Consistency"]}]},
+    {"unitName": "Unit III: Learning", "topics": [
+        {"topicName": "Support Vector Machines", "subtopics": ["Max Margin Classifier", "Kernels"]},
+        {"topicName": "Neural Networks", "subtopics": ["Perceptron", "Backpropagation"]}]}
+]
+
+TOPIC_TERMS = {
+    "Uninformed Search": ["frontier", "queue", "breadth first", "depth first", "explored set", "goal test"],
+    "Heuristic Search": ["heuristic", "admissible", "A* search", "AO* graph", "evaluation function", "path cost"],
+    "CSP Formulation": ["variables", "domains", "constraints", "CSP", "assignment", "consistency"],
+    "Backtracking": ["backtracking", "forward checking", "arc consistency", "AC-3", "MRV", "degree heuristic"],
+    "Support Vector Machines": ["support vectors", "margin", "hyperplane", "kernel trick", "SVM", "slack"],
+    "Neural Networks": ["perceptron", "activation", "gradient", "backpropagation", "weights", "loss"]
+}
+
+FILLER = ["the", "algorithm", "uses", "a", "method", "which", "improves", "results", "when", "each",
+          "step", "considers", "the", "problem", "state", "and", "its", "cost", "in", "practice"]
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zen", "qui", "dra", "pel", "sor", "tix", "bam", "yul"]
+
+def _pseudo_words(rng: random.Random, count: int) -> list:
+    return ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+def synthetic_pages(pages: int, lines_per_page: int = 40, seed: int = 0) -> list:
+    """
+    Pages of topic-flavoured prose; each page mostly talks about one topic.
+    Pseudo-words keep the vocabulary varied enough to pass the junk-page
+    check (otherwise every page would be sent to OCR).
+    """
+    rng = random.Random(seed)
+    vocabulary = _pseudo_words(rng, 5000)
+    topics = list(TOPIC_TERMS)
+    out = []
+    for p in range(pages):
+        topic = topics[(p + seed) % len(topics)]
+        lines = [f"{topic} - section {p + 1}"]
+        while len(lines) < lines_per_page:
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(6, 9))]
+            words += [rng.choice(FILLER) for _ in range(3)]
+            rng.shuffle(words)
+            for _ in range(2):
+                words.insert(rng.randrange(len(words)), rng.choice(TOPIC_TERMS[topic]))
+            lines.append(" ".join(words).capitalize() + ".")
+        out.append(lines)
+    return out
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_text_pdf(path: Path, pages: list):
+    """Minimal PDF with a real text layer (Helvetica, one content stream per page)."""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")   # filled in once the page tree exists
+    page_tree = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 800 Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                        b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                        % (page_tree, font, content)))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+    objects[page_tree - 1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids)
+                              + b"] /Count %d >>" % len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    path.write_bytes(bytes(out))
+
+def write_image_pdf(path: Path, pages: list, dpi: int = 100):
+    """Scanned-style PDF: every page is a rendered image with no text layer (forces OCR)."""
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.load_default(size=20)
+    except TypeError:  # Pillow < 10.1
+        font = ImageFont.load_default()
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    images = []
+    for lines in pages:
+        img = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(img)
+        y = 40
+        for line in lines:
+            draw.text((40, y), line[:70], fill=0, font=font)
+            y += 26
+            if y > height - 40:
+                break
+        images.append(img.convert("RGB"))
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+
+def write_syllabus_pdf(path: Path):
+    lines = ["Course Syllabus"]
+    for unit in SYLLABUS:
+        lines.append(unit["unitName"])
+        for topic in unit["topics"]:
+            lines.append(f"  {topic['topicName']}: " + ", ".join(topic["subtopics"]))
+    write_text_pdf(path, [lines])
+
+def build_corpus(root: Path, text_files: int, image_files: int, pages: int, seed: int = 0) -> dict:
+    """Write syllabus/, notes/ (text PDFs) and past_papers/ (image-only PDFs) under `root`."""
+    for category in ("syllabus", "notes", "past_papers"):
+        (root / category).mkdir(parents=True, exist_ok=True)
+    write_syllabus_pdf(root / "syllabus" / "syllabus.pdf")
+    text_paths, image_paths = [], []
+    for i in range(text_files):
+        path = root / "notes" / f"notes_{i:03d}.pdf"
+        write_text_pdf(path, synthetic_pages(pages, seed=seed + i))
+        text_paths.append(path)
+    for i in range(image_files):
+        path = root / "past_papers" / f"scan_{i:03d}.pdf"
+        write_image_pdf(path, synthetic_pages(pages, lines_per_page=30, seed=seed + 1000 + i))
+        image_paths.append(path)
+    return {"text": text_paths, "image": image_paths, "syllabus": root / "syllabus" / "syllabus.pdf"}
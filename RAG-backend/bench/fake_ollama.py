@@ -0,0 +1,157 @@
+# bench/fake_ollama.py
+"""
+Local stand-in for the Ollama HTTP API (/api/generate, /api/tags).
+
+Answers with schema-valid JSON for the prompts this backend sends (MCQs,
+flashcards, chunk tagging, syllabus extraction) after a simulated prompt
+evaluation delay and at a fixed generation speed, so benchmarks measure
+our own overhead rather than a model.
+
+    python -m bench.fake_ollama --port 11435 --latency 0.2 --tokens-per-second 40
+"""
+import re
+import json
+import time
+import argparse
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from bench.corpus import SYLLABUS
+
+_IDS = itertools.count()
+_TOPICS = [(u["unitName"], t["topicName"]) for u in SYLLABUS for t in u["topics"]]
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def _mcqs(n: int) -> dict:
+    items = []
+    for _ in range(n):
+        i = next(_IDS)
+        items.append({"question": f"Synthetic question {i}: which statement about concept {i} holds?",
+                      "options": [f"Option {c} for {i}" for c in "ABCD"],
+                      "correct_option": "ABCD"[i % 4]})
+    return {"mcqs": items}
+
+def _flashcards(n: int) -> dict:
+    items = []
+    for _ in range(n):
+        i = next(_IDS)
+        items.append({"front": f"Synthetic term {i}", "back": f"Definition of synthetic term {i}."})
+    return {"flashcards": items}
+
+def _tag(i: int) -> dict:
+    unit, topic = _TOPICS[i % len(_TOPICS)]
+    return {"unit": unit, "topic": topic, "subtopic": ""}
+
+def respond_to(prompt: str) -> str:
+    """Model output (a JSON string) for one prompt."""
+    m = re.search(r"exactly (\d+) multiple choice", prompt)
+    if m:
+        return json.dumps(_mcqs(int(m.group(1))))
+    m = re.search(r"exactly (\d+) flashcards", prompt)
+    if m:
+        return json.dumps(_flashcards(int(m.group(1))))
+    if "Categorize each of the following" in prompt:
+        indices = [int(x) for x in re.findall(r"^\s*\[(\d+)\]\s*$", prompt, re.MULTILINE)]
+        return json.dumps({"tags": [{"index": i, **_tag(i)} for i in indices]})
+    if "Categorize the following" in prompt:
+        return json.dumps(_tag(next(_IDS)))
+    if "curriculum coordinator" in prompt:
+        return json.dumps({"units": SYLLABUS})
+    return "{}"
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.2               # seconds before the first token (prompt eval + load)
+    tokens_per_second = 40.0    # generation speed
+    stats = {"requests": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self._send_json({"models": [{"name": "fake"}]})
+        else:
+            self._send_json({"status": "Ollama is running"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, status=400)
+            return
+        if not self.path.startswith("/api/generate"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        with self.stats_lock:
+            self.stats["requests"] += 1
+
+        prompt = payload.get("prompt", "")
+        text = respond_to(prompt)
+        started = time.perf_counter()
+        time.sleep(self.latency)
+        prompt_eval_ns = int(self.latency * 1e9)
+        eval_count = _tokens(text)
+        meta = {"model": payload.get("model", "fake"), "done_reason": "stop",
+                "load_duration": 0, "prompt_eval_count": _tokens(prompt),
+                "prompt_eval_duration": prompt_eval_ns, "eval_count": eval_count}
+
+        if not payload.get("stream"):
+            time.sleep(eval_count / self.tokens_per_second)
+            total = int((time.perf_counter() - started) * 1e9)
+            self._send_json({**meta, "response": text, "done": True, "total_duration": total,
+                             "eval_duration": total - prompt_eval_ns})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+        for piece in pieces:
+            time.sleep(1.0 / self.tokens_per_second)
+            self._write_chunk({"model": meta["model"], "response": piece, "done": False})
+        total = int((time.perf_counter() - started) * 1e9)
+        self._write_chunk({**meta, "response": "", "done": True, "total_duration": total,
+                           "eval_duration": total - prompt_eval_ns})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, event: dict):
+        data = (json.dumps(event) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+def start_server(port: int = 0, latency: float = 0.2, tokens_per_second: float = 40.0):
+    """Start the server on a daemon thread; returns (server, base_url)."""
+    handler = type("ConfiguredFakeOllama", (FakeOllamaHandler,),
+                   {"latency": latency, "tokens_per_second": tokens_per_second,
+                    "stats": {"requests": 0}, "stats_lock": threading.Lock()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.latency, args.tokens_per_second)
+    print(f"Fake Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,278 @@
+# bench/run_bench.py
+"""
+End-to-end benchmark of the RAG backend against a synthetic corpus and a
+fake Ollama server. Writes one JSON file per run so results can be diffed
+over time.
+
+    cd RAG-backend
+    python -m bench.run_bench --text-files 4 --image-files 1 --pages 10
+
+Stages: extraction, OCR, chunking, embedding, tagging, full ingest,
+retrieval (p50/p95/p99) and the /generate/* endpoints. Everything runs in
+a throwaway subject (--subject) whose data, index, caches and jobs live in a
+temporary directory, deleted afterwards unless --keep; the real data and
+caches are never touched.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import platform
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+from bench.fake_ollama import start_server
+from bench.corpus import SYLLABUS, TOPIC_TERMS, build_corpus
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+def percentiles(samples_ms: list) -> dict:
+    import numpy as np
+    if not samples_ms:
+        return {"n": 0}
+    arr = np.asarray(samples_ms, dtype=float)
+    return {"n": len(arr), "mean": round(float(arr.mean()), 3),
+            **{f"p{q}": round(float(np.percentile(arr, q)), 3) for q in (50, 95, 99)},
+            "max": round(float(arr.max()), 3)}
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+def bench_queries(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    base = [t["topicName"] for u in SYLLABUS for t in u["topics"]]
+    base += [s for u in SYLLABUS for t in u["topics"] for s in t["subtopics"]]
+    terms = [term for ts in TOPIC_TERMS.values() for term in ts]
+    while len(base) < count:
+        base.append(f"explain {rng.choice(terms)} and {rng.choice(terms)}")
+    return base[:count]
+
+# ---- stages ----
+
+def bench_extraction(paths: list) -> dict:
+    from utils.text_utils import extract_page_range
+    per_file, pages = [], 0
+    texts = []
+    for path in paths:
+        file_pages, ms = timed(extract_page_range, path)
+        per_file.append(ms)
+        pages += len(file_pages)
+        texts.append("\n\n".join(file_pages))
+    total_s = sum(per_file) / 1000
+    return {"files": len(paths), "pages": pages, "per_file_ms": percentiles(per_file),
+            "pages_per_s": round(pages / total_s, 2) if total_s else None}, texts
+
+def bench_ocr(paths: list) -> dict:
+    from pypdf import PdfReader
+    from utils.ocr_utils import ocr_pages
+    if not paths:
+        return {"skipped": "no image-only files"}
+    per_file, timings = [], {}
+    try:
+        for path in paths:
+            pages = range(1, len(PdfReader(path).pages) + 1)
+            _, ms = timed(ocr_pages, path, pages, timings=timings)
+            per_file.append(ms)
+    except Exception as e:
+        return {"skipped": f"OCR unavailable: {e}"}
+    total_s = sum(per_file) / 1000
+    return {"files": len(paths), "pages": timings.get("pages", 0), "per_file_ms": percentiles(per_file),
+            "render_s": round(timings.get("render_s", 0.0), 3),
+            "recognize_s": round(timings.get("recognize_s", 0.0), 3),
+            "pages_per_s": round(timings.get("pages", 0) / total_s, 2) if total_s else None}
+
+def bench_chunking(texts: list):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from config import CHUNK_SIZE, CHUNK_OVERLAP
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks, ms = [], 0.0
+    for text in texts:
+        file_chunks, t = timed(splitter.split_text, text)
+        chunks += [c for c in file_chunks if c.strip()]
+        ms += t
+    return {"chunks": len(chunks), "total_ms": round(ms, 3),
+            "chunks_per_s": round(len(chunks) / (ms / 1000), 1) if ms else None}, chunks
+
+def bench_embedding(chunks: list, queries: list):
+    from config import INGEST_EMBED_CHUNK_SIZE
+    from retriever import get_embeddings
+    embeddings, load_ms = timed(get_embeddings)
+    base = embeddings.base   # bypass the embedding cache: measure the model
+    vectors, ms = [], 0.0
+    for start in range(0, len(chunks), INGEST_EMBED_CHUNK_SIZE):
+        batch, t = timed(base.embed_documents, chunks[start:start + INGEST_EMBED_CHUNK_SIZE])
+        vectors += batch
+        ms += t
+    query_ms = [timed(base.embed_query, q)[1] for q in queries]
+    return {"backend": embeddings.model_name, "model_load_ms": round(load_ms, 1), "chunks": len(chunks), "total_ms": round(ms, 1),
+            "chunks_per_s": round(len(chunks) / (ms / 1000), 1) if ms else None,
+            "query_ms": percentiles(query_ms)}, vectors
+
+def bench_tagging(chunks: list, vectors: list, llm_sample: int) -> dict:
+    from config import OLLAMA_MODEL
+    from retriever import get_embeddings
+    from topic_tagger import tag_chunks_by_similarity
+    from ingest import tag_chunks_with_syllabus
+    (tags, uncertain), ms = timed(tag_chunks_by_similarity, vectors, SYLLABUS, get_embeddings())
+    sample = chunks[:llm_sample]
+    _, llm_ms = timed(tag_chunks_with_syllabus, sample, SYLLABUS, OLLAMA_MODEL)
+    return {"similarity": {"chunks": len(chunks), "total_ms": round(ms, 1), "uncertain": len(uncertain)},
+            "llm": {"chunks": len(sample), "total_ms": round(llm_ms, 1),
+                    "per_chunk_ms": round(llm_ms / len(sample), 2) if sample else None}}
+
+def bench_ingest(subject_code: str) -> dict:
+    from ingest import ingest_all
+    stages = {}
+
+    def progress(stage, done, total=None):
+        now = time.perf_counter()
+        span = stages.setdefault(stage, {"first": now, "last": now, "done": 0, "total": None})
+        span.update(last=now, done=done, total=total)
+
+    report, ms = timed(ingest_all, subject_code, force=True, progress=progress)
+    return {"total_ms": round(ms, 1), "report": report,
+            "stages": {name: {"span_ms": round((s["last"] - s["first"]) * 1000, 1),
+                              "done": s["done"], "total": s["total"]} for name, s in stages.items()}}
+
+def bench_retrieval(subject_code: str, queries: list) -> dict:
+    from retriever import get_context_scoped, get_contexts_batch, invalidate_store
+    invalidate_store(subject_code)
+    _, open_ms = timed(get_context_scoped, "warm up", subject_code, k=8)
+    cold = [timed(get_context_scoped, q, subject_code, k=8)[1] for q in queries]
+    warm = [timed(get_context_scoped, q, subject_code, k=8)[1] for q in queries]
+    _, batch_ms = timed(get_contexts_batch, subject_code, [f"{q} overview" for q in queries], 8)
+    return {"first_query_ms": round(open_ms, 1), "cold_ms": percentiles(cold), "repeat_ms": percentiles(warm),
+            "batch": {"queries": len(queries), "total_ms": round(batch_ms, 1)}}
+
+def bench_generate(subject_code: str, queries: list, requests: int) -> dict:
+    from fastapi.testclient import TestClient
+    from app import app
+    results = {}
+    with TestClient(app) as client:
+        for name, path, params in (
+            ("mcqs", f"/generate/mcqs/{subject_code}", {"num_mcqs": 5}),
+            ("flashcards", f"/generate/flashcards/{subject_code}", {"num_cards": 8}),
+            ("study_set", f"/generate/study-set/{subject_code}", {}),
+        ):
+            samples, failures = [], 0
+            for i in range(requests):
+                query = queries[i % len(queries)]
+                response, ms = timed(client.post, path, params={"query": query, "fresh": "true", **params})
+                if response.status_code != 200:
+                    failures += 1
+                samples.append(ms)
+            results[name] = {"latency_ms": percentiles(samples), "failures": failures}
+    return results
+
+# ---- driver ----
+
+def isolate_paths(root: Path):
+    """
+    Point config's data, index, cache and job paths into `root`. Must run
+    before any module that copies them at import (everything but config).
+    The exported ONNX model is shared, since it is a build artifact.
+    """
+    import config
+    real_onnx = config.CACHE_DIR / "onnx"
+    config.DATA_DIR = root / "data"
+    config.SYLLABUS_DIR = config.DATA_DIR / "syllabus"
+    config.NOTES_DIR = config.DATA_DIR / "notes"
+    config.PAST_PAPERS_DIR = config.DATA_DIR / "past_papers"
+    config.CHROMA_DIR = root / "chroma_db"
+    config.CACHE_DIR = root / "cache"
+    config.JOBS_DIR = root / "jobs"
+    config.QUESTION_BANK_DB = root / "question_bank.sqlite3"
+    config.CACHE_DIR.mkdir(parents=True)
+    if real_onnx.exists():
+        try:
+            (config.CACHE_DIR / "onnx").symlink_to(real_onnx, target_is_directory=True)
+        except OSError:
+            pass   # no symlinks (e.g. Windows without privileges): export again
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subject", default="BENCH")
+    parser.add_argument("--text-files", type=int, default=4)
+    parser.add_argument("--image-files", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=10, help="pages per PDF")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--generate-requests", type=int, default=5, help="requests per /generate endpoint")
+    parser.add_argument("--llm-tag-sample", type=int, default=32, help="chunks tagged through the LLM path")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Ollama seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=None, help="corpus seed (random by default, so caches miss)")
+    parser.add_argument("--skip", nargs="*", default=[], help="stages to skip, e.g. ocr generate")
+    parser.add_argument("--out", type=Path, default=None, help="result file (default bench/results/<time>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary data, index and caches")
+    args = parser.parse_args(argv)
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+
+    server, url = start_server(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    os.environ["OLLAMA_BASE_URL"] = url   # before any project module reads config
+    import config
+    if (config.DATA_DIR / args.subject).exists() or (config.CHROMA_DIR / args.subject).exists():
+        server.shutdown()
+        parser.error(f"subject {args.subject!r} already exists in {config.BASE_DIR}; pick an unused --subject")
+    work_dir = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    isolate_paths(work_dir)
+
+    subject_dir = config.DATA_DIR / args.subject
+    corpus, corpus_ms = timed(build_corpus, subject_dir, args.text_files, args.image_files, args.pages, seed)
+    queries = bench_queries(args.queries, seed)
+
+    run = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "params": {**{k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}, "seed": seed},
+        "corpus_ms": round(corpus_ms, 1),
+        "results": {}
+    }
+    results = run["results"]
+    print(f"[BENCH] Corpus in {subject_dir} (seed {seed}); fake Ollama at {url}")
+    try:
+        results["extraction"], texts = bench_extraction(corpus["text"])
+        if "ocr" not in args.skip:
+            results["ocr"] = bench_ocr(corpus["image"])
+        results["chunking"], chunks = bench_chunking(texts)
+        results["embedding"], vectors = bench_embedding(chunks, queries)
+        if "tagging" not in args.skip:
+            results["tagging"] = bench_tagging(chunks, vectors, args.llm_tag_sample)
+        results["ingest"] = bench_ingest(args.subject)
+        results["retrieval"] = bench_retrieval(args.subject, queries)
+        if "generate" not in args.skip:
+            results["generate"] = bench_generate(args.subject, queries, args.generate_requests)
+    finally:
+        run["fake_ollama_requests"] = server.RequestHandlerClass.stats["requests"]
+        server.shutdown()
+        if args.keep:
+            print(f"[BENCH] Kept data, index and caches in {work_dir}")
+        else:
+            from retriever import invalidate_store
+            invalidate_store(args.subject)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    out = args.out or RESULTS_DIR / f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2, default=str)
+    print(f"[BENCH] Results written to {out}")
+    print(json.dumps(results, indent=2, default=str))
+    return run
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
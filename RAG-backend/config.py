@@ -9,6 +9,9 @@ CHROMA_DIR      = BASE_DIR / "chroma_db"
 SYLLABUS_DIR    = DATA_DIR / "syllabus"
 NOTES_DIR       = DATA_DIR / "notes"
 PAST_PAPERS_DIR = DATA_DIR / "past_papers"
+CACHE_DIR       = BASE_DIR / "cache"
+JOBS_DIR        = BASE_DIR / "jobs"
+QUESTION_BANK_DB = BASE_DIR / "question_bank.sqlite3"
 
 
 # Poppler (Windows)
@@ -17,12 +20,96 @@ POPPLER_PATH    = r"C:\Program Files\poppler\Library\bin"
 # Tesseract (Windows)
 TESSERACT_PATH  = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
+# Background jobs
+JOB_STALE_SECONDS = 60  # an active job without a heartbeat for this long is marked failed
+
+# OCR
+OCR_DPI         = 200   # render resolution for scanned pages
+OCR_GRAYSCALE   = True  # render in grayscale (smaller images, faster tesseract)
+OCR_WORKERS     = 2     # tesseract processes per extraction worker
+OCR_MAX_GAP     = 2     # merge junk pages this close into one render pass
+
+# PDF extraction
+EXTRACT_WORKERS        = max(1, (os.cpu_count() or 2) - 1)  # processes; 1 = serial, in-process
+EXTRACT_PAGES_PER_TASK = 20     # pages per worker task for large PDFs
+
 # Chunk settings
 CHUNK_SIZE      = 1000
 CHUNK_OVERLAP   = 200
 
+# Retrieval
+MAX_OPEN_STORES = 8     # per-subject Chroma handles kept open (LRU)
+SEMANTIC_CACHE_MAX_ENTRIES = 256   # recent queries remembered per subject (LRU)
+SEMANTIC_CACHE_THRESHOLD   = 0.92  # cosine similarity at which a cached query's chunks are reused
+HYBRID_SEARCH   = True  # fuse BM25 (lexical_index.py) with vector hits
+RRF_K           = 60    # reciprocal rank fusion constant
+BM25_K1         = 1.5
+BM25_B          = 0.75
+
+# Context packing (retrieved chunks -> LLM prompt)
+CONTEXT_FETCH_MULTIPLIER = 3     # candidates fetched per requested chunk, for MMR to choose from
+CONTEXT_MMR_LAMBDA       = 0.7   # 1.0 = pure relevance, lower = more diversity
+CONTEXT_DUP_THRESHOLD    = 0.95  # cosine similarity at which a chunk counts as a near-duplicate
+CONTEXT_TOKEN_BUDGET     = 3000  # prompt tokens spent on context
+CONTEXT_TOKENIZER        = os.getenv("CONTEXT_TOKENIZER", "Qwen/Qwen2.5-7B-Instruct")  # HF tokenizer of OLLAMA_MODEL
+
 # Embedding model
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+INGEST_EMBED_CHUNK_SIZE  = 256    # chunks handed to the cache/model per call during ingest (progress step)
+EMBEDDING_BACKEND        = os.getenv("EMBEDDING_BACKEND", "hf")  # "hf" (PyTorch) or "onnx" (ONNX Runtime, CPU)
+EMBEDDING_BATCH_SIZE     = 32     # texts per model forward pass
+EMBEDDING_THREADS        = 0      # ONNX Runtime intra-op threads; 0 = one per physical core
+EMBEDDING_MAX_SEQ_LENGTH = 256    # tokens (the model's own limit; longer text is truncated)
+EMBEDDING_ONNX_QUANTIZE  = True   # dynamic int8 weights for the ONNX backend
+EMBEDDING_MIN_AGREEMENT  = 0.98   # min cosine to the "hf" vectors for the ONNX model to be used
+
+# Embedding cache (shared by ingest and query)
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000   # ~77 MB for 384-dim float16 vectors
+EMBEDDING_CACHE_DTYPE       = "float16" # "float16" or "float32"
+EMBEDDING_CACHE_FLUSH_EVERY = 32        # new query embeddings buffered before a disk write
 
 # Ollama LLM model
-OLLAMA_MODEL    = "qwen2.5:7b-instruct-q4_K_M"
\ No newline at end of file
+OLLAMA_MODEL    = os.getenv("OLLAMA_MODEL", "qwen2.5:7b-instruct-q4_K_M")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# Shared LLM client (llm_client.py)
+LLM_TIMEOUT          = 120   # seconds per generate call (overridable per call)
+LLM_CONNECT_TIMEOUT  = 10
+LLM_MAX_RETRIES      = 2     # retries on connection errors / 429 / 5xx
+LLM_BACKOFF_SECONDS  = 1.0   # base of the exponential backoff
+LLM_MAX_CONNECTIONS  = 16    # keep-alive pool size
+OLLAMA_KEEP_ALIVE    = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps the model loaded after a call
+
+# API startup (warmup.py)
+WARMUP_ON_STARTUP      = True   # load the embedding model and the Ollama model in the background at startup
+WARMUP_LLM             = True   # include the Ollama model load (an empty-prompt request)
+LLM_KEEPALIVE_INTERVAL = 600    # seconds between keep-alive pings that stop Ollama unloading the model; 0 = once
+
+# Generation cache (MCQs / flashcards)
+GEN_CACHE_MEMORY_ENTRIES = 256              # in-process LRU tier
+GEN_CACHE_TTL_SECONDS    = 7 * 24 * 3600    # persistent (SQLite) tier
+
+# Question bank (pre-generated per-topic pools)
+QUESTION_BANK_AUTO_BUILD = True  # build/top up the bank at the end of every ingest job
+QUESTION_BANK_TARGET     = 20    # items per topic and kind built after ingest
+QUESTION_BANK_LOW_WATER  = 5     # unseen items for a student below which a topic is refilled
+QUESTION_BANK_REFILL     = 10    # items added per background refill
+QUESTION_BANK_MAX_ITEMS  = 200   # refills stop growing a topic's pool past this
+QUESTION_BANK_WORKERS    = 2     # topics generated concurrently while building
+
+# Chunk tagging (ingest)
+TAG_BATCH_SIZE  = 8     # chunks classified per LLM prompt
+TAG_WORKERS     = 4     # concurrent tagging requests in flight
+TAG_TIMEOUT     = 120   # seconds per batched tagging request
+TAG_MODE        = "similarity"  # "similarity" (embedding match + LLM fallback) or "llm"
+TAG_MARGIN_THRESHOLD = 0.03     # top-2 topic similarity gap below which the LLM decides
+TAG_MIN_SIMILARITY   = 0.15     # best similarity below this is tagged "General"
+
+# Chunk deduplication (ingest, dedup.py)
+DEDUP_CHUNKS        = True  # drop exact/near-duplicate chunks before tagging and embedding
+DEDUP_THRESHOLD     = 0.8   # word-shingle Jaccard similarity at which two chunks count as copies
+DEDUP_SHINGLE_WORDS = 3
+DEDUP_NUM_PERM      = 128   # MinHash signature length
+DEDUP_BANDS         = 32    # LSH bands (NUM_PERM / BANDS rows each); more bands = more candidates checked
+DEDUP_ACROSS_SOURCE_TYPES = False  # False: a chunk only absorbs copies from the same category, so
+                                   # source_type filters still see every category's material
@@ -0,0 +1,76 @@
+# dedup.py
+"""
+Exact and near-duplicate detection for chunks, run by ingest before tagging
+and embedding. Exact copies (after normalizing case, punctuation and
+whitespace) are matched by hash. Near copies are found with MinHash
+signatures over word shingles, bucketed with LSH. Each candidate pair is
+confirmed with the true Jaccard similarity of the shingle sets.
+"""
+import re
+import zlib
+import hashlib
+import numpy as np
+from config import DEDUP_THRESHOLD, DEDUP_SHINGLE_WORDS, DEDUP_NUM_PERM, DEDUP_BANDS
+
+_PRIME = np.uint64((1 << 61) - 1)
+_RNG = np.random.default_rng(20240607)   # fixed: signatures must be comparable across runs
+_A = _RNG.integers(1, 1 << 31, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_B = _RNG.integers(0, 1 << 31, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def normalize(text: str) -> str:
+    """Lowercase words only: OCR/extraction differences in spacing and punctuation disappear."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+def shingles(normalized: str, size: int = DEDUP_SHINGLE_WORDS) -> set:
+    """Hashes (32-bit) of the overlapping `size`-word windows of a normalized text."""
+    words = normalized.split()
+    if len(words) <= size:
+        return {zlib.crc32(normalized.encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+def minhash(shingle_set: set) -> np.ndarray:
+    """DEDUP_NUM_PERM-value signature: min of (a*x + b) mod p per hash function."""
+    x = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def find_duplicates(texts: list, scopes: list = None, threshold: float = DEDUP_THRESHOLD) -> list:
+    """
+    For each text, the index of the earlier text it duplicates, or its own
+    index if it is kept. Earlier texts win, so put chunks that must stay
+    (e.g. already stored ones) first. Texts only match within the same scope.
+    """
+    scopes = scopes or [""] * len(texts)
+    rows = DEDUP_NUM_PERM // DEDUP_BANDS
+    keep = list(range(len(texts)))
+    exact = {}        # (scope, normalized hash) -> kept index
+    buckets = {}      # (scope, band, band values) -> kept indices
+    kept_shingles = {}
+    for i, (text, scope) in enumerate(zip(texts, scopes)):
+        norm = normalize(text)
+        digest = hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest()
+        if (scope, digest) in exact:
+            keep[i] = exact[(scope, digest)]
+            continue
+        sh = shingles(norm)
+        sig = minhash(sh)
+        keys = [(scope, band, sig[band * rows:(band + 1) * rows].tobytes()) for band in range(DEDUP_BANDS)]
+        candidates = {j for key in keys for j in buckets.get(key, ())}
+        best, best_sim = None, threshold
+        for j in candidates:
+            sim = jaccard(sh, kept_shingles[j])
+            if sim >= best_sim:
+                best, best_sim = j, sim
+        if best is not None:
+            keep[i] = best
+            continue
+        exact[(scope, digest)] = i
+        kept_shingles[i] = sh
+        for key in keys:
+            buckets.setdefault(key, []).append(i)
+    return keep
@@ -0,0 +1,250 @@
+# embedding_backends.py
+"""
+Embedding model backends, selected by EMBEDDING_BACKEND in config.py:
+
+  "hf"    sentence-transformers (PyTorch, the reference)
+  "onnx"  the same model exported to ONNX and run with ONNX Runtime on CPU,
+          optionally with dynamic int8 weights (EMBEDDING_ONNX_QUANTIZE)
+
+The ONNX model is exported (and quantized) once into cache/onnx/<model>/ and
+checked against the reference backend on a sample corpus; if it disagrees, or
+onnxruntime is not installed, we fall back to "hf".
+
+    python -m embedding_backends --check            # agreement report for the configured backend
+"""
+import re
+import json
+import importlib.util
+import time
+import threading
+import numpy as np
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+from config import (CACHE_DIR, EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS,
+                    EMBEDDING_MAX_SEQ_LENGTH, EMBEDDING_ONNX_QUANTIZE, EMBEDDING_MIN_AGREEMENT)
+
+AGREEMENT_SAMPLE = [
+    "Breadth first search expands the shallowest node in the frontier first.",
+    "A heuristic is admissible if it never overestimates the cost to reach the goal.",
+    "Arc consistency removes values from a domain that cannot satisfy a binary constraint.",
+    "Backtracking search assigns one variable at a time and undoes assignments on failure.",
+    "The support vector machine chooses the hyperplane with the maximum margin.",
+    "The kernel trick computes inner products in a feature space without mapping the data.",
+    "Backpropagation applies the chain rule to compute gradients of the loss for every weight.",
+    "A perceptron outputs a weighted sum of its inputs passed through a step activation.",
+    "Define a constraint satisfaction problem.",
+    "Explain depth first search with an example.",
+    "What is overfitting and how does regularization reduce it?",
+    "Unit II: Constraint Satisfaction Problems",
+    "Normalization removes redundancy from relational database tables.",
+    "Ohm's law relates voltage, current and resistance in a circuit.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "Q. 3 (b) Compare BFS and DFS in terms of time and space complexity. [8 marks]",
+]
+
+def backend_name(backend: str = EMBEDDING_BACKEND) -> str:
+    """Cache namespace for the vectors a backend produces (int8 vectors differ slightly from fp32 ones)."""
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL}@onnx{'-int8' if EMBEDDING_ONNX_QUANTIZE else ''}"
+    return EMBEDDING_MODEL
+
+def expected_backend_name(backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Namespace make_embeddings() is expected to return, found without loading
+    a model: "onnx" counts as "hf" if onnxruntime is missing or the exported
+    model already failed its agreement check.
+    """
+    if backend != "onnx":
+        return backend_name("hf")
+    if importlib.util.find_spec("onnxruntime") is None:
+        return backend_name("hf")
+    report_path = _model_dir() / ("model.int8.agreement.json" if EMBEDDING_ONNX_QUANTIZE else "model.agreement.json")
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            if not json.load(f).get("ok", True):
+                return backend_name("hf")
+    except (OSError, ValueError):
+        pass
+    return backend_name("onnx")
+
+class HFEmbeddings(Embeddings):
+    """
+    The reference backend: a SentenceTransformer run directly, encoding the
+    way langchain_huggingface's HuggingFaceEmbeddings does by default
+    (newlines flattened, no normalization), so cached vectors stay valid.
+    Queries and documents use the same settings, so embed_queries() is one
+    encode() call for many queries.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: list) -> list:
+        texts = [t.replace("\n", " ") for t in texts]
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: list) -> list:
+        return self.embed_documents(texts)
+
+def hf_embeddings():
+    return HFEmbeddings()
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Mean-pooled, L2-normalized sentence embeddings (the all-MiniLM-L6-v2
+    pipeline) from an ONNX export of the transformer. Texts are sorted by
+    length before batching so each batch pads as little as possible.
+    """
+
+    def __init__(self, model_path: Path, tokenizer_dir: Path, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 threads: int = EMBEDDING_THREADS, max_length: int = EMBEDDING_MAX_SEQ_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_dir))
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def _encode(self, texts: list) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feed = {name: enc[name].astype(np.int64) for name in self.input_names if name in enc}
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feed:
+            feed["token_type_ids"] = np.zeros_like(enc["input_ids"], dtype=np.int64)
+        hidden = self.session.run(None, feed)[0]
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: list) -> list:
+        texts = list(texts)
+        out = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            for i, vec in zip(idx, self._encode([texts[i] for i in idx])):
+                out[i] = vec.tolist()
+        return out
+
+    def embed_query(self, text: str) -> list:
+        return self._encode([text])[0].tolist()
+
+    def embed_queries(self, texts: list) -> list:
+        return self.embed_documents(texts)
+
+# ---- export ----
+
+def _model_dir() -> Path:
+    return CACHE_DIR / "onnx" / re.sub(r"[^A-Za-z0-9_.-]+", "_", EMBEDDING_MODEL)
+
+def export_onnx(model_dir: Path = None, quantize: bool = EMBEDDING_ONNX_QUANTIZE) -> Path:
+    """Export EMBEDDING_MODEL to ONNX (and a dynamic int8 copy) once; returns the model file to load."""
+    model_dir = model_dir or _model_dir()
+    fp32, int8 = model_dir / "model.onnx", model_dir / "model.int8.onnx"
+    if not fp32.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        print(f"[DEBUG] Exporting {EMBEDDING_MODEL} to ONNX in {model_dir}...")
+        model_dir.mkdir(parents=True, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+        tokenizer.save_pretrained(str(model_dir))
+        model = AutoModel.from_pretrained(EMBEDDING_MODEL).eval()
+        sample = tokenizer(["warm up export"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        tmp = fp32.with_suffix(".tmp")
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(sample[n] for n in names), str(tmp),
+                              input_names=names, output_names=["last_hidden_state"],
+                              dynamic_axes={n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]},
+                              opset_version=14)
+        tmp.replace(fp32)
+    if quantize and not int8.exists():
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print("[DEBUG] Quantizing ONNX embedding model to int8...")
+        tmp = int8.with_suffix(".tmp")
+        quantize_dynamic(str(fp32), str(tmp), weight_type=QuantType.QInt8)
+        tmp.replace(int8)
+    return int8 if quantize else fp32
+
+# ---- agreement check ----
+
+def check_agreement(candidate: Embeddings, reference: Embeddings, texts: list = None,
+                    min_cosine: float = EMBEDDING_MIN_AGREEMENT) -> dict:
+    """
+    Compare two backends on the same texts: per-text cosine between their
+    vectors, and whether each text's nearest neighbours (rank order of the
+    similarity matrix) come out the same.
+    """
+    texts = texts or AGREEMENT_SAMPLE
+    started = time.perf_counter()
+    a = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    candidate_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    b = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    reference_ms = (time.perf_counter() - started) * 1000
+    a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    cosine = (a * b).sum(axis=1)
+    top_a = np.argsort(-(a @ a.T), axis=1)[:, 1:4]
+    top_b = np.argsort(-(b @ b.T), axis=1)[:, 1:4]
+    overlap = np.mean([len(set(x) & set(y)) / 3 for x, y in zip(top_a, top_b)]) if len(texts) > 3 else 1.0
+    return {"texts": len(texts), "min_cosine": round(float(cosine.min()), 5),
+            "mean_cosine": round(float(cosine.mean()), 5), "top3_overlap": round(float(overlap), 4),
+            "candidate_ms": round(candidate_ms, 1), "reference_ms": round(reference_ms, 1),
+            "ok": bool(cosine.min() >= min_cosine)}
+
+def _verified_onnx(model_path: Path) -> Embeddings:
+    """Load the ONNX model; the first time a given file is used, check it against the reference backend."""
+    model = OnnxEmbeddings(model_path, model_path.parent)
+    report_path = model_path.with_suffix(".agreement.json")
+    stamp = model_path.stat().st_mtime
+    report = None
+    if report_path.exists():
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    if not report or report.get("stamp") != stamp:
+        report = {**check_agreement(model, hf_embeddings()), "stamp": stamp}
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[DEBUG] ONNX embeddings vs reference: min cosine {report['min_cosine']}, "
+              f"mean {report['mean_cosine']}, top-3 overlap {report['top3_overlap']}")
+    if not report["ok"]:
+        raise ValueError(f"ONNX embeddings disagree with the reference (min cosine {report['min_cosine']} "
+                         f"< {EMBEDDING_MIN_AGREEMENT}); see {report_path}")
+    return model
+
+_LOCK = threading.Lock()
+
+def make_embeddings(backend: str = EMBEDDING_BACKEND):
+    """(base embeddings, cache namespace) for the configured backend, falling back to "hf"."""
+    with _LOCK:
+        if backend == "onnx":
+            try:
+                return _verified_onnx(export_onnx()), backend_name("onnx")
+            except Exception as e:
+                print(f"[WARN] ONNX embedding backend unavailable ({e}); using HuggingFace")
+        elif backend != "hf":
+            print(f"[WARN] Unknown EMBEDDING_BACKEND {backend!r}; using HuggingFace")
+        return hf_embeddings(), backend_name("hf")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="compare the ONNX backend with the reference")
+    parser.add_argument("--texts", type=Path, default=None, help="sample corpus, one text per line")
+    args = parser.parse_args()
+    if args.check:
+        texts = None
+        if args.texts:
+            texts = [line.strip() for line in args.texts.read_text(encoding="utf-8").splitlines() if line.strip()]
+        model = OnnxEmbeddings(export_onnx(), _model_dir())
+        print(json.dumps(check_agreement(model, hf_embeddings(), texts), indent=2))
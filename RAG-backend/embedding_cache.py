@@ -0,0 +1,176 @@
+import re
+import time
+import atexit
+import sqlite3
+import threading
+import numpy as np
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+from config import CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_DTYPE, EMBEDDING_CACHE_FLUSH_EVERY
+from utils.hash_utils import text_sha256
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed, on-disk cache in front of any LangChain embeddings.
+
+    Vectors (float16 by default) are rows of a SQLite table keyed by text
+    hash, under cache/embeddings/<model>/. The API and the ingest worker
+    share it safely: each row holds its key and vector together, and writers
+    only insert or delete rows. New vectors are buffered and written in one
+    transaction by flush(): ingest flushes once at the end, and queries every
+    EMBEDDING_CACHE_FLUSH_EVERY. Past max_entries the least recently used
+    rows are deleted. Documents and queries are cached separately, since
+    some models embed them differently.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 dtype: str = EMBEDDING_CACHE_DTYPE,
+                 cache_dir: Path = None):
+        self.base = base
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.cache_dir = Path(cache_dir or CACHE_DIR / "embeddings") / slug
+        self._lock = threading.Lock()
+        self._pending = {}        # key -> encoded vector, not written yet
+        self._touched = {}        # key -> last use of a cache hit, written with the next flush
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._conn = self._connect()
+        atexit.register(self.flush)
+
+    # ---- persistence ----
+
+    def _connect(self) -> sqlite3.Connection:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.cache_dir / "embeddings.sqlite3", timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")   # the ingest worker writes while the API reads
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+            CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value TEXT);
+        """)
+        meta = dict(conn.execute("SELECT name, value FROM cache_meta").fetchall())
+        if meta.get("model") != self.model_name or meta.get("dtype") != self.dtype.name:
+            # Rows written for another model or precision are unusable
+            conn.execute("DELETE FROM embeddings")
+            conn.executemany("INSERT OR REPLACE INTO cache_meta VALUES (?, ?)",
+                             [("model", self.model_name), ("dtype", self.dtype.name)])
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count:
+            print(f"[DEBUG] {count} cached embeddings for {self.model_name}")
+        return conn
+
+    def _decode(self, blob: bytes) -> list:
+        return np.frombuffer(blob, dtype=self.dtype).astype(np.float32).tolist()
+
+    def _lookup(self, keys: list) -> dict:
+        """key -> vector for the keys present in the buffer or on disk."""
+        found = {k: self._decode(self._pending[k]) for k in keys if k in self._pending}
+        rest = [k for k in keys if k not in found]
+        try:
+            for start in range(0, len(rest), 500):
+                batch = rest[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch).fetchall()
+                found.update((key, self._decode(blob)) for key, blob in rows)
+        except sqlite3.Error as e:
+            print(f"[WARN] Embedding cache read failed: {e}")
+        return found
+
+    def flush(self):
+        """Write buffered vectors and last-use times in one transaction, then evict past max_entries."""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            now = time.time()
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                                           [(k, v, now) for k, v in self._pending.items()])
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                           [(t, k) for k, t in self._touched.items()])
+                    excess = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+                    if excess > 0:
+                        self._conn.execute("DELETE FROM embeddings WHERE key IN "
+                                           "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+                        self.stats["evictions"] += excess
+            except sqlite3.Error as e:
+                print(f"[WARN] Embedding cache write failed: {e}")
+                return
+            self._pending.clear()
+            self._touched.clear()
+
+    # ---- cache core ----
+
+    def _key(self, kind: str, text: str) -> str:
+        return text_sha256(f"{self.model_name}\0{kind}\0{text}")
+
+    def _embed_cached(self, kind: str, texts: list, compute) -> list:
+        keys = [self._key(kind, t) for t in texts]
+        with self._lock:
+            found = self._lookup(list(dict.fromkeys(keys)))
+            now = time.time()
+            for key in found:
+                self._touched[key] = now
+        results = [found.get(key) for key in keys]
+        missing = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, []).append(i)
+        with self._lock:
+            self.stats["hits"] += len(texts) - sum(len(v) for v in missing.values())
+            self.stats["misses"] += sum(len(v) for v in missing.values())
+
+        if not missing:
+            return results
+
+        miss_keys = list(missing.keys())
+        fresh = compute([texts[missing[k][0]] for k in miss_keys])
+        for key, vec in zip(miss_keys, fresh):
+            for i in missing[key]:
+                results[i] = list(vec)
+
+        if self.max_entries <= 0:
+            return results
+        with self._lock:
+            for key, vec in zip(miss_keys, fresh):
+                self._pending[key] = np.asarray(vec, dtype=self.dtype).tobytes()
+            flush_now = kind != "doc" and len(self._pending) >= EMBEDDING_CACHE_FLUSH_EVERY
+        if flush_now:
+            self.flush()
+        return results
+
+    # ---- Embeddings interface ----
+
+    def embed_documents(self, texts: list) -> list:
+        return self._embed_cached("doc", list(texts), self.base.embed_documents)
+
+    def embed_query(self, text: str) -> list:
+        return self._embed_cached("query", [text], lambda ts: [self.base.embed_query(ts[0])])[0]
+
+    def embed_queries(self, texts: list) -> list:
+        """Query embeddings for several texts, computing the uncached ones in one model batch."""
+        return self._embed_cached("query", list(texts), self._embed_query_batch)
+
+    def _embed_query_batch(self, texts: list) -> list:
+        if hasattr(self.base, "embed_queries"):
+            return self.base.embed_queries(texts)
+        return [self.base.embed_query(t) for t in texts]
+
+    def cache_stats(self) -> dict:
+        with self._lock:
+            try:
+                stored = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            except sqlite3.Error:
+                stored = 0
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "entries": stored + len(self._pending), "capacity": self.max_entries,
+                    "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0}
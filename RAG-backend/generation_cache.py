@@ -0,0 +1,119 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from config import (CACHE_DIR, OLLAMA_MODEL, GEN_CACHE_MEMORY_ENTRIES, GEN_CACHE_TTL_SECONDS)
+from manifest import index_version
+from utils.hash_utils import text_sha256
+
+GEN_CACHE_DB = CACHE_DIR / "generation.sqlite3"
+
+# In-memory tier: key -> (expires_at, value), most recently used last
+_MEMORY = OrderedDict()
+_LOCK = threading.Lock()
+_STATS = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+_DB_READY = False
+
+def cache_key(kind: str, subject_code: str, query: str, count: int,
+              prompt_version: int, filters: dict = None, model: str = OLLAMA_MODEL) -> str:
+    """
+    Key for one generation request. The subject's index version is part of
+    the key, so re-ingesting a subject invalidates everything generated from
+    its previous contents.
+    """
+    parts = {
+        "kind": kind,
+        "subject_code": subject_code,
+        "query": query.strip().lower(),
+        "count": count,
+        "filters": filters or {},
+        "model": model,
+        "prompt_version": prompt_version,
+        "index_version": index_version(subject_code)
+    }
+    return text_sha256(json.dumps(parts, sort_keys=True, default=str))
+
+def _connect():
+    global _DB_READY
+    GEN_CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(GEN_CACHE_DB, timeout=5)
+    if not _DB_READY:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS generation_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT,
+                subject_code TEXT,
+                value TEXT,
+                created_at REAL,
+                expires_at REAL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_generation_expiry ON generation_cache(expires_at)")
+        conn.commit()
+        _DB_READY = True
+    return conn
+
+def _remember(key: str, expires_at: float, value):
+    _MEMORY[key] = (expires_at, value)
+    _MEMORY.move_to_end(key)
+    while len(_MEMORY) > GEN_CACHE_MEMORY_ENTRIES:
+        _MEMORY.popitem(last=False)
+
+def get_cached(key: str):
+    """Cached result for `key`, checking memory first and then disk; None on miss or expiry."""
+    now = time.time()
+    with _LOCK:
+        hit = _MEMORY.get(key)
+        if hit is not None:
+            if hit[0] > now:
+                _MEMORY.move_to_end(key)
+                _STATS["memory_hits"] += 1
+                return hit[1]
+            del _MEMORY[key]
+
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT value, expires_at FROM generation_cache WHERE key = ?",
+                               (key,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"[WARN] Generation cache read failed: {e}")
+        row = None
+
+    with _LOCK:
+        if row is None or row[1] <= now:
+            _STATS["misses"] += 1
+            return None
+        value = json.loads(row[0])
+        _remember(key, row[1], value)
+        _STATS["disk_hits"] += 1
+        return value
+
+def put_cached(key: str, value, kind: str, subject_code: str, ttl: float = GEN_CACHE_TTL_SECONDS):
+    """Store a result in both tiers. Empty results are not cached."""
+    if not value:
+        return
+    now = time.time()
+    with _LOCK:
+        _remember(key, now + ttl, value)
+        _STATS["stores"] += 1
+    try:
+        conn = _connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO generation_cache VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, kind, subject_code, json.dumps(value), now, now + ttl))
+            conn.execute("DELETE FROM generation_cache WHERE expires_at <= ?", (now,))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"[WARN] Generation cache write failed: {e}")
+
+def generation_cache_stats() -> dict:
+    with _LOCK:
+        lookups = _STATS["memory_hits"] + _STATS["disk_hits"] + _STATS["misses"]
+        hits = _STATS["memory_hits"] + _STATS["disk_hits"]
+        return {**_STATS, "memory_entries": len(_MEMORY),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
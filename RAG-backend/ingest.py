@@ -1,148 +1,578 @@
 import os
 import re
 import json
-import requests
+import time
+import uuid
+import llm_client
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from pypdf import PdfReader
 from textwrap import dedent
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from config import DATA_DIR, CHROMA_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, OLLAMA_MODEL
+from config import (DATA_DIR, CHROMA_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, OLLAMA_MODEL,
+                    TAG_BATCH_SIZE, TAG_WORKERS, TAG_TIMEOUT, TAG_MODE, INGEST_EMBED_CHUNK_SIZE,
+                    DEDUP_CHUNKS, DEDUP_ACROSS_SOURCE_TYPES)
 from utils.text_utils import is_junk, extract_text
+from utils.hash_utils import file_sha256
+from utils.parallel_extract import iter_extract_files
+from manifest import (CATEGORIES, MANIFEST_NAME, diff_files, empty_manifest, file_flag, file_key,
+                      load_manifest, manifest_path, save_manifest)
 from syllabus_extractor import extract_structured_syllabus
+from topic_tagger import GENERAL_TAG, tag_chunks_by_similarity
+from retriever import embeddings_name, get_embeddings, get_store, invalidate_store
+from lexical_index import build_lexical_index, lexical_index_exists
+from dedup import find_duplicates
+from metrics import stage_timer, set_labels
 
-def load_folder(folder: Path, tag: str):
-    docs = []
-    if not folder.exists():
-        return docs
-    for fname in os.listdir(folder):
-        if fname.lower().endswith(".pdf"):
-            fpath = folder / fname
-            print(f"📄 {tag.upper():11} | {fname}")
-            text = extract_text(fpath)
-            docs.append({"text": text, "source": fname, "source_type": tag})
-    print(f"Loaded {len(docs)} documents from {tag}")
-    return docs
-
-def tag_chunks_with_syllabus(chunks, syllabus_json, model_name):
+def scan_subject_files(subject_dir: Path) -> dict:
+    """Map "category/filename" -> {path, source, source_type, hash} for every PDF of a subject."""
+    files = {}
+    for category in CATEGORIES:
+        folder = subject_dir / category
+        if not folder.exists():
+            continue
+        for fname in sorted(os.listdir(folder)):
+            if fname.lower().endswith(".pdf"):
+                fpath = folder / fname
+                files[file_key(category, fname)] = {
+                    "path": fpath,
+                    "source": fname,
+                    "source_type": category,
+                    "hash": file_sha256(fpath)
+                }
+    return files
+
+def iter_load_files(entries: list, progress=None, failed: list = None):
     """
-    Uses LLM to assign unit and topic metadata to each chunk based on the syllabus.
+    Extract text for the given scanned file entries, yielding each file as it
+    completes. Files that could not be extracted are skipped and, if `failed`
+    is given, appended to it.
     """
-    if not syllabus_json:
-        return [{"unit": "General", "topic": "General", "subtopic": ""}] * len(chunks)
+    by_path = {Path(e["path"]): e for e in entries}
+    for entry in entries:
+        print(f"📄 {entry['source_type'].upper():11} | {entry['source']}")
+    started = time.perf_counter()
+    loaded = 0
+    for path, pages in iter_extract_files(list(by_path), progress=progress):
+        if pages is None:
+            if failed is not None:
+                failed.append(by_path[path])
+            continue
+        loaded += 1
+        yield {**by_path[path], "text": "\n\n".join(pages), "pages": len(pages)}
+    print(f"Loaded {loaded} documents in {time.perf_counter() - started:.1f}s")
 
-    # Prepare a compact syllabus summary for the LLM
+def build_syllabus_summary(syllabus_json) -> str:
+    """Compact unit/topic outline of the syllabus used in tagging prompts."""
     syllabus_summary = []
     for unit in syllabus_json:
         unit_info = f"- {unit['unitName']}\n"
         for topic in unit.get('topics', []):
             unit_info += f"  * {topic['topicName']}\n"
         syllabus_summary.append(unit_info)
-    syllabus_text = "\n".join(syllabus_summary)
-
-    tagged_metas = []
-    print(f"🏷️ Tagging {len(chunks)} chunks using {model_name}...")
-    
-    for i, chunk in enumerate(chunks):
-        if i % 10 == 0:
-            print(f"Processing chunk {i}/{len(chunks)}...")
-        
-        prompt = dedent(f"""
-        Categorize the following text chunk into the correct Unit and Topic from the provided syllabus.
-        
-        Syllabus Structure:
-        {syllabus_text}
-
-        Text Chunk:
-        \"\"\"{chunk[:500]}...\"\"\"
-
-        Output ONLY valid JSON with keys: "unit", "topic", "subtopic".
-        If it belongs to multiple or none, choose the best fit or "General".
-        """)
+    return "\n".join(syllabus_summary)
+
+def _normalize_tag(tags) -> dict:
+    if not isinstance(tags, dict):
+        return dict(GENERAL_TAG)
+    return {
+        "unit": tags.get("unit") or "General",
+        "topic": tags.get("topic") or "General",
+        "subtopic": tags.get("subtopic") or ""
+    }
+
+def _call_tagger(prompt: str, model_name: str, timeout: int):
+    data = llm_client.generate_sync(prompt, model=model_name, timeout=timeout, caller="tag_chunks_with_syllabus")
+    return json.loads(data.get("response", "{}"))
+
+def tag_single_chunk(chunk: str, syllabus_text: str, model_name: str) -> dict:
+    """Tag one chunk with its own prompt. Falls back to General on any failure."""
+    prompt = dedent(f"""
+    Categorize the following text chunk into the correct Unit and Topic from the provided syllabus.
+
+    Syllabus Structure:
+    {syllabus_text}
+
+    Text Chunk:
+    \"\"\"{chunk[:500]}...\"\"\"
+
+    Output ONLY valid JSON with keys: "unit", "topic", "subtopic".
+    If it belongs to multiple or none, choose the best fit or "General".
+    """)
+    try:
+        return _normalize_tag(_call_tagger(prompt, model_name, timeout=30))
+    except Exception:
+        return dict(GENERAL_TAG)
+
+def tag_chunk_batch(batch: list, syllabus_text: str, model_name: str) -> dict:
+    """
+    Tag a batch of (index, chunk) pairs with a single prompt.
+    Returns {index: tag} for every chunk the model answered cleanly; missing
+    indices are left for the caller to retry one at a time.
+    """
+    chunk_blocks = "\n\n".join(
+        f"[{idx}]\n\"\"\"{chunk[:500]}...\"\"\"" for idx, chunk in batch
+    )
+    prompt = dedent(f"""
+    Categorize each of the following text chunks into the correct Unit and Topic from the provided syllabus.
+
+    Syllabus Structure:
+    {syllabus_text}
+
+    Text Chunks (each prefixed by its index in square brackets):
+    {chunk_blocks}
+
+    Output ONLY valid JSON of the form:
+    {{"tags": [{{"index": 0, "unit": "...", "topic": "...", "subtopic": "..."}}]}}
+    Include exactly one entry per chunk index.
+    If a chunk belongs to multiple or none, choose the best fit or "General".
+    """)
 
+    parsed = _call_tagger(prompt, model_name, timeout=TAG_TIMEOUT)
+    entries = parsed.get("tags", []) if isinstance(parsed, dict) else parsed
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = {idx for idx, _ in batch}
+    tagged = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "format": "json"
-                },
-                timeout=30
-            )
-            data = response.json()
-            tags = json.loads(data.get("response", "{}"))
-            tagged_metas.append({
-                "unit": tags.get("unit", "General"),
-                "topic": tags.get("topic", "General"),
-                "subtopic": tags.get("subtopic", "")
-            })
-        except:
-            tagged_metas.append({"unit": "General", "topic": "General", "subtopic": ""})
+            idx = int(entry.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if idx in wanted and idx not in tagged:
+            tagged[idx] = _normalize_tag(entry)
+    return tagged
+
+def _no_progress(stage: str, done: int, total: int = None):
+    pass
+
+def tag_chunks_with_syllabus(chunks, syllabus_json, model_name,
+                             batch_size: int = TAG_BATCH_SIZE, workers: int = TAG_WORKERS,
+                             progress=None):
+    """
+    Uses LLM to assign unit and topic metadata to each chunk based on the syllabus.
+    Chunks are classified `batch_size` at a time, with up to `workers` batches in
+    flight. Chunks missing from a batch answer are retried individually.
+    """
+    progress = progress or _no_progress
+    if not syllabus_json:
+        return [dict(GENERAL_TAG) for _ in chunks]
+
+    syllabus_text = build_syllabus_summary(syllabus_json)
+    tagged_metas = [None] * len(chunks)
+    batch_size = max(1, batch_size)
+    batches = [
+        [(i, chunks[i]) for i in range(start, min(start + batch_size, len(chunks)))]
+        for start in range(0, len(chunks), batch_size)
+    ]
+    print(f"🏷️ Tagging {len(chunks)} chunks using {model_name} "
+          f"({len(batches)} batches of {batch_size}, {workers} workers)...")
 
+    started = time.perf_counter()
+    done = 0
+    retry = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(tag_chunk_batch, b, syllabus_text, model_name): b for b in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[WARN] Batch tagging failed ({e}); retrying {len(batch)} chunks singly")
+                result = {}
+            for idx, chunk in batch:
+                if idx in result:
+                    tagged_metas[idx] = result[idx]
+                else:
+                    retry.append((idx, chunk))
+            done += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"Processing chunk {done}/{len(chunks)}... "
+                  f"({done / max(elapsed, 1e-9):.2f} chunks/s)")
+            progress("tagging", done, len(chunks))
+
+        if retry:
+            print(f"🔁 Retrying {len(retry)} chunks one at a time...")
+            single = {pool.submit(tag_single_chunk, chunk, syllabus_text, model_name): idx
+                      for idx, chunk in retry}
+            for future in as_completed(single):
+                tagged_metas[single[future]] = future.result()
+
+    elapsed = time.perf_counter() - started
+    print(f"🏷️ Tagged {len(chunks)} chunks in {elapsed:.1f}s "
+          f"({len(chunks) / max(elapsed, 1e-9):.2f} chunks/s, {len(retry)} retried singly)")
     return tagged_metas
 
-def ingest_all(subject_code: str):
+def tag_chunks(chunks, vectors, syllabus_json, embeddings, mode: str = TAG_MODE, progress=None):
+    """
+    Tag chunks with unit/topic/subtopic.
+    - "similarity": embedding match against the syllabus; only low-margin
+      chunks go to the LLM.
+    - "llm": every chunk goes through the batched LLM tagger.
+    """
+    progress = progress or _no_progress
+    if mode != "similarity":
+        return tag_chunks_with_syllabus(chunks, syllabus_json, OLLAMA_MODEL, progress=progress)
+
+    started = time.perf_counter()
+    tags, uncertain = tag_chunks_by_similarity(vectors, syllabus_json, embeddings)
+    progress("tagging", len(chunks) - len(uncertain), len(chunks))
+    if uncertain:
+        offset = len(chunks) - len(uncertain)
+        llm_tags = tag_chunks_with_syllabus(
+            [chunks[i] for i in uncertain], syllabus_json, OLLAMA_MODEL,
+            progress=lambda stage, done, total: progress(stage, offset + done, len(chunks))
+        )
+        for i, tag_data in zip(uncertain, llm_tags):
+            tags[i] = tag_data
+    print(f"🏷️ Tagging finished in {time.perf_counter() - started:.1f}s "
+          f"({len(chunks) - len(uncertain)} by similarity, {len(uncertain)} by LLM)")
+    return tags
+
+def embed_in_batches(embeddings, texts, batch_size: int = INGEST_EMBED_CHUNK_SIZE, progress=None):
+    """embed_documents in slices so long ingests can report progress."""
+    progress = progress or _no_progress
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        with stage_timer("embed", items=len(batch)):
+            vectors.extend(embeddings.embed_documents(batch))
+        progress("embedding", len(vectors), len(texts))
+    return vectors
+
+def add_embedded_chunks(db, texts, vectors, metas, ids=None, batch_size: int = 1000, progress=None):
+    """
+    Write pre-computed embeddings straight into the Chroma collection.
+    If writing fails part way (or `progress` raises to cancel), the chunks
+    already written are removed again so the store matches the manifest.
+    """
+    progress = progress or _no_progress
+    if ids is None:
+        ids = [str(uuid.uuid4()) for _ in texts]
+    written = 0
+    try:
+        for start in range(0, len(texts), batch_size):
+            end = start + batch_size
+            with stage_timer("persist", items=len(ids[start:end])):
+                db._collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=[list(v) for v in vectors[start:end]],
+                    documents=texts[start:end],
+                    metadatas=metas[start:end]
+                )
+            written = min(end, len(texts))
+            progress("persisting", written, len(texts))
+    except BaseException:
+        if written:
+            db.delete(ids=ids[:written])
+        raise
+    return ids
+
+# ---- deduplicated chunks ----
+# A chunk that appeared in several files is stored once and listed under each
+# of those files in the manifest; its `all_sources` metadata (JSON list of
+# "category/filename") names them all, and a `file_flag(filename)` key set to
+# True per file lets source-file filters match it (False once a file is gone).
+
+def _set_sources(meta: dict, keys: list):
+    meta["all_sources"] = json.dumps(keys)
+    names = {key.partition("/")[2] for key in keys}
+    for field in [f for f in meta if f.startswith(file_flag(""))]:
+        meta[field] = False
+    meta.update({file_flag(name): True for name in names})
+
+def _chunk_owners(files: dict) -> dict:
+    """chunk id -> manifest keys of the files that contain it."""
+    owners = {}
+    for key, entry in files.items():
+        for chunk_id in entry.get("chunk_ids", []):
+            owners.setdefault(chunk_id, []).append(key)
+    return owners
+
+def _get_chunks(db, ids: list, include: list, batch_size: int = 5000) -> dict:
+    out = {"ids": [], **{field: [] for field in include}}
+    for start in range(0, len(ids), batch_size):
+        got = db._collection.get(ids=ids[start:start + batch_size], include=include)
+        for field in out:
+            out[field].extend(got[field])
+    return out
+
+def sync_chunk_sources(db, files: dict, chunk_ids: list):
+    """Rewrite all_sources of shared chunks from the manifest; a chunk whose own file is gone moves to another."""
+    chunk_ids = list(dict.fromkeys(chunk_ids))
+    if not chunk_ids:
+        return
+    owners = _chunk_owners(files)
+    got = _get_chunks(db, chunk_ids, ["metadatas"])
+    ids, metas = [], []
+    for chunk_id, meta in zip(got["ids"], got["metadatas"]):
+        keys = sorted(set(owners.get(chunk_id, [])))
+        if not keys:
+            continue
+        meta = dict(meta)
+        if file_key(meta.get("source_type", ""), meta.get("source", "")) not in keys:
+            category, _, filename = keys[0].partition("/")
+            meta.update(source=filename, source_type=category)
+        _set_sources(meta, keys)
+        ids.append(chunk_id)
+        metas.append(meta)
+    if ids:
+        db._collection.update(ids=ids, metadatas=metas)
+
+def release_chunks(db, files: dict, chunk_ids: list) -> int:
+    """Delete the chunks no file in `files` still uses; shared ones only lose the removed file as a source."""
+    owners = _chunk_owners(files)
+    orphaned = [c for c in dict.fromkeys(chunk_ids) if c not in owners]
+    if orphaned:
+        db.delete(ids=orphaned)
+    sync_chunk_sources(db, files, [c for c in chunk_ids if c in owners])
+    return len(orphaned)
+
+def dedupe_chunks(db, files: dict, keep_keys: list, texts: list, metas: list, owners: list):
+    """
+    Drop new chunks that repeat another new chunk or a stored chunk of the
+    files in `keep_keys` (exact or near copies, see dedup.py). Returns the
+    kept texts and metas, the files each kept chunk appeared in, a map of
+    stored chunk id -> new files repeating it, and the number dropped.
+    """
+    stored_ids = list(dict.fromkeys(c for k in keep_keys if k in files for c in files[k].get("chunk_ids", [])))
+    stored = _get_chunks(db, stored_ids, ["documents", "metadatas"])
+    scope = lambda m: "" if DEDUP_ACROSS_SOURCE_TYPES else m.get("source_type", "")
+    n = len(stored["ids"])
+    rep = find_duplicates(list(stored["documents"]) + list(texts),
+                          [scope(m) for m in stored["metadatas"]] + [scope(m) for m in metas])
+    kept, copies, shared = [], {}, {}
+    for i in range(len(texts)):
+        r = rep[n + i]
+        if r < n:
+            shared.setdefault(stored["ids"][r], set()).add(owners[i])
+        elif r != n + i:
+            copies.setdefault(r - n, set()).add(owners[i])
+        else:
+            kept.append(i)
+    sources = [sorted({owners[i]} | copies.get(i, set())) for i in kept]
+    kept_metas = []
+    for i, keys in zip(kept, sources):
+        if len(keys) > 1:
+            _set_sources(metas[i], keys)
+        kept_metas.append(metas[i])
+    return [texts[i] for i in kept], kept_metas, sources, shared, len(texts) - len(kept)
+
+def remove_file_vectors(subject_code: str, category: str, filename: str) -> int:
+    """Delete the chunks of one source file from the subject's vector store (shared chunks stay)."""
+    manifest = load_manifest(subject_code)
+    entry = manifest["files"].pop(file_key(category, filename), None)
+    if not entry:
+        return 0
+    chunk_ids = entry.get("chunk_ids", [])
+    removed = 0
+    if chunk_ids:
+        db = get_store(subject_code)
+        removed = release_chunks(db, manifest["files"], chunk_ids)
+        build_lexical_index(subject_code, db)
+    if category == "syllabus":
+        # Remaining chunks were tagged against this syllabus; retag on next ingest
+        manifest["syllabus"] = None
+        manifest["needs_rebuild"] = True
+    manifest["version"] += 1
+    save_manifest(subject_code, manifest)
+    print(f"🗑️ Removed {removed} chunks of {category}/{filename} from {subject_code}")
+    return removed
+
+def _load_syllabus_structure(current: dict, manifest: dict) -> list:
+    """Structured syllabus for tagging, re-extracted only when the syllabus PDF changed."""
+    syllabus_keys = [k for k, e in current.items() if e["source_type"] == "syllabus"]
+    if not syllabus_keys:
+        return []
+    entry = current[syllabus_keys[0]]
+    cached = manifest.get("syllabus")
+    if cached and cached.get("hash") == entry["hash"]:
+        return cached.get("units", [])
+
+    print(f"📜 Extracting syllabus structure for tagging...")
+    try:
+        units = extract_structured_syllabus(entry["path"])
+    except Exception as e:
+        print(f"Failed to extract syllabus: {e}")
+        return []
+    if units:
+        manifest["syllabus"] = {"hash": entry["hash"], "units": units}
+    return units
+
+def ingest_all(subject_code: str, force: bool = False, progress=None):
+    """
+    Bring the subject's vector store in line with its data folder.
+
+    Files are tracked in a per-subject manifest by content hash, so only new
+    or changed PDFs are extracted, tagged and embedded, and only the chunks of
+    removed or changed PDFs are deleted. A changed syllabus (or `force`)
+    rebuilds the whole store, since every chunk's topic tags depend on it;
+    so does switching the embedding backend (vectors would not be comparable).
+
+    `progress(stage, done, total)` is called as work advances through the
+    extracting, ocr, tagging, embedding and persisting stages; raising from
+    it aborts the ingest before the manifest is updated.
+    """
+    progress = progress or _no_progress
+    set_labels(subject=subject_code)
     subject_dir = DATA_DIR / subject_code
     subject_dir.mkdir(parents=True, exist_ok=True)
+    persist_dir = CHROMA_DIR / subject_code
 
-    # 1. First, find and extract structured syllabus if available
-    syllabus_path = None
-    syllabus_dir = subject_dir / "syllabus"
-    if syllabus_dir.exists():
-        pdfs = list(syllabus_dir.glob("*.pdf"))
-        if pdfs:
-            syllabus_path = pdfs[0]
-    
-    structured_syllabus = []
-    if syllabus_path:
-        print(f"📜 Extracting syllabus structure for tagging...")
-        try:
-            structured_syllabus = extract_structured_syllabus(syllabus_path)
-        except Exception as e:
-            print(f"Failed to extract syllabus: {e}")
+    current = scan_subject_files(subject_dir)
+    manifest = load_manifest(subject_code) if persist_dir.exists() else empty_manifest()
+    previous = manifest["files"]
+
+    prev_syllabus = {k: e["hash"] for k, e in previous.items() if e["source_type"] == "syllabus"}
+    curr_syllabus = {k: e["hash"] for k, e in current.items() if e["source_type"] == "syllabus"}
+    legacy_store = persist_dir.exists() and not manifest_path(subject_code).exists()
+    syllabus_changed = prev_syllabus != curr_syllabus or manifest.get("needs_rebuild", False)
+    # Compare without loading the model; only a suspected switch is confirmed
+    # by loading it (ONNX may fall back to HF, which would not be a switch)
+    recorded = manifest.get("embeddings") or EMBEDDING_MODEL
+    embedder_changed = bool(previous) and embeddings_name() != recorded
+    if embedder_changed:
+        embedder_changed = get_embeddings().model_name != recorded
+    if force or legacy_store or syllabus_changed or embedder_changed:
+        if previous:
+            reason = "forced" if force else "syllabus changed" if syllabus_changed else "embedding backend changed"
+            print(f"♻️ Full rebuild of {subject_code} ({reason})")
+        elif legacy_store:
+            print(f"♻️ Full rebuild of {subject_code} (store predates the ingest manifest)")
+        invalidate_store(subject_code)
+        # Persist the bumped version before deleting anything: if this rebuild
+        # fails, the version must not fall back to 0 and revalidate cache and
+        # bank rows from an older index. needs_rebuild makes the next run start over.
+        manifest = {**empty_manifest(), "version": manifest["version"] + 1,
+                    "syllabus": manifest.get("syllabus"), "needs_rebuild": True}
+        save_manifest(subject_code, manifest)
+        for entry in persist_dir.iterdir():
+            if entry.name == MANIFEST_NAME:
+                continue
+            if entry.is_dir():
+                import shutil
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+        manifest.pop("needs_rebuild")
+        previous = {}
+    persist_dir.mkdir(parents=True, exist_ok=True)
 
-    # 2. Load all docs
-    all_docs = []
-    all_docs += load_folder(subject_dir / "syllabus", "syllabus")
-    all_docs += load_folder(subject_dir / "notes", "notes")
-    all_docs += load_folder(subject_dir / "past_papers", "past_papers")
+    added, stale, unchanged = diff_files(previous, current)
+    report = {
+        "subject_code": subject_code,
+        "files_added": len(added),
+        "files_removed": len(stale),
+        "files_unchanged": len(unchanged),
+        "files_failed": [],
+        "chunks_added": 0,
+        "chunks_removed": 0,
+        "chunks_deduplicated": 0
+    }
+    if not added and not stale:
+        print(f"✅ {subject_code} is up to date ({len(unchanged)} files unchanged)")
+        report["total_chunks"] = len(_chunk_owners(previous))
+        if previous and not lexical_index_exists(subject_code):
+            # Store ingested before hybrid search existed
+            build_lexical_index(subject_code, get_store(subject_code))
+            save_manifest(subject_code, manifest)  # new stamp: API processes reload the index
+        return report
 
-    # 3. Split into chunks
+    # 1. Load and split only the new or changed files (before the model and store are
+    # opened: the extraction pool forks this process)
     splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    raw_chunks, metas = [], []
-    for d in all_docs:
-        file_chunks = splitter.split_text(d["text"])
-        for chunk in file_chunks:
+    raw_chunks, metas, owners, failed = [], [], [], []
+    for d in iter_load_files([{**current[k], "key": k} for k in added], progress=progress, failed=failed):
+        with stage_timer("split", subject_code):
+            file_chunks = splitter.split_text(d["text"])
+        for idx, chunk in enumerate(file_chunks):
             if chunk.strip():
                 raw_chunks.append(chunk)
+                owners.append(d["key"])
                 metas.append({
                     "subject_code": subject_code,
                     "source": d["source"],
-                    "source_type": d["source_type"]
+                    "source_type": d["source_type"],
+                    "chunk_index": idx
                 })
 
+    # Files that failed to extract stay out of the manifest, so the next ingest retries them
+    if failed:
+        added = [k for k in added if k not in {e["key"] for e in failed}]
+        report["files_added"] = len(added)
+        report["files_failed"] = sorted(e["key"] for e in failed)
+        print(f"[WARN] {len(failed)} files could not be extracted: {', '.join(report['files_failed'])}")
+
+    db = get_store(subject_code)
+    embeddings = get_embeddings()
+    if previous and embeddings.model_name != recorded:
+        # Loaded as something other than expected (e.g. ONNX fell back): new vectors
+        # would not be comparable with the stored ones, so rebuild on the next run
+        manifest["needs_rebuild"] = True
+        save_manifest(subject_code, manifest)
+        raise RuntimeError(f"Embedding backend loaded as {embeddings.model_name}, but {subject_code} "
+                           f"was built with {recorded}; ingest again to rebuild")
+    # The namespace of the backend that actually loaded (ONNX may have fallen back to HF)
+    manifest["embeddings"] = embeddings.model_name
+
+    # 2. Drop copies (within the new files and of unchanged files' chunks) before paying for them
+    sources = [[key] for key in owners]
+    shared = {}
+    if DEDUP_CHUNKS and raw_chunks:
+        with stage_timer("dedup", subject_code, items=len(raw_chunks)):
+            raw_chunks, metas, sources, shared, dropped = dedupe_chunks(db, previous, unchanged,
+                                                                        raw_chunks, metas, owners)
+        report["chunks_deduplicated"] = dropped
+        if dropped:
+            print(f"🧬 Dropped {dropped} duplicate chunks ({len(shared)} repeat already stored chunks)")
+
+    # 3. Embed once; the vectors are reused for tagging and for the store
+    vectors = embed_in_batches(embeddings, raw_chunks, progress=progress)
+    embeddings.flush()   # one embedding-cache write per ingest, not per batch
+
     # 4. Tag chunks if syllabus is available
+    structured_syllabus = _load_syllabus_structure(current, manifest) if raw_chunks else []
     if structured_syllabus:
-        tags = tag_chunks_with_syllabus(raw_chunks, structured_syllabus, OLLAMA_MODEL)
+        with stage_timer("tag", subject_code, items=len(raw_chunks)):
+            tags = tag_chunks(raw_chunks, vectors, structured_syllabus, embeddings, progress=progress)
         for i, tag_data in enumerate(tags):
             if i < len(metas):
                 metas[i].update(tag_data)
     else:
         for m in metas:
-            m.update({"unit": "General", "topic": "General", "subtopic": ""})
+            m.update(GENERAL_TAG)
 
+    # 5. Persist new chunks
+    ids = add_embedded_chunks(db, raw_chunks, vectors, metas, progress=progress)
 
+    # 6. Record chunk ownership in the manifest, then drop chunks only removed or changed files used
+    released = []
+    for key in stale:
+        released.extend(previous.pop(key).get("chunk_ids", []))
+    for key in added:
+        entry = current[key]
+        previous[key] = {"hash": entry["hash"], "source_type": entry["source_type"], "chunk_ids": []}
+    for chunk_id, keys in list(zip(ids, sources)) + list(shared.items()):
+        for key in keys:
+            previous[key]["chunk_ids"].append(chunk_id)
+    report["chunks_removed"] = release_chunks(db, previous, released)
+    sync_chunk_sources(db, previous, list(shared))
+    report["chunks_added"] = len(ids)
 
-    persist_dir = CHROMA_DIR / subject_code
-    if persist_dir.exists():
-        import shutil
-        shutil.rmtree(persist_dir)
-    persist_dir.mkdir(parents=True, exist_ok=True)
+    # 7. Rebuild the BM25 index over the whole store (saved next to it)
+    with stage_timer("lexical_index", subject_code):
+        report["lexical_terms"] = build_lexical_index(subject_code, db)
+
+    manifest["files"] = previous
+    manifest["version"] += 1
+    save_manifest(subject_code, manifest)
+    invalidate_store(subject_code)
 
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    db = Chroma.from_texts(raw_chunks, embeddings, metadatas=metas, persist_directory=str(persist_dir))
-    print(f"✅ {len(raw_chunks)} chunks stored with topic tagging for {subject_code}")
-    return db
\ No newline at end of file
+    report["total_chunks"] = len(_chunk_owners(previous))
+    print(f"✅ {subject_code}: +{report['chunks_added']} / -{report['chunks_removed']} chunks "
+          f"({report['total_chunks']} total, {len(unchanged)} files untouched)")
+    return report
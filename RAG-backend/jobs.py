@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+import multiprocessing
+import metrics
+from config import JOBS_DIR, JOB_STALE_SECONDS, QUESTION_BANK_AUTO_BUILD
+
+ACTIVE_STATES = ("queued", "running")
+STAGES = ["extracting", "ocr", "tagging", "embedding", "persisting"]
+BANK_STAGES = ["bank"]
+
+# Serialises dedup checks + job creation within this API process
+_JOBS_LOCK = threading.Lock()
+# Worker process handles started by this API process: job_id -> Process
+_PROCESSES = {}
+# Jobs whose worker metrics were merged into this process's /metrics
+_ABSORBED = set()
+_STARTED_AT = time.time()
+
+class JobCancelled(Exception):
+    pass
+
+# ---- job records ----
+
+def _job_path(job_id: str):
+    return JOBS_DIR / f"{job_id}.json"
+
+def _cancel_path(job_id: str):
+    return JOBS_DIR / f"{job_id}.cancel"
+
+def _write_job(job: dict):
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    job["updated_at"] = time.time()
+    path = _job_path(job["id"])
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp, path)
+
+def _read_job(job_id: str):
+    try:
+        with open(_job_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def get_job(job_id: str):
+    """
+    Current job record, or None if unknown. A job still marked active whose
+    worker stopped heart-beating is reported (and persisted) as failed.
+    """
+    job = _read_job(job_id)
+    if job is None:
+        return None
+    if job["status"] in ACTIVE_STATES:
+        # A question-bank job runs in the process of the ingest job that started it
+        proc = _PROCESSES.get(job_id) or _PROCESSES.get(job.get("parent_job"))
+        dead_here = proc is not None and not proc.is_alive()
+        stale = time.time() - job.get("updated_at", 0) > JOB_STALE_SECONDS
+        if dead_here or stale:
+            job.update(status="failed", finished_at=time.time(),
+                       error=job.get("error") or "Ingest worker exited unexpectedly")
+            _write_job(job)
+    return job
+
+def list_jobs(subject_code: str = None, kind: str = None) -> list:
+    if not JOBS_DIR.exists():
+        return []
+    jobs = []
+    for path in JOBS_DIR.glob("*.json"):
+        job = get_job(path.stem)
+        if (job and (subject_code is None or job["subject_code"] == subject_code)
+                and (kind is None or job.get("kind", "ingest") == kind)):
+            jobs.append(job)
+    return sorted(jobs, key=lambda j: j["created_at"], reverse=True)
+
+def active_job(subject_code: str, kind: str = "ingest"):
+    for job in list_jobs(subject_code, kind):
+        if job["status"] in ACTIVE_STATES:
+            return job
+    return None
+
+def _new_job(kind: str, subject_code: str, stages: list, **fields) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "subject_code": subject_code,
+        **fields,
+        "status": "queued",
+        "stage": None,
+        "progress": {stage: {"done": 0, "total": None} for stage in stages},
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+        "report": None
+    }
+
+# ---- API-side control ----
+
+def start_ingest_job(subject_code: str, force: bool = False):
+    """
+    Start ingest for a subject in a separate worker process and return
+    (job, created). If an ingest for the subject is already queued or
+    running, that job is returned instead of starting another.
+    """
+    with _JOBS_LOCK:
+        existing = active_job(subject_code)
+        if existing:
+            return existing, False
+        # A bank still being built targets the index this ingest is about to replace
+        building = active_job(subject_code, kind="question_bank")
+        if building:
+            cancel_job(building["id"])
+
+        job = _new_job("ingest", subject_code, STAGES, force=force)
+        _write_job(job)
+
+        # spawn: a clean interpreter, no inherited model/DB handles from the API process
+        proc = multiprocessing.get_context("spawn").Process(
+            target=run_ingest_job, args=(job["id"],), name=f"ingest-{subject_code}")
+        proc.start()
+        _PROCESSES[job["id"]] = proc
+        return job, True
+
+def run_when_idle(subject_code: str, work):
+    """
+    Run `work()` here unless an ingest of the subject is queued or running;
+    no ingest can start until it returns. Returns (active job, None) if one
+    was found, else (None, result). For index edits outside ingest jobs,
+    which a running ingest would overwrite with its own manifest.
+    """
+    with _JOBS_LOCK:
+        existing = active_job(subject_code)
+        if existing:
+            return existing, None
+        return None, work()
+
+def absorb_worker_metrics():
+    """
+    Merge the metrics snapshots of jobs that finished since this
+    process started (workers are separate processes with their own registry).
+    """
+    for job in list_jobs():
+        if (job["id"] in _ABSORBED or job["status"] in ACTIVE_STATES
+                or (job.get("finished_at") or 0) < _STARTED_AT):
+            continue
+        _ABSORBED.add(job["id"])
+        metrics.merge(job.get("metrics"))
+
+def cancel_job(job_id: str):
+    """Ask a running job to stop at its next progress checkpoint."""
+    job = get_job(job_id)
+    if job is None or job["status"] not in ACTIVE_STATES:
+        return job
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    _cancel_path(job_id).touch()
+    job["cancel_requested"] = True
+    return job
+
+# ---- worker side ----
+
+def _execute(job: dict, work, on_success=None) -> str:
+    """
+    Run `work(progress)` for a job record: heartbeat, progress and cancel
+    checkpoints, then the final status. `on_success(job)` may add fields to
+    the record before it is written as succeeded. Returns the final status.
+    """
+    job_id = job["id"]
+    job.update(status="running", started_at=time.time(), pid=os.getpid())
+    _write_job(job)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(JOB_STALE_SECONDS / 4):
+            with lock:
+                _write_job(job)
+
+    def progress(stage: str, done: int, total: int = None):
+        if _cancel_path(job_id).exists():
+            raise JobCancelled()
+        with lock:
+            job["stage"] = stage
+            job["progress"][stage] = {"done": done, "total": total}
+            # Throttle disk writes; the heartbeat catches up otherwise
+            if time.time() - job.get("updated_at", 0) > 0.5 or done == total:
+                _write_job(job)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    report = None
+    try:
+        report = work(progress)
+        status, error = "succeeded", None
+    except JobCancelled:
+        status, error = "cancelled", None
+        print(f"🛑 {job['kind'].replace('_', ' ').capitalize()} job {job_id} cancelled")
+    except Exception as e:
+        status, error = "failed", str(e)
+        traceback.print_exc()
+    finally:
+        stop.set()
+
+    with lock:
+        if status == "succeeded" and on_success:
+            on_success(job)
+        job.update(status=status, error=error, report=report, finished_at=time.time(),
+                   metrics=metrics.snapshot())
+        _write_job(job)
+    # The next job in this process reports only its own numbers
+    metrics.reset()
+    try:
+        _cancel_path(job_id).unlink()
+    except OSError:
+        pass
+    return status
+
+def run_ingest_job(job_id: str):
+    """
+    Entry point of the worker process. The ingest job succeeds as soon as the
+    index is committed; the question bank is then built under its own job
+    record (linked as `question_bank_job`), which clients need not wait for.
+    """
+    job = _read_job(job_id)
+    if job is None:
+        return
+    subject_code = job["subject_code"]
+    metrics.set_labels(subject=subject_code, endpoint="ingest_job")
+
+    def ingest(progress):
+        # Imported after the heartbeat starts: loading the ML stack can take a while
+        from ingest import ingest_all
+        return ingest_all(subject_code, force=job.get("force", False), progress=progress)
+
+    bank_job = None
+
+    def link_bank_job(ingest_job: dict):
+        nonlocal bank_job
+        bank_job = _new_job("question_bank", subject_code, BANK_STAGES, parent_job=job_id)
+        _write_job(bank_job)
+        ingest_job["question_bank_job"] = bank_job["id"]
+
+    status = _execute(job, ingest, on_success=link_bank_job if QUESTION_BANK_AUTO_BUILD else None)
+    if status != "succeeded" or bank_job is None:
+        return
+
+    def build(progress):
+        from question_bank import build_bank
+        return build_bank(subject_code, progress=progress)
+
+    metrics.set_labels(endpoint="question_bank_job")
+    _execute(bank_job, build)
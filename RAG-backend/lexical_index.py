@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from collections import Counter, OrderedDict
+from config import CHROMA_DIR, MAX_OPEN_STORES, BM25_K1, BM25_B
+from manifest import file_flag, manifest_stamp
+
+INDEX_ARRAYS = "lexical_index.npz"
+INDEX_META = "lexical_index.json"
+# Metadata fields the retriever can filter on
+FILTER_FIELDS = ("source_type", "unit", "topic", "source")
+
+# Keeps exact-term tokens like "ao*", "c++", "c#", "cs3491" intact
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9*+#]*")
+
+# Loaded indexes, most recently used last: subject_code -> (stamp, LexicalIndex | None)
+_INDEXES = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
+class LexicalIndex:
+    """
+    BM25 over a subject's chunks, held as flat numpy arrays: the postings
+    of term t are doc_ids/tfs[term_ptr[t]:term_ptr[t + 1]]. Filter fields
+    are stored as integer codes per chunk so metadata filters are a mask.
+    Deduplicated chunks shared with other files are also listed per file
+    name in `shared`, so a "source" filter matches them too.
+    """
+
+    def __init__(self, ids, vocab, term_ptr, doc_ids, tfs, doc_len, columns, shared=None):
+        self.ids = ids
+        self.vocab = vocab
+        self.term_ptr = term_ptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.columns = columns   # field -> (values, codes)
+        self.shared = shared or {}   # file name -> positions of chunks it shares
+        n = len(ids)
+        df = np.diff(term_ptr).astype(np.float32)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg = float(doc_len.mean()) if n else 1.0
+        self.norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(avg, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def build(cls, ids: list, texts: list, metadatas: list):
+        postings = {}
+        doc_len = np.zeros(len(ids), dtype=np.float32)
+        for d, text in enumerate(texts):
+            counts = Counter(tokenize(text or ""))
+            doc_len[d] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((d, tf))
+
+        vocab, term_ptr, doc_ids, tfs = {}, [0], [], []
+        for t, (term, plist) in enumerate(sorted(postings.items())):
+            vocab[term] = t
+            doc_ids.extend(d for d, _ in plist)
+            tfs.extend(tf for _, tf in plist)
+            term_ptr.append(len(doc_ids))
+
+        columns = {}
+        for field in FILTER_FIELDS:
+            values, codes = {}, np.empty(len(ids), dtype=np.int32)
+            for d, meta in enumerate(metadatas):
+                codes[d] = values.setdefault(str((meta or {}).get(field, "")), len(values))
+            columns[field] = (list(values), codes)
+        shared, flag = {}, file_flag("")
+        for d, meta in enumerate(metadatas):
+            for field, value in (meta or {}).items():
+                if value is True and field.startswith(flag):
+                    shared.setdefault(field[len(flag):], []).append(d)
+        return cls(list(ids), vocab, np.asarray(term_ptr, dtype=np.int64),
+                   np.asarray(doc_ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32),
+                   doc_len, columns, shared)
+
+    def save(self, directory):
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {"term_ptr": self.term_ptr, "doc_ids": self.doc_ids, "tfs": self.tfs, "doc_len": self.doc_len}
+        arrays.update({f"col_{field}": codes for field, (_, codes) in self.columns.items()})
+        tmp = directory / (INDEX_ARRAYS + ".tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, directory / INDEX_ARRAYS)
+        tmp = directory / (INDEX_META + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "vocab": self.vocab,
+                       "columns": {field: values for field, (values, _) in self.columns.items()},
+                       "shared": self.shared}, f)
+        os.replace(tmp, directory / INDEX_META)
+
+    @classmethod
+    def load(cls, directory):
+        with np.load(directory / INDEX_ARRAYS) as arrays, \
+                open(directory / INDEX_META, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+            columns = {field: (values, arrays[f"col_{field}"]) for field, values in meta["columns"].items()}
+            return cls(meta["ids"], meta["vocab"], arrays["term_ptr"], arrays["doc_ids"],
+                       arrays["tfs"], arrays["doc_len"], columns, meta.get("shared"))
+
+    def _mask(self, filters: dict):
+        mask = None
+        for field, wanted in (filters or {}).items():
+            if not wanted or field not in self.columns:
+                continue
+            wanted = [wanted] if isinstance(wanted, str) else wanted
+            values, codes = self.columns[field]
+            allowed = [i for i, v in enumerate(values) if v in wanted]
+            field_mask = np.isin(codes, allowed)
+            if field == "source":
+                field_mask[[d for name in wanted for d in self.shared.get(name, ())]] = True
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def search(self, query: str, n: int, filters: dict = None) -> list:
+        """Ids of the top-n chunks by BM25, restricted to chunks matching `filters` (field -> values)."""
+        terms = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not terms or not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for t in terms:
+            lo, hi = self.term_ptr[t], self.term_ptr[t + 1]
+            docs, tf = self.doc_ids[lo:hi], self.tfs[lo:hi]
+            scores[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + self.norm[docs])
+        mask = self._mask(filters)
+        if mask is not None:
+            scores[~mask] = 0.0
+        hits = np.flatnonzero(scores)
+        if len(hits) > n:
+            hits = hits[np.argpartition(-scores[hits], n - 1)[:n]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [self.ids[d] for d in hits]
+
+def build_lexical_index(subject_code: str, db) -> int:
+    """(Re)build the subject's index from everything in its vector store and save it next to it."""
+    data = db._collection.get(include=["documents", "metadatas"])
+    index = LexicalIndex.build(data["ids"], data["documents"], data["metadatas"])
+    index.save(CHROMA_DIR / subject_code)
+    print(f"[DEBUG] Lexical index for {subject_code}: {len(index.ids)} chunks, {len(index.vocab)} terms")
+    return len(index.vocab)
+
+def lexical_index_exists(subject_code: str) -> bool:
+    directory = CHROMA_DIR / subject_code
+    return (directory / INDEX_ARRAYS).exists() and (directory / INDEX_META).exists()
+
+def get_lexical_index(subject_code: str):
+    """The subject's loaded index (reloaded after a re-ingest), or None if it has none."""
+    stamp = manifest_stamp(subject_code)
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(subject_code)
+        if cached is not None and cached[0] == stamp:
+            _INDEXES.move_to_end(subject_code)
+            return cached[1]
+        index = None
+        if lexical_index_exists(subject_code):
+            try:
+                index = LexicalIndex.load(CHROMA_DIR / subject_code)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARN] Unreadable lexical index for {subject_code}: {e}")
+        _INDEXES[subject_code] = (stamp, index)
+        _INDEXES.move_to_end(subject_code)
+        while len(_INDEXES) > MAX_OPEN_STORES:
+            _INDEXES.popitem(last=False)
+        return index
@@ -0,0 +1,243 @@
+import json
+import time
+import random
+import asyncio
+import threading
+import httpx
+import metrics
+from contextvars import ContextVar
+from metrics import stage_timer, observe_stage, count_error
+from config import (OLLAMA_BASE_URL, OLLAMA_MODEL, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT,
+                    LLM_MAX_RETRIES, LLM_BACKOFF_SECONDS, LLM_MAX_CONNECTIONS, OLLAMA_KEEP_ALIVE)
+
+# Shared clients: one keep-alive pool per event loop (async) and one per process (sync)
+_ASYNC_CLIENT = None
+_ASYNC_LOOP = None
+_SYNC_CLIENT = None
+_SYNC_LOCK = threading.Lock()
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Ollama's per-call accounting (durations are reported in nanoseconds)
+USAGE_LABELS = ("caller", "model", "endpoint")
+LLM_CALLS = metrics.Counter("rag_llm_calls_total", "LLM calls with Ollama accounting", USAGE_LABELS)
+LLM_TOKENS = metrics.Counter("rag_llm_tokens_total", "Prompt and generated tokens",
+                             USAGE_LABELS + ("kind",))
+LLM_PROMPT_CHARS = metrics.Counter("rag_llm_prompt_chars_total", "Prompt size in characters", USAGE_LABELS)
+LLM_PHASE_SECONDS = metrics.Histogram("rag_llm_phase_duration_seconds",
+                                      "Ollama-reported load, prompt eval and eval time per call",
+                                      USAGE_LABELS + ("phase",))
+PHASES = (("load", "load_duration"), ("prompt_eval", "prompt_eval_duration"),
+          ("eval", "eval_duration"), ("total", "total_duration"))
+
+# Per-request list that receives each call's usage when a caller asked for it (debug=true)
+_CAPTURE = ContextVar("llm_usage_capture", default=None)
+
+class LLMError(Exception):
+    """The LLM call failed after all retries (or with a non-retryable error)."""
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=60)
+
+def _timeout(seconds: float = None) -> httpx.Timeout:
+    return httpx.Timeout(seconds or LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+def get_async_client() -> httpx.AsyncClient:
+    global _ASYNC_CLIENT, _ASYNC_LOOP
+    loop = asyncio.get_running_loop()
+    if _ASYNC_CLIENT is None or _ASYNC_LOOP is not loop or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(base_url=OLLAMA_BASE_URL, limits=_limits(), timeout=_timeout())
+        _ASYNC_LOOP = loop
+    return _ASYNC_CLIENT
+
+def get_sync_client() -> httpx.Client:
+    global _SYNC_CLIENT
+    with _SYNC_LOCK:
+        if _SYNC_CLIENT is None or _SYNC_CLIENT.is_closed:
+            _SYNC_CLIENT = httpx.Client(base_url=OLLAMA_BASE_URL, limits=_limits(), timeout=_timeout())
+        return _SYNC_CLIENT
+
+async def aclose():
+    """Close the async pool (called on API shutdown)."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+        _ASYNC_CLIENT = None
+
+# ---- usage accounting ----
+
+def capture_usage() -> list:
+    """Collect the usage of every LLM call made from the current request/context into the returned list."""
+    calls = []
+    _CAPTURE.set(calls)
+    return calls
+
+def record_usage(caller: str, model: str, prompt: str, data: dict) -> dict:
+    """Record Ollama's token/timing fields of one finished call (a response or final stream event)."""
+    model = data.get("model") or model or OLLAMA_MODEL
+    labels = {"caller": caller, "model": model, "endpoint": metrics.current_endpoint()}
+    usage = {**labels, "prompt_chars": len(prompt),
+             "prompt_tokens": data.get("prompt_eval_count", 0),
+             "eval_tokens": data.get("eval_count", 0)}
+    for phase, field in PHASES:
+        usage[f"{phase}_s"] = round(data.get(field, 0) / 1e9, 4)
+    usage["tokens_per_s"] = round(usage["eval_tokens"] / usage["eval_s"], 2) if usage["eval_s"] else None
+
+    LLM_CALLS.inc(**labels)
+    LLM_PROMPT_CHARS.inc(usage["prompt_chars"], **labels)
+    LLM_TOKENS.inc(usage["prompt_tokens"], kind="prompt", **labels)
+    LLM_TOKENS.inc(usage["eval_tokens"], kind="eval", **labels)
+    for phase, _ in PHASES:
+        LLM_PHASE_SECONDS.observe(usage[f"{phase}_s"], phase=phase, **labels)
+
+    captured = _CAPTURE.get()
+    if captured is not None:
+        captured.append(usage)
+    return usage
+
+def usage_summary() -> dict:
+    """Calls, tokens and Ollama time per endpoint and caller (includes merged ingest-worker numbers)."""
+    summary = {}
+
+    def entry(key):
+        caller, model, endpoint = key[:3]
+        return summary.setdefault(endpoint or "(none)", {}).setdefault(caller, {
+            "model": model, "calls": 0, "prompt_chars": 0, "prompt_tokens": 0, "eval_tokens": 0})
+
+    for key, calls in LLM_CALLS.values().items():
+        entry(key)["calls"] += int(calls)
+    for key, chars in LLM_PROMPT_CHARS.values().items():
+        entry(key)["prompt_chars"] += int(chars)
+    for key, tokens in LLM_TOKENS.values().items():
+        entry(key)[f"{key[3]}_tokens"] += int(tokens)
+    for key, (seconds, _) in LLM_PHASE_SECONDS.totals().items():
+        e = entry(key)
+        e[f"{key[3]}_s"] = round(e.get(f"{key[3]}_s", 0.0) + seconds, 3)
+    for callers in summary.values():
+        for e in callers.values():
+            calls = e["calls"] or 1
+            e["avg_prompt_tokens"] = round(e["prompt_tokens"] / calls, 1)
+            e["avg_load_s"] = round(e.get("load_s", 0.0) / calls, 3)
+            e["avg_prompt_eval_s"] = round(e.get("prompt_eval_s", 0.0) / calls, 3)
+            e["avg_eval_s"] = round(e.get("eval_s", 0.0) / calls, 3)
+            e["eval_tokens_per_s"] = round(e["eval_tokens"] / e["eval_s"], 2) if e.get("eval_s") else None
+    return summary
+
+def _payload(prompt: str, model: str, stream: bool, format: str, options: dict) -> dict:
+    payload = {"model": model or OLLAMA_MODEL, "prompt": prompt, "stream": stream, "keep_alive": OLLAMA_KEEP_ALIVE}
+    if format:
+        payload["format"] = format
+    if options:
+        payload["options"] = options
+    return payload
+
+def _backoff(attempt: int) -> float:
+    return LLM_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+def _retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRY_STATUS
+    return isinstance(exc, httpx.TransportError)
+
+def _check(response: httpx.Response):
+    if response.status_code != 200:
+        raise httpx.HTTPStatusError(f"Ollama returned {response.status_code}: {response.text[:200]}",
+                                    request=response.request, response=response)
+
+async def load_model(model: str = None, timeout: float = None) -> dict:
+    """
+    Ask Ollama to load the model without generating anything (an empty prompt)
+    and keep it resident for OLLAMA_KEEP_ALIVE. Used for startup warm-up and
+    keep-alive pings; not recorded as an LLM call.
+    """
+    client = get_async_client()
+    payload = {"model": model or OLLAMA_MODEL, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE}
+    response = await client.post("/api/generate", json=payload, timeout=_timeout(timeout))
+    _check(response)
+    return response.json()
+
+async def generate(prompt: str, model: str = None, format: str = "json", options: dict = None,
+                   timeout: float = None, retries: int = LLM_MAX_RETRIES, caller: str = "unknown") -> dict:
+    """
+    Non-streaming /api/generate call. Returns Ollama's full JSON response.
+    Its token/timing fields are recorded under `caller` (see record_usage).
+    """
+    client = get_async_client()
+    payload = _payload(prompt, model, False, format, options)
+    for attempt in range(retries + 1):
+        try:
+            with stage_timer("llm_call"):
+                response = await client.post("/api/generate", json=payload, timeout=_timeout(timeout))
+                _check(response)
+                data = response.json()
+            record_usage(caller, model, prompt, data)
+            return data
+        except (httpx.HTTPError, ValueError) as e:
+            if attempt >= retries or not _retryable(e):
+                raise LLMError(str(e)) from e
+            delay = _backoff(attempt)
+            print(f"[WARN] LLM call failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def stream_generate(prompt: str, model: str = None, format: str = "json", options: dict = None,
+                          timeout: float = None, retries: int = LLM_MAX_RETRIES, caller: str = "unknown"):
+    """
+    Streaming /api/generate call. Yields Ollama's per-token JSON events and
+    returns only after the final ("done") one; anything else raises LLMError.
+    Connection failures are retried only until the first event arrives.
+    """
+    client = get_async_client()
+    payload = _payload(prompt, model, True, format, options)
+    for attempt in range(retries + 1):
+        started = False
+        t0 = time.perf_counter()
+        try:
+            async with client.stream("POST", "/api/generate", json=payload, timeout=_timeout(timeout)) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                _check(response)
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    if not started:
+                        observe_stage("llm_first_token", time.perf_counter() - t0)
+                    started = True
+                    event = json.loads(line)
+                    if event.get("done"):
+                        observe_stage("llm_call", time.perf_counter() - t0)
+                        record_usage(caller, model, prompt, event)
+                    yield event
+                    if event.get("done"):
+                        return
+            # Connection closed cleanly but without Ollama's final event: the output is truncated
+            count_error("llm_call")
+            raise LLMError("Ollama stream ended before the done event")
+        except (httpx.HTTPError, ValueError) as e:
+            count_error("llm_call")
+            if started or attempt >= retries or not _retryable(e):
+                raise LLMError(str(e)) from e
+            delay = _backoff(attempt)
+            print(f"[WARN] LLM stream failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def generate_sync(prompt: str, model: str = None, format: str = "json", options: dict = None,
+                  timeout: float = None, retries: int = LLM_MAX_RETRIES, caller: str = "unknown") -> dict:
+    """Blocking variant of generate() for ingest worker threads and scripts."""
+    client = get_sync_client()
+    payload = _payload(prompt, model, False, format, options)
+    for attempt in range(retries + 1):
+        try:
+            with stage_timer("llm_call"):
+                response = client.post("/api/generate", json=payload, timeout=_timeout(timeout))
+                _check(response)
+                data = response.json()
+            record_usage(caller, model, prompt, data)
+            return data
+        except (httpx.HTTPError, ValueError) as e:
+            if attempt >= retries or not _retryable(e):
+                raise LLMError(str(e)) from e
+            delay = _backoff(attempt)
+            print(f"[WARN] LLM call failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
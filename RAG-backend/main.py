@@ -1,3 +1,4 @@
+import asyncio
 from ingest import ingest_all
 from retriever import get_context_scoped
 from mcq_generator import generate_mcqs
@@ -25,14 +26,18 @@ def main():
         "regulation": "R2021"
     }
 
-    # Step 3: Generate MCQs from same context
-    mcqs = generate_mcqs(student_info, context_fundamentals)
+    # Step 3: Generate MCQs and flashcards from the same context concurrently
+    async def generate_both():
+        return await asyncio.gather(
+            generate_mcqs(student_info, context_fundamentals),
+            generate_flashcards(student_info, context_fundamentals, num_cards=8))
+    mcqs, flashcards = asyncio.run(generate_both())
+    mcqs, flashcards = mcqs or [], flashcards or []
+
     print(f"\n✅ Generated {len(mcqs)} MCQs")
     for m in mcqs:
         print(f"Q: {m['question']}\nOptions: {m['options']}\nAnswer: {m['correct_option']}\n")
 
-    # Step 4: Generate flashcards from same context_fundamentals
-    flashcards = generate_flashcards(student_info, context_fundamentals, num_cards=8) or []
     print(f"\n✅ Generated {len(flashcards)} flashcards")
     for f in flashcards:
         print(f"Front: {f['front']}\nBack: {f['back']}\n")
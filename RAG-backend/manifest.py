@@ -0,0 +1,81 @@
+import os
+import json
+from pathlib import Path
+from config import CHROMA_DIR
+
+MANIFEST_NAME = "manifest.json"
+CATEGORIES = ["syllabus", "notes", "past_papers"]
+
+def manifest_path(subject_code: str) -> Path:
+    return CHROMA_DIR / subject_code / MANIFEST_NAME
+
+def empty_manifest() -> dict:
+    return {"version": 0, "files": {}, "syllabus": None}
+
+def load_manifest(subject_code: str) -> dict:
+    """
+    Per-subject record of what is in the vector store:
+    {
+      "version": int,             # bumped on every change to the index
+      "files": {"notes/x.pdf": {"hash": ..., "source_type": ..., "chunk_ids": [...]}},
+      "syllabus": {"hash": ..., "units": [...]} | None
+      "embeddings": "<model>[@onnx[-int8]]"  # backend the stored vectors came from
+    }
+    """
+    path = manifest_path(subject_code)
+    if not path.exists():
+        return empty_manifest()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[WARN] Unreadable manifest for {subject_code}, starting fresh: {e}")
+        return empty_manifest()
+    manifest = empty_manifest()
+    manifest.update(data)
+    return manifest
+
+def save_manifest(subject_code: str, manifest: dict):
+    """Write the manifest atomically so readers never see a half-written file."""
+    path = manifest_path(subject_code)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def index_version(subject_code: str) -> int:
+    """Current index version of a subject (0 if it was never ingested)."""
+    return int(load_manifest(subject_code).get("version", 0))
+
+def manifest_stamp(subject_code: str):
+    """
+    Cheap change marker for a subject's index (manifest mtime), or None if the
+    subject has no manifest. Used by in-process caches to notice re-ingests
+    done by other processes without parsing the manifest.
+    """
+    try:
+        return manifest_path(subject_code).stat().st_mtime_ns
+    except OSError:
+        return None
+
+def diff_files(previous: dict, current: dict):
+    """
+    Compare manifest entries with a fresh scan (both keyed "category/filename"
+    with a "hash"). Returns (added, stale, unchanged) keys: new or changed files
+    to ingest, removed or changed files whose chunks go, and files to keep.
+    """
+    added = [k for k in current if k not in previous or previous[k]["hash"] != current[k]["hash"]]
+    stale = [k for k in previous if k not in current or previous[k]["hash"] != current[k]["hash"]]
+    unchanged = [k for k in current if k not in added]
+    return added, stale, unchanged
+
+def file_key(category: str, filename: str) -> str:
+    return f"{category}/{filename}"
+
+def file_flag(filename: str) -> str:
+    """
+    Boolean metadata key marking a deduplicated chunk as part of `filename`,
+    so a source-file filter also finds chunks stored under another file.
+    """
+    return f"in_file:{filename}"
@@ -1,35 +1,18 @@
 import os
 import json
 import re
-import requests
+import llm_client
 from textwrap import dedent
+from utils.generation_utils import context_to_text, repair_json_string, stream_items
+from metrics import stage_timer
 
 try:
     from config import OLLAMA_MODEL
 except ImportError:
     OLLAMA_MODEL = "qwen2.5:7b" 
 
-MAX_CONTEXT_CHARS = 12000
-
-def repair_json_string(bad_json: str) -> str:
-    """Extract and repair common JSON issues from LLM output."""
-    match = re.search(r"(\[.*\])", bad_json, re.DOTALL)
-    if match:
-        json_part = match.group(1)
-    else:
-        # Match dict in case it returned {"mcqs": [...]}
-        match_obj = re.search(r"(\{.*\})", bad_json, re.DOTALL)
-        if match_obj:
-            json_part = match_obj.group(1)
-        else:
-            json_part = bad_json
-
-    # Control chars removal
-    json_part = re.sub(r"[\x00-\x1F\x7F]", " ", json_part)
-    # Remove trailing commas
-    json_part = re.sub(r",\s*(\]|\})", r"\1", json_part)
-    
-    return json_part.strip()
+# Bump when the prompt changes so cached generations are not reused
+PROMPT_VERSION = 1
 
 def validate_mcq_list(data):
     """
@@ -114,36 +97,7 @@ def validate_mcq_list(data):
 
     return cleaned
 
-def generate_mcqs(student_info: dict, context: list | dict | str, num_mcqs: int = 5):
-    """
-    Generate clean MCQ list from context.
-    Using strictly JSON format and robust parsing.
-    """
-    # 1. Process Context
-    ctx_str = ""
-    if isinstance(context, str):
-        ctx_str = context
-    elif isinstance(context, dict):
-        ctx_str = context.get("page_content") or context.get("text", "")
-    elif isinstance(context, list):
-        parts = []
-        for item in context:
-            if isinstance(item, str):
-                parts.append(item)
-            elif isinstance(item, dict):
-                parts.append(item.get("page_content") or item.get("text", ""))
-            elif hasattr(item, "page_content"):
-                parts.append(item.page_content)
-        ctx_str = "\n\n".join(parts)
-
-    if not ctx_str.strip():
-        print("[DEBUG] Empty context provided to generate_mcqs")
-        return []
-
-    if len(ctx_str) > MAX_CONTEXT_CHARS:
-        ctx_str = ctx_str[:MAX_CONTEXT_CHARS]
-
-    # 2. Construct Prompt
+def build_mcq_prompt(student_info: dict, ctx_str: str, num_mcqs: int) -> str:
     # Explicitly asking for a JSON object with a specific key structure is safer.
     prompt = dedent(f"""
     You are an expert exam creator.
@@ -174,68 +128,86 @@ def generate_mcqs(student_info: dict, context: list | dict | str, num_mcqs: int
     
     Do not include any Markdown formatting (no ```json blocks). Just the raw JSON.
     """)
+    return prompt
+
+async def generate_mcqs(student_info: dict, context: list | dict | str, num_mcqs: int = 5):
+    """
+    Generate clean MCQ list from context.
+    Using strictly JSON format and robust parsing.
+    """
+    # 1. Process Context
+    ctx_str = context_to_text(context, "MCQs")
+    if not ctx_str:
+        return []
+
+    # 2. Construct Prompt
+    prompt = build_mcq_prompt(student_info, ctx_str, num_mcqs)
 
     # 3. Call Ollama
     print(f"[DEBUG] Calling Ollama ({OLLAMA_MODEL}) for MCQs...")
     
     try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "format": "json",
-            "options": {
-                "temperature": 0.2  # Lower temp = more deterministic JSON
-            }
-        }
-        
-        response = requests.post("http://localhost:11434/api/generate", json=payload, timeout=120)
-        
-        if response.status_code != 200:
-            print(f"[ERROR] Ollama API error: {response.text}")
+        try:
+            result = await llm_client.generate(
+                prompt,
+                options={"temperature": 0.2},  # Lower temp = more deterministic JSON
+                timeout=120,
+                caller="generate_mcqs"
+            )
+        except llm_client.LLMError as e:
+            print(f"[ERROR] Ollama API error: {e}")
             return []
             
-        result = response.json()
         raw_output = result.get("response", "")
-        # print(f"[DEBUG] Ollama raw output length: {len(raw_output)}")
 
         if not raw_output.strip():
             print("[ERROR] Empty response from Ollama")
             return []
 
         # 4. Parse & Validate
-        json_str = repair_json_string(raw_output)
+        with stage_timer("json_repair"):
+            json_str = repair_json_string(raw_output)
         
-        parsed = None
-        try:
-            parsed = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            # Fallback: try finding the first array in the string if object parsing failed
-            # Sometimes models return [ ... ] despite instructions
-            match = re.search(r"\[.*\]", raw_output, re.DOTALL)
-            if match:
-                try:
-                    parsed = json.loads(match.group(0))
-                except:
-                    pass
-            
-            if parsed is None:
-                match_obj = re.search(r"\{.*\}", raw_output, re.DOTALL)
-                if match_obj:
+            parsed = None
+            try:
+                parsed = json.loads(json_str)
+            except json.JSONDecodeError as e:
+                # Fallback: try finding the first array in the string if object parsing failed
+                # Sometimes models return [ ... ] despite instructions
+                match = re.search(r"\[.*\]", raw_output, re.DOTALL)
+                if match:
                     try:
-                        parsed = json.loads(match_obj.group(0))
+                        parsed = json.loads(match.group(0))
                     except:
                         pass
-
-            if parsed is None:
-                print(f"[ERROR] JSON decode failed: {e}")
-                print(f"Bad JSON snippet: {raw_output[:200]}...")
-                return []
+            
+                if parsed is None:
+                    match_obj = re.search(r"\{.*\}", raw_output, re.DOTALL)
+                    if match_obj:
+                        try:
+                            parsed = json.loads(match_obj.group(0))
+                        except:
+                            pass
+
+                if parsed is None:
+                    print(f"[ERROR] JSON decode failed: {e}")
+                    print(f"Bad JSON snippet: {raw_output[:200]}...")
+                    return []
                 
-        final_mcqs = validate_mcq_list(parsed)
-        print(f"[DEBUG] Generated {len(final_mcqs)} valid MCQs")
-        return final_mcqs
+            final_mcqs = validate_mcq_list(parsed)
+            print(f"[DEBUG] Generated {len(final_mcqs)} valid MCQs")
+            return final_mcqs
 
     except Exception as e:
         print(f"[CRITICAL] Exception in generate_mcqs: {e}")
         return []
+
+async def stream_mcqs(student_info: dict, context: list | dict | str, num_mcqs: int = 5):
+    """
+    Streaming variant of generate_mcqs: yields each validated item as soon
+    as the model closes it, instead of waiting for the whole JSON.
+    """
+    prompt_for = lambda ctx_str: build_mcq_prompt(student_info, ctx_str, num_mcqs)
+    async for item in stream_items(context, prompt_for, validate_mcq_list, key="question",
+                                   caller="stream_mcqs", label="MCQs"):
+        yield item
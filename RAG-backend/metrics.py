@@ -0,0 +1,193 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Default buckets (seconds) span sub-ms lexical lookups to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Request-scoped labels, set once per request (or ingest job) and picked up by every stage timer
+_SUBJECT = ContextVar("metrics_subject", default="")
+_ENDPOINT = ContextVar("metrics_endpoint", default="")
+
+_REGISTRY = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_str(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+    def values(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def merge(self, rows: list):
+        with self._lock:
+            for key, value in rows:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0.0) + value
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _label_str(self.labelnames, key, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+    def totals(self) -> dict:
+        """labels -> (sum, count)"""
+        with self._lock:
+            return {k: (s[1], s[2]) for k, s in self._series.items()}
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(k), list(s[0]), s[1], s[2]] for k, s in self._series.items()]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def merge(self, rows: list):
+        with self._lock:
+            for key, counts, total, count in rows:
+                key = tuple(key)
+                if len(counts) != len(self.buckets) + 1:
+                    continue   # recorded with different buckets
+                series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds",
+                          "Time spent in one pipeline stage (extract, ocr, split, tag, embed, persist, "
+                          "retrieve, llm_call, json_repair, ...)", ("stage", "subject", "endpoint"))
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Pipeline stages that raised", ("stage", "subject", "endpoint"))
+STAGE_ITEMS = Counter("rag_stage_items_total", "Items processed per stage (pages, chunks, queries, ...)",
+                      ("stage", "subject", "endpoint"))
+HTTP_SECONDS = Histogram("rag_http_request_duration_seconds", "HTTP request latency until the response starts",
+                         ("endpoint", "method", "status"))
+
+# ---- labels ----
+
+def set_labels(subject: str = None, endpoint: str = None):
+    """Label every stage recorded from here on in the current request/job context."""
+    if subject is not None:
+        _SUBJECT.set(subject)
+    if endpoint is not None:
+        _ENDPOINT.set(endpoint)
+
+def current_endpoint() -> str:
+    return _ENDPOINT.get()
+
+def _labels(stage: str, subject: str = None) -> dict:
+    return {"stage": stage, "subject": subject or _SUBJECT.get(), "endpoint": _ENDPOINT.get()}
+
+# ---- recording ----
+
+def observe_stage(stage: str, seconds: float, subject: str = None, items: int = None):
+    labels = _labels(stage, subject)
+    STAGE_SECONDS.observe(seconds, **labels)
+    if items:
+        STAGE_ITEMS.inc(items, **labels)
+
+def count_error(stage: str, subject: str = None):
+    STAGE_ERRORS.inc(**_labels(stage, subject))
+
+@contextmanager
+def stage_timer(stage: str, subject: str = None, items: int = None):
+    """Time a block as one observation of `stage`; exceptions are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        count_error(stage, subject)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started, subject, items)
+
+# ---- export ----
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def snapshot() -> dict:
+    """Serializable copy of every metric (e.g. to ship an ingest worker's numbers to the API)."""
+    return {metric.name: metric.snapshot() for metric in _REGISTRY}
+
+def reset():
+    """Zero every metric (a worker process between two jobs it reports separately)."""
+    for metric in _REGISTRY:
+        metric.reset()
+
+def merge(data: dict):
+    by_name = {metric.name: metric for metric in _REGISTRY}
+    for name, rows in (data or {}).items():
+        if name in by_name:
+            by_name[name].merge(rows)
@@ -0,0 +1,277 @@
+import json
+import time
+import asyncio
+import sqlite3
+from config import (QUESTION_BANK_DB, QUESTION_BANK_TARGET, QUESTION_BANK_LOW_WATER,
+                    QUESTION_BANK_REFILL, QUESTION_BANK_MAX_ITEMS, QUESTION_BANK_WORKERS)
+from manifest import load_manifest, index_version
+from retriever import get_context_scoped
+from mcq_generator import generate_mcqs
+from flashcard_generator import generate_flashcards
+from utils.hash_utils import text_sha256
+
+BANK_SOURCES = ["notes", "syllabus"]
+
+# kind -> (generator, items per LLM call, field that identifies an item)
+KINDS = {
+    "mcqs": (generate_mcqs, 5, "question"),
+    "flashcards": (generate_flashcards, 8, "front")
+}
+
+# (subject, kind, unit, topic) refills currently running in this process
+_REFILLS = {}
+
+def _connect():
+    QUESTION_BANK_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(QUESTION_BANK_DB, timeout=10)
+    # The ingest worker writes while the API reads
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS bank_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_code TEXT,
+            index_version INTEGER,
+            kind TEXT,
+            unit TEXT,
+            topic TEXT,
+            item_hash TEXT,
+            payload TEXT,
+            created_at REAL,
+            UNIQUE (subject_code, index_version, kind, item_hash)
+        );
+        CREATE INDEX IF NOT EXISTS idx_bank_topic
+            ON bank_items(subject_code, index_version, kind, unit, topic);
+        CREATE TABLE IF NOT EXISTS bank_served (
+            student_id TEXT,
+            item_id INTEGER,
+            served_at REAL,
+            PRIMARY KEY (student_id, item_id)
+        );
+    """)
+    return conn
+
+# ---- syllabus walk ----
+
+def bank_topics(subject_code: str) -> list:
+    """
+    Topics of the subject's structured syllabus (from the ingest manifest),
+    each with the retrieval query used to generate its questions.
+    """
+    syllabus = load_manifest(subject_code).get("syllabus") or {}
+    topics = []
+    for unit in syllabus.get("units") or []:
+        unit_name = str(unit.get("unitName", "")).strip()
+        if not unit_name:
+            continue
+        for topic in unit.get("topics") or []:
+            topic_name = str(topic.get("topicName", "")).strip()
+            if not topic_name:
+                continue
+            subtopics = [str(s).strip() for s in topic.get("subtopics") or [] if str(s).strip()]
+            query = topic_name + (": " + ", ".join(subtopics) if subtopics else "")
+            topics.append({"unit": unit_name, "topic": topic_name, "query": query})
+    return topics
+
+def find_topic(subject_code: str, topic: str, unit: str = None):
+    for entry in bank_topics(subject_code):
+        if entry["topic"] == topic and (unit is None or entry["unit"] == unit):
+            return entry
+    return None
+
+# ---- storage ----
+
+def _item_hash(kind: str, item: dict) -> str:
+    field = KINDS[kind][2]
+    return text_sha256(" ".join(str(item.get(field, "")).lower().split()))
+
+def _count(conn, subject_code: str, version: int, kind: str, unit: str, topic: str) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM bank_items WHERE subject_code = ? AND index_version = ? "
+        "AND kind = ? AND unit = ? AND topic = ?",
+        (subject_code, version, kind, unit, topic)).fetchone()[0]
+
+def topic_count(subject_code: str, kind: str, unit: str, topic: str) -> int:
+    conn = _connect()
+    try:
+        return _count(conn, subject_code, index_version(subject_code), kind, unit, topic)
+    finally:
+        conn.close()
+
+def add_items(subject_code: str, version: int, kind: str, unit: str, topic: str, items: list) -> int:
+    """Store validated items; duplicates of items already in the pool are skipped."""
+    now = time.time()
+    conn = _connect()
+    try:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO bank_items "
+            "(subject_code, index_version, kind, unit, topic, item_hash, payload, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(subject_code, version, kind, unit, topic, _item_hash(kind, item), json.dumps(item), now)
+             for item in items])
+        conn.commit()
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
+def purge_stale(subject_code: str) -> int:
+    """Drop items generated from an older index of the subject (and their served records)."""
+    version = index_version(subject_code)
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM bank_served WHERE item_id IN "
+                     "(SELECT id FROM bank_items WHERE subject_code = ? AND index_version != ?)",
+                     (subject_code, version))
+        removed = conn.execute("DELETE FROM bank_items WHERE subject_code = ? AND index_version != ?",
+                               (subject_code, version)).rowcount
+        conn.commit()
+        return removed
+    finally:
+        conn.close()
+
+# ---- generation ----
+
+async def fill_topic(subject_code: str, kind: str, entry: dict, target: int) -> int:
+    """Generate items for one topic until its pool holds `target` (or the model stops adding new ones)."""
+    generate, per_call, _ = KINDS[kind]
+    version = index_version(subject_code)
+    unit, topic = entry["unit"], entry["topic"]
+    have = await asyncio.to_thread(topic_count, subject_code, kind, unit, topic)
+    if have >= target:
+        return 0
+
+    context = await asyncio.to_thread(get_context_scoped, entry["query"], subject_code, k=8,
+                                      sources=BANK_SOURCES, units=unit, topics=topic)
+    if not context:
+        # Topic has no tagged chunks of its own; fall back to plain similarity
+        context = await asyncio.to_thread(get_context_scoped, entry["query"], subject_code, k=8,
+                                          sources=BANK_SOURCES)
+    if not context:
+        return 0
+
+    added = 0
+    student_info = {"subject_code": subject_code, "unit": unit, "topic": topic}
+    while have + added < target:
+        items = await generate(student_info, context, min(per_call, target - have - added)) or []
+        new = await asyncio.to_thread(add_items, subject_code, version, kind, unit, topic, items)
+        if not new:
+            break
+        added += new
+    print(f"[DEBUG] Question bank {subject_code} / {topic}: +{added} {kind}")
+    return added
+
+async def build_bank_async(subject_code: str, progress=None, kinds: tuple = ("mcqs", "flashcards"),
+                           target: int = QUESTION_BANK_TARGET) -> dict:
+    removed = await asyncio.to_thread(purge_stale, subject_code)
+    topics = bank_topics(subject_code)
+    work = [(kind, entry) for entry in topics for kind in kinds]
+    semaphore = asyncio.Semaphore(QUESTION_BANK_WORKERS)
+    done = 0
+    if progress:
+        progress("bank", 0, len(work))
+
+    async def run(kind, entry):
+        nonlocal done
+        async with semaphore:
+            added = await fill_topic(subject_code, kind, entry, target)
+        done += 1
+        if progress:
+            progress("bank", done, len(work))
+        return kind, added
+
+    totals = {kind: 0 for kind in kinds}
+    for kind, added in await asyncio.gather(*(run(kind, entry) for kind, entry in work)):
+        totals[kind] += added
+    print(f"✅ Question bank for {subject_code}: {len(topics)} topics, "
+          + ", ".join(f"+{n} {k}" for k, n in totals.items()))
+    return {"topics": len(topics), "added": totals, "stale_removed": removed}
+
+def build_bank(subject_code: str, progress=None, **kwargs) -> dict:
+    """
+    Walk the structured syllabus (units -> topics -> subtopics) and top up
+    every topic's MCQ and flashcard pool to QUESTION_BANK_TARGET items.
+    Items from a previous index version are dropped first. Blocking; run
+    after ingest_all.
+    """
+    return asyncio.run(build_bank_async(subject_code, progress=progress, **kwargs))
+
+# ---- serving ----
+
+def draw(subject_code: str, kind: str, student_id: str, count: int,
+         unit: str = None, topic: str = None):
+    """
+    Sample up to `count` items the student has not been served yet (from one
+    topic, one unit, or the whole subject) and record them as served.
+    Returns (items, unseen items left for the student).
+    """
+    version = index_version(subject_code)
+    where = "subject_code = ? AND index_version = ? AND kind = ?"
+    params = [subject_code, version, kind]
+    if unit:
+        where += " AND unit = ?"
+        params.append(unit)
+    if topic:
+        where += " AND topic = ?"
+        params.append(topic)
+    where += " AND id NOT IN (SELECT item_id FROM bank_served WHERE student_id = ?)"
+    params.append(student_id)
+
+    conn = _connect()
+    try:
+        rows = conn.execute(f"SELECT id, unit, topic, payload FROM bank_items WHERE {where} "
+                            "ORDER BY RANDOM() LIMIT ?", params + [count]).fetchall()
+        now = time.time()
+        conn.executemany("INSERT OR IGNORE INTO bank_served VALUES (?, ?, ?)",
+                         [(student_id, row[0], now) for row in rows])
+        conn.commit()
+        unseen = conn.execute(f"SELECT COUNT(*) FROM bank_items WHERE {where}", params).fetchone()[0]
+    finally:
+        conn.close()
+    items = [{**json.loads(payload), "unit": unit_name, "topic": topic_name}
+             for _, unit_name, topic_name, payload in rows]
+    return items, unseen
+
+def needs_refill(unseen: int) -> bool:
+    return unseen < QUESTION_BANK_LOW_WATER
+
+def schedule_refill(subject_code: str, kind: str, entry: dict):
+    """
+    Grow a topic's pool by QUESTION_BANK_REFILL items in the background (on
+    the running event loop). At most one refill per topic runs at a time.
+    """
+    key = (subject_code, kind, entry["unit"], entry["topic"])
+    if key in _REFILLS:
+        return
+
+    async def refill():
+        try:
+            # Counted inside the task: the SQLite query must not block the request's event loop
+            total = await asyncio.to_thread(topic_count, subject_code, kind, entry["unit"], entry["topic"])
+            target = min(total + QUESTION_BANK_REFILL, QUESTION_BANK_MAX_ITEMS)
+            if target > total:
+                await fill_topic(subject_code, kind, entry, target)
+        except Exception as e:
+            print(f"[ERROR] Question bank refill failed for {entry['topic']}: {e}")
+        finally:
+            _REFILLS.pop(key, None)
+
+    _REFILLS[key] = asyncio.get_running_loop().create_task(refill())
+
+def bank_status(subject_code: str) -> dict:
+    """Pool size per topic and kind for the subject's current index version."""
+    version = index_version(subject_code)
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT unit, topic, kind, COUNT(*) FROM bank_items "
+                            "WHERE subject_code = ? AND index_version = ? GROUP BY unit, topic, kind",
+                            (subject_code, version)).fetchall()
+    finally:
+        conn.close()
+    counts = {}
+    for unit, topic, kind, n in rows:
+        counts.setdefault((unit, topic), {})[kind] = n
+    topics = [{"unit": e["unit"], "topic": e["topic"],
+               **{kind: counts.get((e["unit"], e["topic"]), {}).get(kind, 0) for kind in KINDS}}
+              for e in bank_topics(subject_code)]
+    return {"subject_code": subject_code, "index_version": version, "topics": topics,
+            "refilling": [list(k[1:]) for k in _REFILLS if k[0] == subject_code]}
@@ -1,61 +1,301 @@
+import json
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from config import CHROMA_DIR, EMBEDDING_MODEL
+from config import (CHROMA_DIR, EMBEDDING_BACKEND, MAX_OPEN_STORES, CONTEXT_FETCH_MULTIPLIER,
+                    SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD, HYBRID_SEARCH, RRF_K)
+from manifest import file_flag, manifest_stamp
+from embedding_cache import CachedEmbeddings
+from embedding_backends import expected_backend_name, make_embeddings
+from lexical_index import get_lexical_index
+from metrics import stage_timer, observe_stage, count_error
+from utils.context_packer import pack_context
 from pathlib import Path
 
 # Cache this to save load time each request
 _EMBEDDINGS = None
 
+# Open per-subject stores, most recently used last: subject_code -> (stamp, Chroma)
+_STORES = OrderedDict()
+_STORES_LOCK = threading.Lock()
+_STORE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+# Semantic query cache: subject_code -> (stamp, OrderedDict[entry_no -> (filter_key, unit vector, chunk ids)])
+_QUERY_CACHE = {}
+_QUERY_CACHE_LOCK = threading.Lock()
+_QUERY_STATS = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+_QUERY_SEQ = 0
+
 def get_embeddings():
+    """Shared embedding model behind the on-disk embedding cache (used by ingest and query)."""
     global _EMBEDDINGS
     if _EMBEDDINGS is None:
-        print("[DEBUG] Initializing HuggingFace Embeddings...")
-        _EMBEDDINGS = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        print(f"[DEBUG] Initializing embeddings ({EMBEDDING_BACKEND} backend)...")
+        base, name = make_embeddings()
+        _EMBEDDINGS = CachedEmbeddings(base, name)
     return _EMBEDDINGS
 
-def get_context_scoped(query: str, subject_code: str, k: int = 5, sources: list = None):
+def embeddings_name() -> str:
+    """Cache namespace of the embedding backend, without loading it if it is not loaded yet."""
+    if _EMBEDDINGS is not None:
+        return _EMBEDDINGS.model_name
+    return expected_backend_name()
+
+def get_store(subject_code: str):
+    """
+    Return an open Chroma store for the subject, reusing a cached handle.
+    A handle is reopened when the subject's manifest changed since it was
+    opened (i.e. the subject was re-ingested, possibly by another process).
+    """
+    stamp = manifest_stamp(subject_code)
+    with _STORES_LOCK:
+        cached = _STORES.get(subject_code)
+        if cached is not None:
+            if cached[0] == stamp:
+                _STORES.move_to_end(subject_code)
+                _STORE_STATS["hits"] += 1
+                return cached[1]
+            del _STORES[subject_code]
+            _STORE_STATS["invalidations"] += 1
+
+        _STORE_STATS["misses"] += 1
+        print(f"[DEBUG] Opening vector store for {subject_code}")
+        with stage_timer("store_open", subject_code):
+            db = Chroma(persist_directory=str(CHROMA_DIR / subject_code), embedding_function=get_embeddings())
+        _STORES[subject_code] = (stamp, db)
+        while len(_STORES) > MAX_OPEN_STORES:
+            _STORES.popitem(last=False)
+            _STORE_STATS["evictions"] += 1
+        return db
+
+def invalidate_store(subject_code: str = None):
+    """Drop the cached handle (and cached query results) for one subject, or all subjects."""
+    with _QUERY_CACHE_LOCK:
+        if subject_code is None:
+            _QUERY_CACHE.clear()
+        else:
+            _QUERY_CACHE.pop(subject_code, None)
+    with _STORES_LOCK:
+        if subject_code is None:
+            dropped = len(_STORES)
+            _STORES.clear()
+        else:
+            dropped = 1 if _STORES.pop(subject_code, None) is not None else 0
+        _STORE_STATS["invalidations"] += dropped
+
+def store_cache_stats() -> dict:
+    with _STORES_LOCK:
+        return {**_STORE_STATS, "open": len(_STORES), "capacity": MAX_OPEN_STORES,
+                "subjects": list(_STORES.keys())}
+
+def _unit(vector) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    return arr / max(float(np.linalg.norm(arr)), 1e-12)
+
+def _subject_queries(subject_code: str, stamp) -> OrderedDict:
+    """Cached queries of a subject, emptied if it was re-ingested since they were stored."""
+    cached = _QUERY_CACHE.get(subject_code)
+    if cached is not None and cached[0] != stamp:
+        _QUERY_STATS["invalidations"] += len(cached[1])
+        cached = None
+    if cached is None:
+        cached = (stamp, OrderedDict())
+        _QUERY_CACHE[subject_code] = cached
+    return cached[1]
+
+def lookup_similar_query(subject_code: str, stamp, filter_key: str, vector):
+    """
+    Chunk ids of a cached query with the same filters whose embedding is
+    within SEMANTIC_CACHE_THRESHOLD cosine similarity of `vector`, or None.
+    """
+    with _QUERY_CACHE_LOCK:
+        entries = _subject_queries(subject_code, stamp)
+        candidates = [(no, e) for no, e in entries.items() if e[0] == filter_key]
+        if candidates:
+            sims = np.stack([e[1] for _, e in candidates]) @ _unit(vector)
+            best = int(np.argmax(sims))
+            if sims[best] >= SEMANTIC_CACHE_THRESHOLD:
+                no, entry = candidates[best]
+                entries.move_to_end(no)
+                _QUERY_STATS["hits"] += 1
+                return entry[2]
+        _QUERY_STATS["misses"] += 1
+        return None
+
+def remember_query(subject_code: str, stamp, filter_key: str, vector, ids: list):
+    global _QUERY_SEQ
+    with _QUERY_CACHE_LOCK:
+        entries = _subject_queries(subject_code, stamp)
+        _QUERY_SEQ += 1
+        entries[_QUERY_SEQ] = (filter_key, _unit(vector), list(ids))
+        while len(entries) > SEMANTIC_CACHE_MAX_ENTRIES:
+            entries.popitem(last=False)
+            _QUERY_STATS["evictions"] += 1
+
+def query_cache_stats() -> dict:
+    with _QUERY_CACHE_LOCK:
+        lookups = _QUERY_STATS["hits"] + _QUERY_STATS["misses"]
+        return {**_QUERY_STATS, "entries": sum(len(c[1]) for c in _QUERY_CACHE.values()),
+                "threshold": SEMANTIC_CACHE_THRESHOLD,
+                "hit_rate": round(_QUERY_STATS["hits"] / lookups, 4) if lookups else 0.0}
+
+def _rows(ids, documents, metadatas, embeddings) -> dict:
+    """Chroma result columns -> {chunk id: (text, metadata, embedding)}."""
+    return {i: (documents[n], metadatas[n], embeddings[n]) for n, i in enumerate(ids)}
+
+def rrf_fuse(rankings: list, n: int, k: int = RRF_K) -> list:
+    """Reciprocal rank fusion of several ranked id lists -> top-n (id, score), best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n]
+
+def build_where(sources: list = None, units: list = None, topics: list = None, files: list = None):
+    """
+    Chroma metadata filter for the given source types, units, topics and
+    source file names. Each argument may be a single string or a list.
+    A file also matches deduplicated chunks stored under another file.
+    """
+    clauses = []
+    for field, values in (("source_type", sources), ("unit", units), ("topic", topics), ("source", files)):
+        if not values:
+            continue
+        values = [values] if isinstance(values, str) else list(values)
+        clause = {field: values[0]} if len(values) == 1 else {field: {"$in": values}}
+        if field == "source":
+            clause = {"$or": [clause] + [{file_flag(v): True} for v in values]}
+        clauses.append(clause)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def get_context_scoped(query: str, subject_code: str, k: int = 5, sources: list = None,
+                       units: list = None, topics: list = None, files: list = None,
+                       token_budget: int = None):
     """
     Retrieve context from ChromaDB specifically for one subject.
-    Optional: filter by source_type (e.g. 'syllabus' vs 'notes').
+    Optional filters on source_type (e.g. 'syllabus' vs 'notes'), unit, topic
+    and source file are applied inside the vector query. A wider candidate
+    set is fetched and packed into up to k diverse, de-overlapped chunks
+    within the LLM token budget (see utils/context_packer.py).
+    A query close enough to a recent one (same filters) reuses its chunks
+    instead of searching again. With HYBRID_SEARCH, BM25 hits from the
+    subject's lexical index are fused with the vector hits (RRF).
+    """
+    filters = {"sources": sources, "units": units, "topics": topics, "files": files}
+    return get_contexts_batch(subject_code, [query], k, filters, token_budget=token_budget)[0]
+
+def _dedupe_across(rankings: list, relevance: list):
+    """Keep each chunk only for the query that ranks it highest (ties go to the earlier query)."""
+    best = {}
+    for q, ranking in enumerate(rankings):
+        for rank, chunk_id in enumerate(ranking):
+            if chunk_id not in best or rank < best[chunk_id][0]:
+                best[chunk_id] = (rank, q)
+    for q, ranking in enumerate(rankings):
+        keep = [n for n, chunk_id in enumerate(ranking) if best[chunk_id][1] == q]
+        rankings[q] = [ranking[n] for n in keep]
+        if relevance[q] is not None:
+            relevance[q] = [relevance[q][n] for n in keep]
+
+def get_contexts_batch(subject_code: str, queries: list, k: int = 5, filters: dict = None,
+                       dedupe: bool = False, token_budget: int = None) -> list:
     """
+    Context for several queries of one subject, in query order. All queries
+    are embedded in one model batch, and the ones not answered by the
+    semantic cache go to the vector store as a single multi-query search.
+    `filters` takes the get_context_scoped keywords (sources, units, topics,
+    files) and applies to every query. With `dedupe`, a chunk is only used
+    for the query that ranks it highest.
+    """
+    queries = list(queries)
+    filters = filters or {}
+    if not queries:
+        return []
     persist_dir = CHROMA_DIR / subject_code
     print(f"[DEBUG] Retriever searching in: {persist_dir}")
     
     if not persist_dir.exists():
         print(f"[ERROR] Persist directory missing: {persist_dir}")
-        return ""
+        return [""] * len(queries)
 
     try:
-        embeddings = get_embeddings()
-        db = Chroma(persist_directory=str(persist_dir), embedding_function=embeddings)
-        
-        # Searching more candidates first
-        print(f"[DEBUG] Searching for '{query}'...")
-        results = db.similarity_search(query, k=k*2)
-        print(f"[DEBUG] Found {len(results)} raw docs")
+        db = get_store(subject_code)
+        where = build_where(**filters)
         
-        if not results:
-            print("[WARN] No documents found for query.")
-            return ""
-
-        context_parts = []
-        count = 0
-        for doc in results:
-            if count >= k:
-                break
-                
-            src = doc.metadata.get("source_type", "unknown")
-            if sources and src not in sources:
+        print(f"[DEBUG] Searching for {queries if len(queries) > 1 else repr(queries[0])} (filter={where})...")
+        started = time.perf_counter()
+        with stage_timer("embed_query", subject_code, items=len(queries)):
+            query_vectors = get_embeddings().embed_queries(queries)
+        n_results = k * CONTEXT_FETCH_MULTIPLIER
+        stamp = manifest_stamp(subject_code)
+        filter_key = json.dumps([where, n_results], sort_keys=True)
+        include = ["documents", "metadatas", "embeddings"]
+
+        rankings = [lookup_similar_query(subject_code, stamp, filter_key, v) for v in query_vectors]
+        misses = [q for q, ranking in enumerate(rankings) if ranking is None]
+        rows = {}
+        if len(misses) < len(queries):
+            print(f"[DEBUG] Semantic cache hit for {len(queries) - len(misses)} of {len(queries)} queries")
+        if misses:
+            with stage_timer("vector_search", subject_code, items=len(misses)):
+                results = db._collection.query(query_embeddings=[query_vectors[q] for q in misses],
+                                               n_results=n_results, where=where, include=include)
+            for j, q in enumerate(misses):
+                ids = results["ids"][j]
+                rankings[q] = ids
+                if ids:
+                    rows.update(_rows(ids, results["documents"][j], results["metadatas"][j],
+                                      results["embeddings"][j]))
+                    remember_query(subject_code, stamp, filter_key, query_vectors[q], ids)
+            print(f"[DEBUG] Found {sum(len(rankings[q]) for q in misses)} docs for {len(misses)} queries")
+
+        # Lexical (BM25) side, fused with each query's vector ranking
+        relevance = [None] * len(queries)
+        lexical = get_lexical_index(subject_code) if HYBRID_SEARCH else None
+        if lexical is not None:
+            lexical_filters = {"source_type": filters.get("sources"), "unit": filters.get("units"),
+                               "topic": filters.get("topics"), "source": filters.get("files")}
+            for q, query in enumerate(queries):
+                with stage_timer("lexical_search", subject_code):
+                    lexical_ids = lexical.search(query, n_results, lexical_filters)
+                if lexical_ids:
+                    fused = rrf_fuse([rankings[q], lexical_ids], n_results)
+                    print(f"[DEBUG] Fused {len(rankings[q])} vector + {len(lexical_ids)} lexical hits")
+                    rankings[q] = [i for i, _ in fused]
+                    relevance[q] = [score for _, score in fused]
+
+        if dedupe and len(queries) > 1:
+            _dedupe_across(rankings, relevance)
+
+        missing = list({i for ranking in rankings for i in ranking if i not in rows})
+        if missing:
+            got = db._collection.get(ids=missing, include=include)
+            rows.update(_rows(got["ids"], got["documents"], got["metadatas"], got["embeddings"]))
+
+        contexts = []
+        for q, ranking in enumerate(rankings):
+            keep = [n for n, i in enumerate(ranking) if i in rows]
+            if not keep:
+                print(f"[WARN] No documents found for query '{queries[q]}'.")
+                contexts.append("")
                 continue
-                
-            context_parts.append(doc.page_content)
-            count += 1
-            
-        print(f"[DEBUG] Returning {len(context_parts)} documents in context.")
-        return "\n\n".join(context_parts)
+            with stage_timer("context_pack", subject_code):
+                packed = pack_context(query_vectors[q], [rows[ranking[n]][0] for n in keep],
+                                      [rows[ranking[n]][1] for n in keep], [rows[ranking[n]][2] for n in keep], k,
+                                      relevance=None if relevance[q] is None else [relevance[q][n] for n in keep],
+                                      **({"token_budget": token_budget} if token_budget else {}))
+            print(f"[DEBUG] Packed {len(keep)} candidates into {len(packed)} chars of context.")
+            contexts.append(packed)
+        observe_stage("retrieve", time.perf_counter() - started, subject_code, items=len(queries))
+        return contexts
             
     except Exception as e:
+        count_error("retrieve", subject_code)
         print(f"[CRITICAL] Error in retrieval: {e}")
         import traceback
         traceback.print_exc()
-        return ""
+        return [""] * len(queries)
@@ -1,7 +1,7 @@
 import os
 import json
 import re
-import requests
+import llm_client
 from textwrap import dedent
 from pathlib import Path
 from config import OLLAMA_MODEL
@@ -86,24 +86,13 @@ def extract_structured_syllabus(pdf_path: Path):
 
     try:
         # Using HTTP API for better cross-bridge (WSL <-> Windows) and reliability
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json"
-            },
-            timeout=120
-        )
-        
-        if response.status_code != 200:
-            print(f"Error calling ollama API: {response.text}")
-            return []
-
-        result = response.json()
+        result = llm_client.generate_sync(prompt, model=OLLAMA_MODEL, timeout=120,
+                                          caller="extract_structured_syllabus")
         return repair_syllabus_json(result.get("response", ""))
 
+    except llm_client.LLMError as e:
+        print(f"Error calling ollama API: {e}")
+        return []
     except Exception as e:
         print(f"Failed to process syllabus via Ollama API: {str(e)}")
         return []
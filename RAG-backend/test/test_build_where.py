@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_core")
+from retriever import build_where
+
+def test_no_filters():
+    assert build_where() is None
+    assert build_where(sources=[], units=None) is None
+
+def test_single_value_is_equality():
+    assert build_where(sources="notes") == {"source_type": "notes"}
+    assert build_where(units=["Unit I"]) == {"unit": "Unit I"}
+
+def test_several_values_use_in():
+    assert build_where(topics=("Search", "Graphs")) == {"topic": {"$in": ["Search", "Graphs"]}}
+
+def test_file_filter_matches_deduplicated_chunks():
+    assert build_where(files="a.pdf") == {"$or": [{"source": "a.pdf"}, {"in_file:a.pdf": True}]}
+    assert build_where(files=["a.pdf", "b.pdf"]) == {"$or": [
+        {"source": {"$in": ["a.pdf", "b.pdf"]}}, {"in_file:a.pdf": True}, {"in_file:b.pdf": True}]}
+
+def test_filters_are_combined_with_and():
+    assert build_where(sources=["notes", "past_papers"], units="Unit II", files="a.pdf") == {"$and": [
+        {"source_type": {"$in": ["notes", "past_papers"]}},
+        {"unit": "Unit II"},
+        {"$or": [{"source": "a.pdf"}, {"in_file:a.pdf": True}]},
+    ]}
@@ -0,0 +1,39 @@
+import pytest
+from utils import context_packer
+from utils.context_packer import mmr_select, pack_context, strip_overlap, truncate_to_tokens
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # No tokenizer download: count_tokens falls back to its len/4 estimate
+    monkeypatch.setattr(context_packer, "_TOKENIZER", False)
+
+def test_strip_overlap():
+    prev = "Intro text. The shared overlap between the two chunks."
+    text = "The shared overlap between the two chunks. New material follows."
+    assert strip_overlap(prev, text) == "New material follows."
+    assert strip_overlap("unrelated", text) == text
+
+def test_truncate_to_tokens_keeps_whole_sentences():
+    text = "First sentence here. Second one is longer than that. Third."
+    assert truncate_to_tokens(text, 6) == "First sentence here."
+    assert truncate_to_tokens(text, 1) == ""
+
+def test_mmr_drops_near_duplicates():
+    query = [1.0, 0.0]
+    vectors = [[1.0, 0.0], [0.999, 0.01], [0.6, 0.8]]
+    assert mmr_select(query, vectors, k=3) == [0, 2]
+
+def test_pack_context_orders_by_source_and_strips_overlap():
+    shared = "the shared overlap sentence sits here."
+    texts = ["Opening of the notes and " + shared, shared + " The notes continue.", "Another file entirely."]
+    metas = [{"source": "a.pdf", "chunk_index": 0}, {"source": "a.pdf", "chunk_index": 1},
+             {"source": "b.pdf", "chunk_index": 0}]
+    vectors = [[0.8, 0.6, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]
+    packed = pack_context([1.0, 0.0, 0.0], texts, metas, vectors, k=3)
+    assert packed.split("\n\n") == [texts[0], "The notes continue.", texts[2]]
+
+def test_pack_context_respects_token_budget():
+    texts = ["x" * 400, "y" * 400]
+    metas = [{"source": "a.pdf", "chunk_index": 0}, {"source": "b.pdf", "chunk_index": 0}]
+    packed = pack_context([1.0, 0.0], texts, metas, [[1.0, 0.0], [0.0, 1.0]], k=2, token_budget=120)
+    assert packed == texts[0]
@@ -0,0 +1,27 @@
+from dedup import find_duplicates, normalize
+
+BASE = ("A heuristic is admissible if it never overestimates the cost of reaching the goal from "
+        "the current node, so A* search with an admissible heuristic returns an optimal path when "
+        "the search graph is a tree and every edge cost is positive. Consistent heuristics are also "
+        "admissible, and with them graph search never needs to reopen a node it has already expanded, "
+        "which keeps the number of expansions bounded by the size of the state space.")
+NEAR = BASE.replace("every edge cost", "each edge cost")  # one word changed
+OTHER = ("Normalization splits relational tables so that every non-key attribute depends on the key, "
+         "the whole key and nothing but the key, removing update anomalies from the schema.")
+
+def test_normalize_ignores_case_punctuation_and_spacing():
+    assert normalize("  A*  Search,\nIS   optimal! ") == "a search is optimal"
+
+def test_exact_copy():
+    copy = BASE.upper().replace(" ", "  ")
+    assert find_duplicates([BASE, copy]) == [0, 0]
+
+def test_near_copy():
+    assert find_duplicates([BASE, NEAR]) == [0, 0]
+
+def test_non_copy_kept():
+    assert find_duplicates([BASE, OTHER]) == [0, 1]
+
+def test_copies_only_match_within_scope():
+    texts = [BASE, BASE, NEAR, OTHER]
+    assert find_duplicates(texts, ["notes", "past_papers", "notes", "notes"]) == [0, 1, 0, 3]
@@ -0,0 +1,89 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+import embedding_cache
+from embedding_cache import CachedEmbeddings
+
+class CountingEmbeddings:
+    """Deterministic stand-in for a model: one 2-d vector per text, counting calls."""
+    def __init__(self):
+        self.computed = []
+
+    def embed_documents(self, texts):
+        self.computed.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache, "time", clock)
+    return clock
+
+def make(tmp_path, base=None, **kwargs):
+    return CachedEmbeddings(base or CountingEmbeddings(), "test-model", cache_dir=tmp_path, **kwargs)
+
+def stored(cache):
+    return {k for (k,) in cache._conn.execute("SELECT key FROM embeddings")}
+
+def test_hits_skip_the_model(tmp_path, clock):
+    base = CountingEmbeddings()
+    cache = make(tmp_path, base)
+    assert cache.embed_documents(["ab", "abc", "ab"]) == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert cache.embed_documents(["abc"]) == [[3.0, 1.0]]
+    assert base.computed == ["ab", "abc"]
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 3
+
+def test_documents_written_only_on_flush(tmp_path, clock):
+    cache = make(tmp_path)
+    cache.embed_documents(["a", "b"])
+    other = make(tmp_path)  # e.g. the API process reading what ingest wrote
+    assert stored(other) == set()
+    cache.flush()
+    base = CountingEmbeddings()
+    reader = make(tmp_path, base)
+    assert reader.embed_documents(["a", "b"]) == [[1.0, 1.0], [1.0, 1.0]]
+    assert base.computed == []
+
+def test_queries_flush_every_n(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_FLUSH_EVERY", 2)
+    cache = make(tmp_path)
+    cache.embed_query("q1")
+    assert len(stored(cache)) == 0
+    cache.embed_query("q2")
+    assert len(stored(cache)) == 2
+
+def test_queries_and_documents_cached_separately(tmp_path, clock):
+    base = CountingEmbeddings()
+    cache = make(tmp_path, base)
+    cache.embed_documents(["same"])
+    cache.embed_query("same")
+    assert base.computed == ["same", "same"]
+
+def test_least_recently_used_evicted(tmp_path, clock):
+    cache = make(tmp_path, max_entries=2)
+    cache.embed_documents(["old", "used"])
+    cache.flush()
+    cache.embed_documents(["used"])   # hit: refreshes its last use
+    cache.embed_documents(["new"])
+    cache.flush()
+    keys = stored(cache)
+    assert keys == {cache._key("doc", "used"), cache._key("doc", "new")}
+    assert cache.stats["evictions"] == 1
+
+def test_other_model_or_dtype_clears_rows(tmp_path, clock):
+    cache = make(tmp_path)
+    cache.embed_documents(["a"])
+    cache.flush()
+    assert len(stored(make(tmp_path))) == 1
+    assert len(stored(make(tmp_path, dtype="float32"))) == 0
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import pytest
+import manifest
+import generation_cache as gc
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "CHROMA_DIR", tmp_path / "chroma")
+    monkeypatch.setattr(gc, "GEN_CACHE_DB", tmp_path / "generation.sqlite3")
+    monkeypatch.setattr(gc, "_DB_READY", False)
+    monkeypatch.setattr(gc, "_MEMORY", OrderedDict())
+    monkeypatch.setattr(gc, "_STATS", dict.fromkeys(gc._STATS, 0))
+    clock = Clock()
+    monkeypatch.setattr(gc, "time", clock)
+    return clock
+
+def key(query="Explain A* search", **kwargs):
+    return gc.cache_key("mcqs", "CS1", query, 5, 1, **kwargs)
+
+def test_key_normalizes_query_and_filters(clock):
+    assert key("  explain a* SEARCH ") == key()
+    assert key(filters={}) == key(filters=None)
+    assert key(filters={"units": ["Unit I"], "sources": None}) == key(filters={"sources": None, "units": ["Unit I"]})
+
+def test_key_changes_with_request_model_and_prompt(clock):
+    base = key()
+    assert gc.cache_key("flashcards", "CS1", "Explain A* search", 5, 1) != base
+    assert gc.cache_key("mcqs", "CS2", "Explain A* search", 5, 1) != base
+    assert gc.cache_key("mcqs", "CS1", "Explain A* search", 10, 1) != base
+    assert gc.cache_key("mcqs", "CS1", "Explain A* search", 5, 2) != base
+    assert key(filters={"units": ["Unit I"]}) != base
+    assert key(model="other-model") != base
+
+def test_key_changes_when_subject_is_reingested(clock):
+    before = key()
+    manifest.save_manifest("CS1", {**manifest.empty_manifest(), "version": 1})
+    assert key() != before
+
+def test_memory_then_disk_hits(clock):
+    gc.put_cached(key(), [{"question": "q"}], "mcqs", "CS1")
+    assert gc.get_cached(key()) == [{"question": "q"}]
+    gc._MEMORY.clear()  # e.g. another worker process
+    assert gc.get_cached(key()) == [{"question": "q"}]
+    assert gc.get_cached(key()) == [{"question": "q"}]
+    stats = gc.generation_cache_stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 0)
+
+def test_entries_expire_after_ttl(clock):
+    gc.put_cached(key(), ["x"], "mcqs", "CS1", ttl=60)
+    clock.now += 59
+    assert gc.get_cached(key()) == ["x"]
+    clock.now += 1
+    assert gc.get_cached(key()) is None
+    assert gc.get_cached(key()) is None  # expired on disk too, not only in memory
+    assert gc.generation_cache_stats()["misses"] == 2
+
+def test_expired_rows_pruned_on_write(clock):
+    gc.put_cached(key("old"), ["x"], "mcqs", "CS1", ttl=10)
+    clock.now += 11
+    gc.put_cached(key("new"), ["y"], "mcqs", "CS1", ttl=10)
+    conn = gc._connect()
+    try:
+        rows = conn.execute("SELECT key FROM generation_cache").fetchall()
+    finally:
+        conn.close()
+    assert rows == [(key("new"),)]
+
+def test_empty_results_not_cached(clock):
+    gc.put_cached(key(), [], "mcqs", "CS1")
+    assert gc.get_cached(key()) is None
+    assert gc.generation_cache_stats()["stores"] == 0
@@ -0,0 +1,96 @@
+import json
+import pytest
+import jobs
+
+@pytest.fixture(autouse=True)
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", tmp_path)
+    return tmp_path
+
+def make_job(subject_code="CS1", kind="ingest", **fields):
+    job = jobs._new_job(kind, subject_code, jobs.STAGES, **fields)
+    jobs._write_job(job)
+    return job
+
+def test_record_round_trip(jobs_dir):
+    job = make_job(force=True)
+    loaded = jobs.get_job(job["id"])
+    assert loaded["status"] == "queued" and loaded["force"] is True
+    assert set(loaded["progress"]) == set(jobs.STAGES)
+    assert json.loads((jobs_dir / f"{job['id']}.json").read_text())["id"] == job["id"]
+    assert not list(jobs_dir.glob("*.tmp"))
+    assert jobs.get_job("missing") is None
+
+def test_active_job_per_subject_and_kind():
+    make_job("CS1")
+    bank = make_job("CS1", kind="question_bank")
+    done = make_job("CS2")
+    done["status"] = "succeeded"
+    jobs._write_job(done)
+    assert jobs.active_job("CS1")["kind"] == "ingest"
+    assert jobs.active_job("CS1", kind="question_bank")["id"] == bank["id"]
+    assert jobs.active_job("CS2") is None
+    assert sorted(j["subject_code"] for j in jobs.list_jobs(kind="ingest")) == ["CS1", "CS2"]
+
+def test_stale_job_reported_failed(monkeypatch):
+    job = make_job()
+    job["status"] = "running"
+    jobs._write_job(job)
+    monkeypatch.setattr(jobs.time, "time", lambda: job["updated_at"] + jobs.JOB_STALE_SECONDS + 1)
+    assert jobs.get_job(job["id"])["status"] == "failed"
+    assert jobs._read_job(job["id"])["error"] == "Ingest worker exited unexpectedly"
+
+def test_run_when_idle():
+    assert jobs.run_when_idle("CS1", lambda: 42) == (None, 42)
+    job = make_job("CS1")
+    ran = []
+    active, result = jobs.run_when_idle("CS1", lambda: ran.append(1))
+    assert active["id"] == job["id"] and result is None and ran == []
+
+def test_execute_records_report():
+    job = make_job()
+
+    def work(progress):
+        progress("extracting", 1, 2)
+        progress("extracting", 2, 2)
+        return {"files_added": 2}
+
+    assert jobs._execute(job, work) == "succeeded"
+    record = jobs.get_job(job["id"])
+    assert record["report"] == {"files_added": 2}
+    assert record["progress"]["extracting"] == {"done": 2, "total": 2}
+    assert record["finished_at"] and "metrics" in record
+
+def test_execute_records_error():
+    job = make_job()
+
+    def work(progress):
+        raise RuntimeError("no syllabus")
+
+    assert jobs._execute(job, work) == "failed"
+    assert jobs.get_job(job["id"])["error"] == "no syllabus"
+
+def test_cancel_stops_at_next_checkpoint(jobs_dir):
+    job = make_job()
+    steps = []
+
+    def work(progress):
+        progress("tagging", 0, 3)
+        jobs.cancel_job(job["id"])
+        assert (jobs_dir / f"{job['id']}.cancel").exists()
+        for i in range(1, 4):
+            progress("tagging", i, 3)
+            steps.append(i)
+
+    assert jobs._execute(job, work) == "cancelled"
+    assert steps == []
+    assert jobs.get_job(job["id"])["status"] == "cancelled"
+    assert not (jobs_dir / f"{job['id']}.cancel").exists()
+
+def test_cancel_finished_job_is_a_no_op(jobs_dir):
+    job = make_job()
+    job["status"] = "succeeded"
+    jobs._write_job(job)
+    assert jobs.cancel_job(job["id"])["status"] == "succeeded"
+    assert not list(jobs_dir.glob("*.cancel"))
+    assert jobs.cancel_job("missing") is None
@@ -0,0 +1,33 @@
+import json
+from utils.json_stream import JsonArrayItemParser
+
+ITEMS = [
+    {"question": "What does {x} mean?", "options": ["a", "b]", "c", "d"], "answer": "b]"},
+    {"question": "Quote \"this\"", "options": [], "answer": "a"},
+]
+
+def feed_all(parser, pieces):
+    out = []
+    for piece in pieces:
+        out.extend(parser.feed(piece))
+    return out
+
+def test_items_split_across_tokens():
+    text = json.dumps({"mcqs": ITEMS})
+    parser = JsonArrayItemParser()
+    assert feed_all(parser, [text[i:i + 3] for i in range(0, len(text), 3)]) == ITEMS
+    assert parser.text == text
+
+def test_single_character_tokens():
+    text = json.dumps(ITEMS)
+    assert feed_all(JsonArrayItemParser(), list(text)) == ITEMS
+
+def test_items_emitted_as_soon_as_complete():
+    parser = JsonArrayItemParser()
+    assert parser.feed('{"flashcards": [{"front": "a", "ba') == []
+    assert parser.feed('ck": "b"}, {"front"') == [{"front": "a", "back": "b"}]
+    assert parser.feed(': "c", "back": "d"}]}') == [{"front": "c", "back": "d"}]
+
+def test_trailing_comma_and_bad_item():
+    parser = JsonArrayItemParser()
+    assert feed_all(parser, ['[{"a": 1,}, {"b": ', "oops}, ", '{"c": 3}]']) == [{"a": 1}, {"c": 3}]
@@ -0,0 +1,48 @@
+from lexical_index import LexicalIndex, tokenize
+
+IDS = ["c1", "c2", "c3", "c4"]
+TEXTS = [
+    "Templates in C++ let one function work with many types.",
+    "AO* search solves AND-OR graphs; A* works on ordinary graphs.",
+    "C# and Java both run on a managed runtime.",
+    "Breadth first search explores the graph level by level.",
+]
+METAS = [
+    {"source_type": "notes", "unit": "Unit I", "topic": "Templates", "source": "cpp.pdf"},
+    {"source_type": "notes", "unit": "Unit II", "topic": "Search", "source": "ai.pdf"},
+    {"source_type": "past_papers", "unit": "Unit I", "topic": "Runtimes", "source": "paper.pdf"},
+    # deduplicated chunk stored under ai.pdf that also appeared in paper.pdf
+    {"source_type": "notes", "unit": "Unit II", "topic": "Search", "source": "ai.pdf",
+     "in_file:ai.pdf": True, "in_file:paper.pdf": True, "in_file:old.pdf": False},
+]
+
+def build():
+    return LexicalIndex.build(IDS, TEXTS, METAS)
+
+def test_tokenize_keeps_exact_terms():
+    assert tokenize("C++, AO* and C# in CS3491") == ["c++", "ao*", "and", "c#", "in", "cs3491"]
+
+def test_exact_term_hits():
+    index = build()
+    assert index.search("c++", 5) == ["c1"]
+    assert index.search("AO*", 5) == ["c2"]
+    assert index.search("c#", 5) == ["c3"]
+    assert index.search("nonexistent", 5) == []
+
+def test_filter_masking():
+    index = build()
+    assert set(index.search("search", 5)) == {"c2", "c4"}
+    assert index.search("search", 5, {"unit": "Unit I"}) == []
+    assert index.search("c++", 5, {"source_type": ["past_papers"]}) == []
+    assert index.search("c++", 5, {"source_type": ["notes", "past_papers"], "topic": "Templates"}) == ["c1"]
+
+def test_source_filter_matches_shared_chunks():
+    index = build()
+    assert index.search("graph", 5, {"source": "paper.pdf"}) == ["c4"]
+    assert index.search("graph", 5, {"source": "old.pdf"}) == []
+
+def test_save_and_load(tmp_path):
+    build().save(tmp_path)
+    index = LexicalIndex.load(tmp_path)
+    assert index.search("ao*", 5) == ["c2"]
+    assert index.search("graph", 5, {"source": "paper.pdf"}) == ["c4"]
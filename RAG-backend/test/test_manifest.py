@@ -0,0 +1,33 @@
+import manifest
+from manifest import diff_files, empty_manifest, load_manifest, save_manifest
+
+def entry(hash_):
+    return {"hash": hash_, "source_type": "notes", "chunk_ids": []}
+
+def test_diff_added_stale_unchanged():
+    previous = {"notes/a.pdf": entry("1"), "notes/b.pdf": entry("2"), "notes/gone.pdf": entry("3")}
+    current = {"notes/a.pdf": entry("1"), "notes/b.pdf": entry("2x"), "notes/new.pdf": entry("4")}
+    added, stale, unchanged = diff_files(previous, current)
+    assert sorted(added) == ["notes/b.pdf", "notes/new.pdf"]
+    assert sorted(stale) == ["notes/b.pdf", "notes/gone.pdf"]
+    assert unchanged == ["notes/a.pdf"]
+
+def test_diff_first_ingest_and_no_change():
+    current = {"notes/a.pdf": entry("1"), "syllabus/s.pdf": entry("2")}
+    assert diff_files({}, current) == (["notes/a.pdf", "syllabus/s.pdf"], [], [])
+    assert diff_files(current, current) == ([], [], ["notes/a.pdf", "syllabus/s.pdf"])
+
+def test_manifest_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "CHROMA_DIR", tmp_path)
+    assert load_manifest("CS1") == empty_manifest()
+    data = {**empty_manifest(), "version": 3, "files": {"notes/a.pdf": entry("1")}}
+    save_manifest("CS1", data)
+    assert load_manifest("CS1") == data
+    assert manifest.index_version("CS1") == 3
+    assert not list((tmp_path / "CS1").glob("*.tmp"))
+
+def test_unreadable_manifest_starts_fresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "CHROMA_DIR", tmp_path)
+    (tmp_path / "CS1").mkdir()
+    manifest.manifest_path("CS1").write_text("{not json", encoding="utf-8")
+    assert load_manifest("CS1") == empty_manifest()
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_core")
+import manifest
+import question_bank as qb
+
+@pytest.fixture(autouse=True)
+def bank(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "CHROMA_DIR", tmp_path / "chroma")
+    monkeypatch.setattr(qb, "QUESTION_BANK_DB", tmp_path / "bank.sqlite3")
+
+def mcqs(*questions):
+    return [{"question": q, "options": ["a", "b", "c", "d"], "answer": "a"} for q in questions]
+
+def questions(items):
+    return {item["question"] for item in items}
+
+def test_duplicate_items_skipped():
+    assert qb.add_items("CS1", 0, "mcqs", "Unit I", "Search", mcqs("Q1", "Q2")) == 2
+    assert qb.add_items("CS1", 0, "mcqs", "Unit I", "Search", mcqs("q1 ", "Q3")) == 1
+    assert qb.topic_count("CS1", "mcqs", "Unit I", "Search") == 3
+
+def test_student_never_served_an_item_twice():
+    qb.add_items("CS1", 0, "mcqs", "Unit I", "Search", mcqs(*(f"Q{i}" for i in range(5))))
+    first, unseen = qb.draw("CS1", "mcqs", "alice", 2)
+    assert len(first) == 2 and unseen == 3
+    second, unseen = qb.draw("CS1", "mcqs", "alice", 10)
+    assert len(second) == 3 and unseen == 0
+    assert questions(first) | questions(second) == {f"Q{i}" for i in range(5)}
+    assert qb.draw("CS1", "mcqs", "alice", 5) == ([], 0)
+    # Other students draw from the full pool
+    other, unseen = qb.draw("CS1", "mcqs", "bob", 5)
+    assert len(other) == 5 and unseen == 0
+
+def test_draw_filters_by_unit_topic_and_kind():
+    qb.add_items("CS1", 0, "mcqs", "Unit I", "Search", mcqs("Q1", "Q2"))
+    qb.add_items("CS1", 0, "mcqs", "Unit II", "Logic", mcqs("Q3"))
+    qb.add_items("CS1", 0, "flashcards", "Unit I", "Search", [{"front": "F1", "back": "B1"}])
+    items, unseen = qb.draw("CS1", "mcqs", "alice", 5, unit="Unit I", topic="Search")
+    assert questions(items) == {"Q1", "Q2"} and unseen == 0
+    assert all(item["unit"] == "Unit I" and item["topic"] == "Search" for item in items)
+    items, _ = qb.draw("CS1", "mcqs", "alice", 5)
+    assert questions(items) == {"Q3"}
+
+def test_reingest_hides_and_purges_old_items():
+    qb.add_items("CS1", 0, "mcqs", "Unit I", "Search", mcqs("Q1"))
+    qb.draw("CS1", "mcqs", "alice", 1)
+    manifest.save_manifest("CS1", {**manifest.empty_manifest(), "version": 1})
+    assert qb.draw("CS1", "mcqs", "bob", 5) == ([], 0)
+    assert qb.purge_stale("CS1") == 1
+    conn = qb._connect()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM bank_served").fetchone()[0] == 0
+    finally:
+        conn.close()
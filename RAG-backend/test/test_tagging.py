@@ -0,0 +1,59 @@
+import re
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_chroma")
+import ingest
+
+SYLLABUS = [{"unitName": "Unit I", "topics": [{"topicName": "Search"}]}]
+
+def fake_tagger(answer_batch):
+    """Stand-in for the model: batch prompts are answered by `answer_batch`, single prompts with topic=chunk."""
+    calls = {"batch": 0, "single": 0}
+
+    def call(prompt, model_name, timeout):
+        if "Text Chunks (each prefixed" in prompt:
+            calls["batch"] += 1
+            indices = [int(i) for i in re.findall(r"^\s*\[(\d+)\]$", prompt, re.M)]
+            return answer_batch(indices)
+        calls["single"] += 1
+        chunk = re.search(r'"""(.*?)\.\.\."""', prompt, re.S).group(1)
+        return {"unit": "Unit I", "topic": chunk}
+    return call, calls
+
+def test_batch_answers_are_merged_by_index(monkeypatch):
+    call, calls = fake_tagger(lambda idx: {"tags": [{"index": i, "unit": "Unit I", "topic": f"t{i}"}
+                                                     for i in reversed(idx)]})
+    monkeypatch.setattr(ingest, "_call_tagger", call)
+    tags = ingest.tag_chunks_with_syllabus([f"c{i}" for i in range(5)], SYLLABUS, "m", batch_size=2, workers=2)
+    assert [t["topic"] for t in tags] == ["t0", "t1", "t2", "t3", "t4"]
+    assert calls == {"batch": 3, "single": 0}
+
+def test_missing_and_foreign_indices_are_retried_singly(monkeypatch):
+    # Drops the first index of each batch, repeats the last, and invents one
+    call, calls = fake_tagger(lambda idx: {"tags": [
+        *({"index": i, "topic": f"t{i}"} for i in idx[1:]),
+        {"index": idx[-1], "topic": "duplicate"},
+        {"index": 99, "topic": "foreign"},
+        "not a dict",
+    ]})
+    monkeypatch.setattr(ingest, "_call_tagger", call)
+    tags = ingest.tag_chunks_with_syllabus([f"c{i}" for i in range(4)], SYLLABUS, "m", batch_size=2)
+    assert [t["topic"] for t in tags] == ["c0", "t1", "c2", "t3"]
+    assert calls == {"batch": 2, "single": 2}
+
+def test_failed_batch_falls_back_to_single_chunks(monkeypatch):
+    def answer(idx):
+        raise ValueError("bad json")
+    call, calls = fake_tagger(answer)
+    monkeypatch.setattr(ingest, "_call_tagger", call)
+    tags = ingest.tag_chunks_with_syllabus(["a", "b", "c"], SYLLABUS, "m", batch_size=3)
+    assert [t["topic"] for t in tags] == ["a", "b", "c"]
+    assert all(t["subtopic"] == "" for t in tags)
+    assert calls == {"batch": 1, "single": 3}
+
+def test_single_chunk_failure_is_general(monkeypatch):
+    def call(prompt, model_name, timeout):
+        raise TimeoutError()
+    monkeypatch.setattr(ingest, "_call_tagger", call)
+    assert ingest.tag_chunks_with_syllabus(["a", "b"], SYLLABUS, "m") == [dict(ingest.GENERAL_TAG)] * 2
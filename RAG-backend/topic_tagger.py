@@ -0,0 +1,96 @@
+import numpy as np
+from config import TAG_MARGIN_THRESHOLD, TAG_MIN_SIMILARITY
+
+GENERAL_TAG = {"unit": "General", "topic": "General", "subtopic": ""}
+
+def flatten_syllabus(syllabus_json) -> list:
+    """
+    Turn the structured syllabus into a flat list of labels.
+    Each label carries the (unit, topic, subtopic) it stands for, the text we
+    embed for it, and the index of the (unit, topic) group it belongs to.
+    """
+    labels, groups = [], []
+    for unit in syllabus_json or []:
+        unit_name = str(unit.get("unitName", "")).strip()
+        if not unit_name:
+            continue
+        topics = unit.get("topics") or []
+        if not topics:
+            groups.append((unit_name, "General"))
+            labels.append({"unit": unit_name, "topic": "General", "subtopic": "",
+                           "text": unit_name, "group": len(groups) - 1})
+            continue
+        for topic in topics:
+            topic_name = str(topic.get("topicName", "")).strip()
+            if not topic_name:
+                continue
+            groups.append((unit_name, topic_name))
+            group_id = len(groups) - 1
+            labels.append({"unit": unit_name, "topic": topic_name, "subtopic": "",
+                           "text": f"{unit_name}: {topic_name}", "group": group_id})
+            for sub in topic.get("subtopics") or []:
+                sub_name = str(sub).strip()
+                if sub_name:
+                    labels.append({"unit": unit_name, "topic": topic_name, "subtopic": sub_name,
+                                   "text": f"{topic_name}: {sub_name}", "group": group_id})
+    return labels
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def tag_chunks_by_similarity(chunk_vectors, syllabus_json, embeddings,
+                             margin: float = TAG_MARGIN_THRESHOLD,
+                             min_similarity: float = TAG_MIN_SIMILARITY):
+    """
+    Assign unit/topic/subtopic to chunks by cosine similarity against the
+    embedded syllabus, without calling the LLM.
+
+    Returns (tags, uncertain) where `uncertain` lists the chunk indices whose
+    best topic beat the runner-up by less than `margin`. Those should be sent
+    to the LLM tagger.
+    """
+    n_chunks = len(chunk_vectors)
+    labels = flatten_syllabus(syllabus_json)
+    if n_chunks == 0 or not labels:
+        return [dict(GENERAL_TAG) for _ in range(n_chunks)], []
+
+    label_vecs = _normalize_rows(np.asarray(
+        embeddings.embed_documents([l["text"] for l in labels]), dtype=np.float32))
+    chunk_vecs = _normalize_rows(np.asarray(chunk_vectors, dtype=np.float32))
+
+    # (n_chunks, n_labels) cosine similarity in one matmul
+    sims = chunk_vecs @ label_vecs.T
+
+    # Collapse labels into (unit, topic) groups so a topic does not compete
+    # with its own subtopics when we measure the top-2 margin.
+    group_ids = np.array([l["group"] for l in labels])
+    n_groups = int(group_ids.max()) + 1
+    group_scores = np.full((n_chunks, n_groups), -np.inf, dtype=np.float32)
+    for g in range(n_groups):
+        group_scores[:, g] = sims[:, group_ids == g].max(axis=1)
+
+    if n_groups > 1:
+        top2 = np.partition(group_scores, n_groups - 2, axis=1)[:, -2:]
+        margins = top2[:, 1] - top2[:, 0]
+    else:
+        margins = np.full(n_chunks, np.inf, dtype=np.float32)
+    best_groups = group_scores.argmax(axis=1)
+    best_scores = group_scores.max(axis=1)
+
+    tags, uncertain = [], []
+    for i in range(n_chunks):
+        if best_scores[i] < min_similarity:
+            tags.append(dict(GENERAL_TAG))
+            continue
+        in_group = np.flatnonzero(group_ids == best_groups[i])
+        best_label = labels[in_group[sims[i, in_group].argmax()]]
+        tags.append({"unit": best_label["unit"], "topic": best_label["topic"],
+                     "subtopic": best_label["subtopic"]})
+        if margins[i] < margin:
+            uncertain.append(i)
+
+    print(f"🧭 Similarity-tagged {n_chunks} chunks against {len(labels)} syllabus labels "
+          f"({len(uncertain)} below margin {margin})")
+    return tags, uncertain
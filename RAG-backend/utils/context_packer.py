@@ -0,0 +1,127 @@
+# utils/context_packer.py
+import re
+import threading
+import numpy as np
+from config import (CHUNK_OVERLAP, CONTEXT_TOKENIZER, CONTEXT_TOKEN_BUDGET,
+                    CONTEXT_MMR_LAMBDA, CONTEXT_DUP_THRESHOLD)
+
+MIN_OVERLAP_CHARS = 20   # shorter shared edges are treated as coincidence
+MIN_TAIL_TOKENS = 64     # do not bother squeezing in a truncated chunk below this
+
+_TOKENIZER = None
+_TOKENIZER_LOCK = threading.Lock()
+
+def _get_tokenizer():
+    """Tokenizer of the generation model, or False if it cannot be loaded (then tokens are estimated)."""
+    global _TOKENIZER
+    with _TOKENIZER_LOCK:
+        if _TOKENIZER is None:
+            try:
+                from transformers import AutoTokenizer
+                _TOKENIZER = AutoTokenizer.from_pretrained(CONTEXT_TOKENIZER)
+            except Exception as e:
+                print(f"[WARN] Tokenizer {CONTEXT_TOKENIZER} unavailable ({e}); estimating tokens")
+                _TOKENIZER = False
+        return _TOKENIZER
+
+def count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return (len(text) + 3) // 4
+
+def strip_overlap(prev: str, text: str, max_overlap: int = CHUNK_OVERLAP) -> str:
+    """Drop the start of `text` that repeats the end of the preceding chunk."""
+    limit = min(len(prev), len(text), int(max_overlap * 1.5))
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if prev.endswith(text[:size]):
+            return text[size:].lstrip()
+    return text
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Longest prefix of whole sentences that fits in `budget` tokens ("" if none does)."""
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+    kept = []
+    for sentence in sentences:
+        if count_tokens(" ".join(kept + [sentence])) > budget:
+            break
+        kept.append(sentence)
+    return " ".join(kept)
+
+def _normalize(vectors) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.maximum(norms, 1e-12)
+
+def mmr_select(query_vector, vectors, k: int, lambda_mult: float = CONTEXT_MMR_LAMBDA,
+               dup_threshold: float = CONTEXT_DUP_THRESHOLD, relevance=None) -> list:
+    """
+    Indices of up to k candidates by maximal marginal relevance. Candidates
+    at least `dup_threshold` similar to one already chosen are dropped.
+    `relevance` overrides query cosine similarity (e.g. fused hybrid scores).
+    """
+    if len(vectors) == 0:
+        return []
+    docs = _normalize(vectors)
+    if relevance is None:
+        relevance = docs @ _normalize(query_vector)
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        relevance = relevance / max(float(relevance.max()), 1e-12)
+    pairwise = docs @ docs.T
+    selected = []
+    redundancy = np.full(len(docs), -np.inf, dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+    while len(selected) < k and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+        available &= redundancy < dup_threshold
+    return selected
+
+def pack_context(query_vector, texts: list, metadatas: list, vectors, k: int,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET, relevance=None) -> str:
+    """
+    Build the LLM context from retrieved chunks: pick k diverse chunks (MMR),
+    keep them while they fit the token budget (the last one cut at a sentence
+    boundary), then put chunks of the same source back in document order and
+    strip the overlap between neighbouring chunks.
+    """
+    order = mmr_select(query_vector, vectors, k, relevance=relevance)
+    kept, used = [], 0
+    for i in order:
+        text = texts[i].strip()
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            remaining = token_budget - used
+            if remaining >= MIN_TAIL_TOKENS:
+                text = truncate_to_tokens(text, remaining)
+                if text:
+                    kept.append((i, text))
+            break
+        kept.append((i, text))
+        used += tokens
+
+    # Most relevant source first; within a source, document order
+    source_rank = {}
+    for i, _ in kept:
+        source_rank.setdefault((metadatas[i] or {}).get("source"), len(source_rank))
+
+    def position(entry):
+        meta = metadatas[entry[0]] or {}
+        return source_rank[meta.get("source")], meta.get("chunk_index", 0)
+
+    parts, prev = [], None
+    for i, text in sorted(kept, key=position):
+        meta = metadatas[i] or {}
+        packed = text
+        if (prev is not None and meta.get("source") == prev[0].get("source")
+                and meta.get("chunk_index") == prev[0].get("chunk_index", -2) + 1):
+            packed = strip_overlap(prev[1], text)
+        prev = (meta, text)
+        if packed:
+            parts.append(packed)
+    return "\n\n".join(parts)
@@ -0,0 +1,100 @@
+# utils/generation_utils.py
+import re
+import json
+import llm_client
+from config import OLLAMA_MODEL
+from .json_stream import JsonArrayItemParser
+
+MAX_CONTEXT_CHARS = 12000
+
+def repair_json_string(bad_json: str) -> str:
+    """Extract and repair common JSON issues from LLM output."""
+    match = re.search(r"(\[.*\])", bad_json, re.DOTALL)
+    if match:
+        json_part = match.group(1)
+    else:
+        # Match dict in case it returned {"mcqs": [...]} / {"flashcards": [...]}
+        match_obj = re.search(r"(\{.*\})", bad_json, re.DOTALL)
+        if match_obj:
+            json_part = match_obj.group(1)
+        else:
+            json_part = bad_json
+
+    # Control chars removal
+    json_part = re.sub(r"[\x00-\x1F\x7F]", " ", json_part)
+    # Remove trailing commas
+    json_part = re.sub(r",\s*(\]|\})", r"\1", json_part)
+
+    return json_part.strip()
+
+def context_to_text(context: list | dict | str, label: str = "generation") -> str:
+    """Flatten retrieved context into one string, capped at MAX_CONTEXT_CHARS."""
+    ctx_str = ""
+    if isinstance(context, str):
+        ctx_str = context
+    elif isinstance(context, dict):
+        ctx_str = context.get("page_content") or context.get("text", "")
+    elif isinstance(context, list):
+        parts = []
+        for item in context:
+            if isinstance(item, str):
+                parts.append(item)
+            elif isinstance(item, dict):
+                parts.append(item.get("page_content") or item.get("text", ""))
+            elif hasattr(item, "page_content"):
+                parts.append(item.page_content)
+        ctx_str = "\n\n".join(parts)
+
+    if not ctx_str.strip():
+        print(f"[DEBUG] Empty context provided for {label}")
+        return ""
+
+    if len(ctx_str) > MAX_CONTEXT_CHARS:
+        # Safety net only (retrieval already packs to a token budget): cut at a sentence end
+        cut = ctx_str[:MAX_CONTEXT_CHARS]
+        end = max(cut.rfind(". "), cut.rfind("\n"))
+        ctx_str = cut[:end + 1] if end > MAX_CONTEXT_CHARS // 2 else cut
+    return ctx_str
+
+async def stream_items(context: list | dict | str, build_prompt, validate, key: str,
+                       caller: str, label: str):
+    """
+    Shared body of the stream_* generators: prompt the model with
+    build_prompt(context text) and yield each item of validate(parsed items)
+    as soon as the model closes it, skipping items whose `key` field was
+    already sent. LLM errors are re-raised, so the caller can tell a
+    truncated stream from a finished one.
+    """
+    ctx_str = context_to_text(context, label)
+    if not ctx_str:
+        return
+
+    prompt = build_prompt(ctx_str)
+    print(f"[DEBUG] Streaming {label} from Ollama ({OLLAMA_MODEL})...")
+
+    parser = JsonArrayItemParser()
+    seen = set()
+
+    def fresh(items):
+        for item in validate(items):
+            if item[key] not in seen:
+                seen.add(item[key])
+                yield item
+
+    try:
+        async for event in llm_client.stream_generate(prompt, options={"temperature": 0.2}, timeout=120,
+                                                  caller=caller):
+            for item in fresh(parser.feed(event.get("response", ""))):
+                yield item
+    except Exception as e:
+        print(f"[CRITICAL] Exception in {caller}: {e}")
+        raise
+
+    # Anything the incremental parser could not split out (e.g. odd nesting)
+    try:
+        leftovers = list(fresh(json.loads(repair_json_string(parser.text))))
+    except (json.JSONDecodeError, TypeError):
+        leftovers = []
+    for item in leftovers:
+        yield item
+    print(f"[DEBUG] Streamed {len(seen)} valid {label}")
@@ -0,0 +1,14 @@
+# utils/hash_utils.py
+import hashlib
+from pathlib import Path
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in blocks so large PDFs are not loaded at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,72 @@
+# utils/json_stream.py
+import re
+import json
+
+class JsonArrayItemParser:
+    """
+    Incrementally pull complete objects out of a streamed JSON array.
+
+    Feed raw model output as it arrives; every object that is a direct
+    element of the first array in the stream (e.g. the items of
+    {"mcqs": [...]} or of a bare [...]) is returned as soon as its closing
+    brace arrives. Objects that fail to parse are skipped.
+    """
+
+    def __init__(self):
+        self._stack = []         # open containers: "{" or "["
+        self._in_string = False
+        self._escape = False
+        self._item_level = None  # stack depth inside the first array
+        self._item_start = None  # index in self._text of the current item "{"
+        self._text = ""
+
+    def feed(self, chunk: str) -> list:
+        items = []
+        start = len(self._text)
+        self._text += chunk
+        for i in range(start, len(self._text)):
+            ch = self._text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if (ch == "{" and self._item_level is not None
+                        and len(self._stack) == self._item_level and self._stack[-1] == "["):
+                    self._item_start = i
+                self._stack.append(ch)
+                if ch == "[" and self._item_level is None:
+                    self._item_level = len(self._stack)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if (ch == "}" and self._item_start is not None
+                        and len(self._stack) == self._item_level):
+                    item = self._parse(self._text[self._item_start:i + 1])
+                    self._item_start = None
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+    @staticmethod
+    def _parse(fragment: str):
+        cleaned = re.sub(r"[\x00-\x1F\x7F]", " ", fragment)
+        cleaned = re.sub(r",\s*(\]|\})", r"\1", cleaned)
+        try:
+            item = json.loads(cleaned)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
@@ -1,17 +1,79 @@
 # utils/ocr_utils.py
+import os
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pdf2image import convert_from_path
 import pytesseract
-from config import POPPLER_PATH, TESSERACT_PATH
+from config import POPPLER_PATH, TESSERACT_PATH, OCR_DPI, OCR_GRAYSCALE, OCR_WORKERS, OCR_MAX_GAP
 
 pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
 def ocr_page(pdf_path, page_no):
     """Run OCR on a specific page of a PDF."""
-    img = convert_from_path(
-        pdf_path,
-        first_page=page_no,
-        last_page=page_no,
-        poppler_path=POPPLER_PATH,
-        fmt="ppm"
-    )[0]
-    return pytesseract.image_to_string(img, lang="eng").strip()
\ No newline at end of file
+    return ocr_pages(pdf_path, [page_no]).get(page_no, "")
+
+def page_runs(page_numbers, max_gap: int = OCR_MAX_GAP) -> list:
+    """
+    Group page numbers into (first, last) runs for rendering. Pages closer
+    than `max_gap` are merged so poppler parses the PDF once per run; the
+    few extra pages rendered in between are discarded.
+    """
+    runs = []
+    for page in sorted(set(page_numbers)):
+        if runs and page - runs[-1][1] <= max_gap + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return [tuple(r) for r in runs]
+
+def _recognize(image_path: str) -> str:
+    return pytesseract.image_to_string(image_path, lang="eng").strip()
+
+def ocr_pages(pdf_path, page_numbers, dpi: int = OCR_DPI, grayscale: bool = OCR_GRAYSCALE,
+              workers: int = OCR_WORKERS, timings: dict = None) -> dict:
+    """
+    OCR several pages of one PDF. Pages are rendered to a temp folder in as
+    few poppler passes as possible, then recognised on a thread pool
+    (each tesseract call is its own process). Returns {page_no: text}.
+    If `timings` is given, render/recognise seconds and the page count are
+    added to timings["render_s"], timings["recognize_s"] and timings["pages"].
+    """
+    wanted = set(page_numbers)
+    if not wanted:
+        return {}
+
+    with tempfile.TemporaryDirectory(prefix="ocr_") as tmp_dir:
+        started = time.perf_counter()
+        images = {}
+        for first, last in page_runs(wanted):
+            paths = convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=first,
+                last_page=last,
+                grayscale=grayscale,
+                poppler_path=POPPLER_PATH,
+                output_folder=tmp_dir,
+                output_file=f"p{first:05d}_",
+                paths_only=True,
+                fmt="ppm"
+            )
+            for page_no, path in zip(range(first, last + 1), sorted(paths)):
+                if page_no in wanted:
+                    images[page_no] = path
+        render_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        page_list = sorted(images)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            texts = dict(zip(page_list, pool.map(_recognize, [images[p] for p in page_list])))
+        recognize_s = time.perf_counter() - started
+
+    if timings is not None:
+        timings["render_s"] = timings.get("render_s", 0.0) + render_s
+        timings["recognize_s"] = timings.get("recognize_s", 0.0) + recognize_s
+        timings["pages"] = timings.get("pages", 0) + len(texts)
+    print(f"[DEBUG] OCR {len(texts)} pages of {os.path.basename(str(pdf_path))}: "
+          f"render {render_s:.1f}s, recognise {recognize_s:.1f}s")
+    return texts
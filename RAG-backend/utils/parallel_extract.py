@@ -0,0 +1,131 @@
+# utils/parallel_extract.py
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from pypdf import PdfReader
+from config import EXTRACT_WORKERS, EXTRACT_PAGES_PER_TASK
+from .text_utils import extract_page_range, extract_pages
+from .text_cache import load_cached_pages, save_cached_pages
+from .hash_utils import file_sha256
+from metrics import observe_stage
+
+def _extract_range(pdf_path: str, first: int, last: int):
+    # Runs in a worker process; returns (pages, extraction stats)
+    stats = {}
+    pages = extract_page_range(Path(pdf_path), first, last, stats=stats)
+    return pages, stats
+
+def _init_worker():
+    # Parallelism comes from the pool and the OCR thread pool; stop each tesseract
+    # from spawning its own OpenMP threads. Only extraction processes get this.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def _record(stats: dict):
+    # Worker processes cannot reach this process's metrics; record what they report
+    if "extract_s" in stats:
+        observe_stage("extract", stats["extract_s"], items=stats.get("pages"))
+    if stats.get("ocr_pages"):
+        observe_stage("ocr", stats.get("ocr_s", 0.0), items=stats["ocr_pages"])
+        observe_stage("ocr_render", stats.get("ocr_render_s", 0.0))
+        observe_stage("ocr_recognize", stats.get("ocr_recognize_s", 0.0))
+
+def _no_progress(stage: str, done: int, total: int = None):
+    pass
+
+def _page_ranges(page_count: int, pages_per_task: int):
+    for first in range(1, page_count + 1, pages_per_task):
+        yield first, min(first + pages_per_task - 1, page_count)
+
+def iter_extract_files(paths: list, workers: int = EXTRACT_WORKERS,
+                       pages_per_task: int = EXTRACT_PAGES_PER_TASK, progress=None):
+    """
+    Extract many PDFs on a process pool, splitting large files into page
+    ranges. Yields (path, pages) as soon as every range of a file is done,
+    so callers can start splitting/embedding before the whole folder is
+    finished. `pages` is the per-page text list in page order, or None if
+    the file could not be opened or any of its ranges failed (the caller
+    must not record it as ingested). Files already in the extracted-text
+    cache are yielded without touching the pool.
+    `progress(stage, done, total)` is called with "extracting" (files) and
+    "ocr" (pages) counts.
+    """
+    progress = progress or _no_progress
+    paths = [Path(p) for p in paths]
+    files_done = 0
+    ocr_done = 0
+    if workers <= 1:
+        for path in paths:
+            stats = {}
+            try:
+                pages = extract_pages(path, stats=stats)
+            except Exception as e:
+                print(f"[ERROR] Extraction failed for {path.name}: {e}")
+                pages = None
+            _record(stats)
+            files_done += 1
+            ocr_done += stats.get("ocr_pages", 0)
+            progress("ocr", ocr_done, None)
+            progress("extracting", files_done, len(paths))
+            yield path, pages
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    finished = False
+    try:
+        pending = {}   # path -> {"pages": {first: [...]}, "remaining": n}
+        futures = {}
+        hashes = {}
+        ready = []     # files that need no work, yielded once everything is submitted
+        for path in paths:
+            hashes[path] = file_sha256(path)
+            cached = load_cached_pages(path, hashes[path])
+            if cached is not None:
+                ready.append((path, cached))
+                continue
+            try:
+                page_count = len(PdfReader(path).pages)
+            except Exception as e:
+                print(f"[ERROR] Could not open {path.name}: {e}")
+                ready.append((path, None))
+                continue
+            ranges = list(_page_ranges(page_count, max(1, pages_per_task)))
+            if not ranges:
+                ready.append((path, []))
+                continue
+            pending[path] = {"pages": {}, "remaining": len(ranges), "failed": False}
+            for first, last in ranges:
+                futures[pool.submit(_extract_range, str(path), first, last)] = (path, first)
+
+        for path, pages in ready:
+            files_done += 1
+            progress("extracting", files_done, len(paths))
+            yield path, pages
+
+        for future in as_completed(futures):
+            path, first = futures[future]
+            state = pending[path]
+            try:
+                state["pages"][first], stats = future.result()
+                _record(stats)
+                ocr_count = stats.get("ocr_pages", 0)
+                ocr_done += ocr_count
+                if ocr_count:
+                    progress("ocr", ocr_done, None)
+            except Exception as e:
+                print(f"[ERROR] Extraction failed for {path.name} from page {first}: {e}")
+                state["pages"][first] = []
+                state["failed"] = True
+            state["remaining"] -= 1
+            if state["remaining"] == 0:
+                del pending[path]
+                pages = None
+                if not state["failed"]:
+                    pages = [txt for start in sorted(state["pages"]) for txt in state["pages"][start]]
+                    save_cached_pages(path, pages, hashes[path])
+                files_done += 1
+                progress("extracting", files_done, len(paths))
+                yield path, pages
+        finished = True
+    finally:
+        # On cancellation or an abandoned generator, drop queued ranges instead of finishing them
+        pool.shutdown(wait=finished, cancel_futures=not finished)
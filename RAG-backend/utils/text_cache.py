@@ -0,0 +1,36 @@
+# utils/text_cache.py
+import os
+import json
+from pathlib import Path
+from config import CACHE_DIR, OCR_DPI, OCR_GRAYSCALE
+from .hash_utils import file_sha256, text_sha256
+
+# Bump when clean_text / is_junk / OCR behaviour changes so old entries are ignored
+TEXT_CACHE_VERSION = 1
+TEXT_CACHE_DIR = CACHE_DIR / "text"
+
+def extraction_settings() -> dict:
+    return {"version": TEXT_CACHE_VERSION, "ocr_dpi": OCR_DPI, "ocr_grayscale": OCR_GRAYSCALE, "lang": "eng"}
+
+def _cache_path(file_hash: str) -> Path:
+    settings = text_sha256(json.dumps(extraction_settings(), sort_keys=True))[:12]
+    return TEXT_CACHE_DIR / f"{file_hash}-{settings}.json"
+
+def load_cached_pages(pdf_path: Path, file_hash: str = None):
+    """Cleaned per-page text for this exact file content and settings, or None."""
+    path = _cache_path(file_hash or file_sha256(pdf_path))
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["pages"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_cached_pages(pdf_path: Path, pages: list, file_hash: str = None):
+    path = _cache_path(file_hash or file_sha256(pdf_path))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"source": Path(pdf_path).name, "pages": pages}, f)
+    os.replace(tmp, path)
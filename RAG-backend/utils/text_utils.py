@@ -1,9 +1,12 @@
 # utils/text_utils.py
 import re
+import time
 from collections import Counter
 from pathlib import Path
 from pypdf import PdfReader
-from .ocr_utils import ocr_page
+from .ocr_utils import ocr_pages
+from .hash_utils import file_sha256
+from .text_cache import load_cached_pages, save_cached_pages
 
 BAD_PHRASES = {"lOMoARcPSD", "Downloaded by"}
 BIBLIO_HEADINGS = re.compile(r"(?i)^\s*(Text\s*Books?|References?)\s*:?\s*$")
@@ -38,17 +41,53 @@ def clean_text(txt: str) -> str:
     cleaned = "\n".join(l.rstrip() for l in cleaned.split("\n"))
     return cleaned.strip()
 
-def extract_text(pdf_path: Path) -> str:
+def extract_page_range(pdf_path: Path, first: int = 1, last: int = None, stats: dict = None) -> list:
+    """
+    Cleaned text of pages first..last (1-based, inclusive), OCR'ing junk pages
+    in one batch. If `stats` is given, page counts and seconds are added to
+    stats["pages"], stats["ocr_pages"], stats["extract_s"], stats["ocr_s"] and
+    the OCR split stats["ocr_render_s"] / stats["ocr_recognize_s"].
+    """
+    started = time.perf_counter()
     reader = PdfReader(pdf_path)
-    pages_out = []
-    for i, page in enumerate(reader.pages, start=1):
-        txt = page.extract_text() or ""
+    last = min(last or len(reader.pages), len(reader.pages))
+    pages_out = {}
+    junk_pages = []
+    for i in range(first, last + 1):
+        txt = reader.pages[i - 1].extract_text() or ""
         txt = clean_text(txt)
         if is_junk(txt):
-            txt = ocr_page(pdf_path, i)
-            txt = clean_text(txt)
-        pages_out.append(txt)
-    return "\n\n".join(pages_out)
+            junk_pages.append(i)
+        pages_out[i] = txt
+
+    extract_s = time.perf_counter() - started
+    ocr_s = 0.0
+    timings = {}
+    if junk_pages:
+        started = time.perf_counter()
+        for page_no, txt in ocr_pages(pdf_path, junk_pages, timings=timings).items():
+            pages_out[page_no] = clean_text(txt)
+        ocr_s = time.perf_counter() - started
+    if stats is not None:
+        stats["ocr_pages"] = stats.get("ocr_pages", 0) + len(junk_pages)
+        stats["pages"] = stats.get("pages", 0) + (last - first + 1)
+        stats["extract_s"] = stats.get("extract_s", 0.0) + extract_s
+        stats["ocr_s"] = stats.get("ocr_s", 0.0) + ocr_s
+        stats["ocr_render_s"] = stats.get("ocr_render_s", 0.0) + timings.get("render_s", 0.0)
+        stats["ocr_recognize_s"] = stats.get("ocr_recognize_s", 0.0) + timings.get("recognize_s", 0.0)
+    return [pages_out[i] for i in range(first, last + 1)]
+
+def extract_pages(pdf_path: Path, stats: dict = None) -> list:
+    """Cleaned text of every page, in page order. Served from the text cache when possible."""
+    file_hash = file_sha256(pdf_path)
+    pages = load_cached_pages(pdf_path, file_hash)
+    if pages is None:
+        pages = extract_page_range(pdf_path, stats=stats)
+        save_cached_pages(pdf_path, pages, file_hash)
+    return pages
+
+def extract_text(pdf_path: Path) -> str:
+    return "\n\n".join(extract_pages(pdf_path))
 
 def is_junk(text: str, min_len: int = 50, dup_thresh: float = 0.25) -> bool:
     """Detects junk text by length, repetition, and word diversity."""
@@ -0,0 +1,65 @@
+# warmup.py
+"""
+Background warm-up started with the API: loads the embedding model (and runs
+one forward pass) and gets Ollama to load the generation model, then keeps
+pinging Ollama so it is not unloaded between requests. /ready reports the
+result; /health only says the process is up.
+"""
+import time
+import asyncio
+import llm_client
+from config import WARMUP_ON_STARTUP, WARMUP_LLM, LLM_KEEPALIVE_INTERVAL
+
+# component -> {"ready", "ms", "error"}
+_STATE = {"embeddings": {"ready": False, "ms": None, "error": None},
+          "llm": {"ready": False, "ms": None, "error": None}}
+_TASKS = []
+
+def _warm_embeddings():
+    from retriever import get_embeddings   # langchain + sentence-transformers: the slow imports
+    embeddings = get_embeddings()
+    embeddings.base.embed_query("warm up")  # first forward pass, bypassing the embedding cache
+
+async def _run(component: str, coro_fn):
+    started = time.perf_counter()
+    try:
+        await coro_fn()
+        _STATE[component].update(ready=True, error=None)
+        print(f"[DEBUG] Warm-up: {component} ready in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        _STATE[component].update(ready=False, error=str(e))
+        print(f"[WARN] Warm-up of {component} failed: {e}")
+    _STATE[component]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+async def _keep_llm_loaded():
+    await _run("llm", llm_client.load_model)
+    while LLM_KEEPALIVE_INTERVAL > 0:
+        await asyncio.sleep(LLM_KEEPALIVE_INTERVAL)
+        await _run("llm", llm_client.load_model)
+
+def _skip(component: str, reason: str):
+    # Nothing to wait for: the component loads on first use instead
+    _STATE[component].update(ready=True, error=None, skipped=reason)
+
+def start():
+    """Schedule the warm-up tasks on the running event loop (call from the startup hook)."""
+    if not WARMUP_ON_STARTUP:
+        for component in _STATE:
+            _skip(component, "WARMUP_ON_STARTUP = False")
+        return
+    _TASKS.append(asyncio.create_task(_run("embeddings", lambda: asyncio.to_thread(_warm_embeddings))))
+    if WARMUP_LLM:
+        _TASKS.append(asyncio.create_task(_keep_llm_loaded()))
+    else:
+        _skip("llm", "WARMUP_LLM = False")
+
+async def stop():
+    for task in _TASKS:
+        task.cancel()
+    await asyncio.gather(*_TASKS, return_exceptions=True)
+    _TASKS.clear()
+
+def readiness() -> dict:
+    """Per-component warm-up state; ready once every component is loaded."""
+    return {"ready": all(c["ready"] for c in _STATE.values()),
+            "components": {name: dict(c) for name, c in _STATE.items()}}
@@ -44,6 +44,33 @@ async function uploadFile(category, file, subject_code) {
     }
 }
 
+// Longest we hold a createSubject request open waiting for ingestion
+const INGEST_WAIT_MS = Number(process.env.INGEST_WAIT_MS) || 15 * 60 * 1000;
+
+// Start RAG ingestion and wait for the background job to finish, up to timeoutMs.
+// On timeout the job keeps running; the error carries its id so the client can poll /jobs.
+async function runIngestion(subject_code, pollIntervalMs = 3000, timeoutMs = INGEST_WAIT_MS) {
+    const { data } = await axios.post(`http://127.0.0.1:8000/ingest/${subject_code}`, null, { timeout: 30000 });
+    const jobId = data.job_id;
+    console.log(`Ingest job ${jobId} for ${subject_code}: ${data.status}`);
+
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, pollIntervalMs));
+        const { data: job } = await axios.get(`http://127.0.0.1:8000/jobs/${jobId}`, { timeout: 30000 });
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed' || job.status === 'cancelled') {
+            throw new Error(`Ingestion ${job.status}${job.error ? `: ${job.error}` : ''}`);
+        }
+    }
+    const error = new Error(`Ingestion of ${subject_code} still running after ${Math.round(timeoutMs / 1000)}s`);
+    error.code = 'INGEST_TIMEOUT';
+    error.jobId = jobId;
+    throw error;
+}
+
 export const createSubject = async (req, res) => {
     try {
         const { title, description, subject_code } = req.body;
@@ -107,7 +134,7 @@ export const createSubject = async (req, res) => {
         }
 
         // Trigger RAG ingestion
-        await axios.post(`http://127.0.0.1:8000/ingest/${subject_code}`);
+        await runIngestion(subject_code);
 
         // Extract and store structured syllabus
         try {
@@ -131,6 +158,15 @@ export const createSubject = async (req, res) => {
     } catch (error) {
         console.error('Error in createSubject:', error);
         
+        if (error.code === 'INGEST_TIMEOUT') {
+            // Subject and files are saved (keep the uploads); ingestion continues in the background
+            return res.status(504).json({
+                message: 'Subject created, but ingestion is still running. Poll the job, then refresh the syllabus.',
+                job_id: error.jobId,
+                error: error.message
+            });
+        }
+
         // Cleanup uploaded files on error
         if (req.files) {
             Object.values(req.files).forEach(fileArray => {